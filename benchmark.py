@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import math
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+from typing import Any, Callable, Dict, List, Optional
+from telegram import InputFile
+
+from systamer import SysTamer
+from misc import *
+
+#   --------------------------------------------------------------------------------------------------------------------
+#   Offline benchmark - drives the SysTamer handlers with stand-in Telegram objects, no bot token or network needed.
+#   Reports p50 / p99 latency, event loop blocking time and bytes sent per command:
+#       python3 benchmark.py [--runs N] [--files N] [--upload-mb N] [--download-mb N] [--commands a,b,...]
+#   --------------------------------------------------------------------------------------------------------------------
+
+BENCHMARK_CHAT_ID = 1
+LOOP_PROBE_INTERVAL = 0.005
+# handlers report most failures as a reply instead of raising - a run that got one of these didn't succeed
+ERROR_REPLY_PREFIXES = ("Error", "An error occurred", "Cannot download", "Request timed out", "Network error")
+
+
+class _FakeUser:
+    id = 1
+    username = "benchmark"
+
+
+class _FakeChat:
+    id = BENCHMARK_CHAT_ID
+
+
+class _FakeFile:
+    def __init__(self, file_id: str, size: int, seed: bytes):
+        self.file_id = file_id
+        self._size = size
+        self._block = seed + os.urandom(1024 ** 2 - len(seed))
+
+    async def download_as_bytearray(self) -> bytearray:
+        data, remaining = bytearray(), self._size
+        while remaining > 0:
+            data += self._block[:remaining]
+            remaining -= len(self._block)
+        return data
+
+
+class _FakeDocument:
+    def __init__(self, file_name: str, size: int, seed: bytes):
+        self.file_name = file_name
+        self._file = _FakeFile(file_name, size, seed)
+
+    async def get_file(self) -> _FakeFile:
+        return self._file
+
+
+class _FakeMessage:
+    """Records what the bot would have sent - text length, or the content of documents and media"""
+
+    def __init__(self, sink: "_Traffic", text: str = ""):
+        self._sink = sink
+        self.text = text
+        self.chat_id = BENCHMARK_CHAT_ID
+        self.message_id = 1
+        self.document = self.photo = self.video = self.audio = self.voice = self.video_note = None
+
+    async def _send(self, text: Optional[str] = None, media: Any = None) -> "_FakeMessage":
+        if text:
+            self._sink.add(len(text.encode()))
+            if text.startswith(ERROR_REPLY_PREFIXES):
+                self._sink.errors.append(text)
+        if isinstance(media, InputFile):
+            self._sink.add(len(media.input_file_content))
+        elif media is not None:
+            self._sink.add(len(media.read() if hasattr(media, "read") else media))
+        return _FakeMessage(self._sink)
+
+    async def reply_text(self, text: str, **_kwargs):
+        return await self._send(text)
+
+    async def edit_text(self, text: str, **_kwargs):
+        return await self._send(text)
+
+    async def reply_photo(self, photo, **_kwargs):
+        return await self._send(media=photo)
+
+    async def reply_document(self, document, **_kwargs):
+        return await self._send(media=document)
+
+    async def reply_animation(self, animation, **_kwargs):
+        return await self._send(media=animation)
+
+
+class _FakeQuery:
+    def __init__(self, sink: "_Traffic", data: str):
+        self.data = data
+        self.message = _FakeMessage(sink)
+
+    async def answer(self, *_args, **_kwargs) -> None:
+        pass
+
+    async def edit_message_text(self, text: str, **_kwargs):
+        return await self.message.edit_text(text)
+
+
+class _FakeUpdate:
+    def __init__(self, sink: "_Traffic", text: str = "", data: Optional[str] = None):
+        self.message = None if data is not None else _FakeMessage(sink, text)
+        self.callback_query = _FakeQuery(sink, data) if data is not None else None
+        self.effective_user = _FakeUser()
+        self.effective_chat = _FakeChat()
+        self.effective_message = self.message or self.callback_query.message
+
+
+class _FakeContext:
+    def __init__(self, args: List[str]):
+        self.args = args
+        self.user_data = dict()
+
+
+class _Traffic:
+    def __init__(self):
+        self.bytes_sent = 0
+        self.errors: List[str] = list()  # error replies
+
+    def add(self, size: int) -> None:
+        self.bytes_sent += size
+
+
+class _LoopProbe:
+    """Sleeps in short steps, anything beyond the requested sleep is time the loop was blocked by someone else"""
+
+    def __init__(self, interval: float = LOOP_PROBE_INTERVAL):
+        self._interval = interval
+        self.blocked = 0.0
+
+    async def run_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self._interval)
+            self.blocked += max(loop.time() - start - self._interval, 0.0)
+
+
+class _CommandStats:
+    def __init__(self):
+        self.latencies: List[float] = list()
+        self.blocked: List[float] = list()
+        self.bytes_sent: List[int] = list()
+        self.errors = 0
+
+    @staticmethod
+    def percentile(values: List[float], pct: float) -> float:
+        ordered = sorted(values)
+        return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)] if ordered else 0.0
+
+
+class Benchmark:
+    def __init__(self, workdir: str, files: int, upload_mb: int, download_mb: int):
+        self._workdir = workdir
+        self._files = files
+        self._upload_size = upload_mb * 1024 ** 2
+        self._download_size = download_mb * 1024 ** 2
+        self._probe = _LoopProbe()
+        self.results: Dict[str, _CommandStats] = dict()
+        self.skipped: Dict[str, str] = dict()
+        self._tamer = SysTamer({
+            "bot_token": "0:benchmark",
+            "browse_handles_db": None,
+            "download_part_size": 16 * 1024 ** 2,
+            "outbound_chat_rate": 10000,  # measure the handlers, not telegram's pacing
+            "outbound_chat_burst": 10000,
+            "outbound_global_rate": 10000,
+        })
+
+    def _prepare(self) -> None:
+        self._huge_dir = os.path.join(self._workdir, "huge")
+        os.makedirs(self._huge_dir)
+        for i in range(self._files):
+            if i % 50 == 0:
+                os.makedirs(os.path.join(self._huge_dir, f"dir_{i:07d}"))
+            else:
+                open(os.path.join(self._huge_dir, f"file_{i:07d}.txt"), 'w').close()
+        self._download_path = os.path.join(self._workdir, "download.bin")
+        with open(self._download_path, 'wb') as file:
+            for _ in range(self._download_size // 1024 ** 2):
+                file.write(os.urandom(1024 ** 2))
+
+    async def _measure(self, name: str, handler: Callable, update_factory: Callable[[_Traffic], _FakeUpdate],
+                       args: List[str], runs: int) -> None:
+        stats = self.results.setdefault(name, _CommandStats())
+        for run in range(runs):
+            traffic = _Traffic()
+            update = update_factory(traffic, run)
+            blocked_before = self._probe.blocked
+            start = time.perf_counter()
+            try:
+                await handler(update, _FakeContext(list(args)))
+            except Exception as exc:
+                stats.errors += 1
+                print_error(f"{name} failed: {exc}")
+            else:
+                if traffic.errors:
+                    stats.errors += 1
+                    print_error(f"{name} replied with an error: {traffic.errors[0]}")
+            stats.latencies.append(time.perf_counter() - start)
+            stats.blocked.append(self._probe.blocked - blocked_before)
+            stats.bytes_sent.append(traffic.bytes_sent)
+
+    def _callback(self, data: Callable[[int], str]):
+        return lambda traffic, run: _FakeUpdate(traffic, data=data(run))
+
+    @staticmethod
+    def _command(text: str):
+        return lambda traffic, _run: _FakeUpdate(traffic, text=text)
+
+    def _upload(self, traffic: _Traffic, run: int) -> _FakeUpdate:
+        update = _FakeUpdate(traffic, text="")
+        update.message.document = _FakeDocument(f"upload_{run}.bin", self._upload_size, str(run).encode())
+        return update
+
+    @staticmethod
+    def _start_virtual_display() -> Optional[subprocess.Popen]:
+        if os.environ.get("DISPLAY") or not shutil.which("Xvfb"):
+            return None
+        display = ":99"
+        xvfb = subprocess.Popen(["Xvfb", display, "-screen", "0", "1920x1080x24"],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        time.sleep(1)
+        os.environ["DISPLAY"] = display
+        return xvfb
+
+    async def run(self, runs: int, commands: List[str]) -> None:
+        self._prepare()
+        tamer = self._tamer
+        registry = tamer._path_registry
+        huge_handle = registry.intern(BENCHMARK_CHAT_ID, self._huge_dir)
+        download_handle = registry.intern(BENCHMARK_CHAT_ID, self._download_path)
+        heavy_runs = max(runs // 4, 1)
+
+        scenarios = {
+            "system": (tamer.system_resource_monitoring, self._command("/system"), [], runs),
+            "processes": (tamer.list_processes, self._command("/processes"), [], runs),
+            "processes_mem": (tamer.list_processes, self._command("/processes sort=mem top=200"),
+                              ["sort=mem", "top=200"], runs),
+            "browse": (tamer.browse, self._command("/browse"), [], runs),
+            "browse_huge": (tamer.handle_navigation, self._callback(lambda run: f"cd {huge_handle} {run}"), [], runs),
+            "screenshot": (tamer.send_screenshot, self._command("/screenshot"), [], heavy_runs),
+            "upload": (tamer.handle_file_upload, self._upload, [], heavy_runs),
+            "download": (tamer.handle_navigation, self._callback(lambda _run: f"action download {download_handle}"),
+                         [], heavy_runs),
+        }
+        xvfb = self._start_virtual_display() if "screenshot" in commands else None
+        if "screenshot" in commands and not os.environ.get("DISPLAY"):
+            self.skipped["screenshot"] = "no display and Xvfb is not installed"
+            commands = [command for command in commands if command != "screenshot"]
+
+        tamer._start_background_tasks()
+        probe = asyncio.create_task(self._probe.run_forever())
+        try:
+            await asyncio.sleep(0.5)  # let the samplers produce their first data
+            for name in commands:
+                handler, update_factory, args, count = scenarios[name]
+                await self._measure(name, handler, update_factory, args, count)
+        finally:
+            probe.cancel()
+            await tamer._stop_background_tasks()
+            await tamer._outbound.close()
+            tamer._workers.shutdown()
+            tamer._close_features()
+            if xvfb is not None:
+                xvfb.terminate()
+
+    def report(self) -> str:
+        lines = [f"{'command':<15} {'runs':>5} {'errors':>6} {'p50 ms':>9} {'p99 ms':>9} {'blocked p99 ms':>15} "
+                 f"{'KB sent/run':>12}"]
+        for name, stats in self.results.items():
+            lines.append(f"{name:<15} {len(stats.latencies):>5} {stats.errors:>6} "
+                         f"{stats.percentile(stats.latencies, 50) * 1000:>9.1f} "
+                         f"{stats.percentile(stats.latencies, 99) * 1000:>9.1f} "
+                         f"{stats.percentile(stats.blocked, 99) * 1000:>15.1f} "
+                         f"{sum(stats.bytes_sent) / len(stats.bytes_sent) / 1024:>12.1f}")
+        for name, reason in self.skipped.items():
+            lines.append(f"{name:<15} skipped - {reason}")
+        return "\n".join(lines)
+
+
+SCENARIOS = ["system", "processes", "processes_mem", "browse", "browse_huge", "screenshot", "upload", "download"]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline SysTamer handler benchmark")
+    parser.add_argument("--runs", type=int, default=20, help="runs per command (a quarter for heavy ones)")
+    parser.add_argument("--files", type=int, default=20000, help="entries in the synthetic browse directory")
+    parser.add_argument("--upload-mb", type=int, default=32, help="size of each simulated upload")
+    parser.add_argument("--download-mb", type=int, default=64, help="size of the file downloaded via /browse")
+    parser.add_argument("--commands", default=",".join(SCENARIOS), help=f"subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--verbose", action="store_true", help="keep the handlers' log output")
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    commands = [command for command in args.commands.split(",") if command]
+    unknown = set(commands) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"unknown commands: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="systamer-benchmark-")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # uploads and the ignore file are looked up in the working directory
+    set_quiet(not args.verbose)
+    try:
+        benchmark = Benchmark(workdir, args.files, args.upload_mb, args.download_mb)
+        await benchmark.run(args.runs, commands)
+        report = benchmark.report()
+    finally:
+        set_quiet(False)
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    printf(report)  # after the handlers' output is let through again
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1 +1,10 @@
+# what every start needs - feature modules (uploads, transfers, fleet, alerts, find, du, tail, ...) are imported
+# by the handlers that use them, so their dependencies (sqlite3, tarfile, hmac, ...) load on first use
 from .helper_definitions import *
+from .metrics_sampler import *
+from .process_tracker import *
+from .workers import *
+from .dir_listing import *
+from .ignore_rules import *
+from .outbound import *
+from .handler_stats import *
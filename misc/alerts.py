@@ -0,0 +1,165 @@
+import re
+import os
+import fnmatch
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600}
+_DURATION = r"(?:\s+for\s+(?P<duration>\d+(?:\.\d+)?)\s*(?P<unit>[smh]))?"
+_THRESHOLD_RULE = re.compile(r"^(?P<metric>cpu|memory|swap|load|disk\s+(?P<mount>\S+))\s*(?P<op>[<>])\s*"
+                             r"(?P<threshold>\d+(?:\.\d+)?)\s*%?" + _DURATION + r"$", re.IGNORECASE)
+_PROCESS_RULE = re.compile(r"^process\s+(?P<name>\S+)\s+not\s+running" + _DURATION + r"$", re.IGNORECASE)
+
+
+class AlertRule(NamedTuple):
+    text: str  # as written in the config
+    metric: str  # cpu, memory, swap, load, disk or process
+    target: Optional[str]  # the path for disk, the process name for process
+    above: bool  # breached above the threshold (`>`), or below it (`<`)
+    threshold: float  # process rules breach below 1 matching process
+    duration: float  # seconds the condition has to hold before the alert fires
+
+
+def parse_alert_rule(text: str) -> AlertRule:
+    """
+    "cpu > 90% for 2m", "memory > 90%", "swap > 50%", "load > 8 for 5m", "disk /var > 95%",
+    "process nginx not running for 30s" - raises ValueError for anything else
+    """
+    text = " ".join(text.split())
+    match = _PROCESS_RULE.match(text)
+    if match:
+        metric, target, above, threshold = "process", match.group("name").lower(), False, 1.0
+    else:
+        match = _THRESHOLD_RULE.match(text)
+        if not match:
+            raise ValueError(f"can't parse alert rule '{text}'")
+        metric = match.group("metric").split()[0].lower()
+        target = os.path.normpath(match.group("mount")) if match.group("mount") else None
+        above, threshold = match.group("op") == ">", float(match.group("threshold"))
+    duration = float(match.group("duration")) * _DURATION_UNITS[match.group("unit").lower()] \
+        if match.group("duration") else 0.0
+    return AlertRule(text, metric, target, above, threshold, duration)
+
+
+class AlertEvent(NamedTuple):
+    rule: AlertRule
+    firing: bool  # False when the alert resolved
+    value: Optional[float]
+
+    def describe(self) -> str:
+        if self.rule.metric == "process":
+            now = "running again" if not self.firing else "not running"
+        else:
+            unit = "" if self.rule.metric == "load" else "%"
+            now = f"now {self.value:.1f}{unit}"
+        return f"{'🔴 ALERT' if self.firing else '🟢 RESOLVED'}: {self.rule.text} - {now}"
+
+
+class _RuleState:
+    __slots__ = ("pending_since", "firing", "notified", "last_notified", "value")
+
+    def __init__(self):
+        self.pending_since: Optional[float] = None  # since when the condition holds, before it fires
+        self.firing = False
+        self.notified = False  # the current firing was pushed, so its resolution is pushed too
+        self.last_notified = float("-inf")
+        self.value: Optional[float] = None  # None until there was something to evaluate
+
+
+class AlertEngine:
+    """
+    Threshold rules evaluated against data that was already collected: the sampler's newest sample, the process
+    tracker's snapshot and one `statvfs` per extra mount the rules name - nothing per rule. A rule fires once its
+    condition held for its `for` duration, and resolves only once the value is back past the threshold by the
+    `hysteresis` fraction (a 90% rule with 0.05 clears below 85.5%), so a value hovering around the threshold
+    doesn't flap. Firing again within `cooldown` seconds of the last notification is tracked but not pushed.
+    """
+
+    def __init__(self, rules: Iterable[AlertRule], hysteresis: float = 0.05, cooldown: float = 900.0):
+        self._rules = list(rules)
+        self._hysteresis = max(float(hysteresis), 0.0)
+        self._cooldown = float(cooldown)
+        self._states = [_RuleState() for _ in self._rules]
+
+    @property
+    def rules(self) -> List[AlertRule]:
+        return self._rules
+
+    @property
+    def disk_paths(self) -> Set[str]:
+        return set(rule.target for rule in self._rules if rule.metric == "disk")
+
+    @property
+    def needs_processes(self) -> bool:
+        return any(rule.metric == "process" for rule in self._rules)
+
+    @staticmethod
+    def _value(rule: AlertRule, sample: Any, disk_percent: Dict[str, Optional[float]],
+               process_names: Optional[List[str]]) -> Optional[float]:
+        if rule.metric == "cpu":
+            return sample.cpu_percent
+        if rule.metric == "memory":
+            return sample.memory.percent
+        if rule.metric == "swap":
+            return sample.swap.percent
+        if rule.metric == "load":
+            return sample.load_avg[0]
+        if rule.metric == "disk":
+            return disk_percent.get(rule.target)
+        if process_names is None:  # no snapshot yet - an empty table isn't "not running"
+            return None
+        if any(c in rule.target for c in "*?["):
+            return float(sum(fnmatch.fnmatchcase(name, rule.target) for name in process_names))
+        return float(sum(name == rule.target for name in process_names))
+
+    def _breached(self, rule: AlertRule, value: float) -> bool:
+        return value > rule.threshold if rule.above else value < rule.threshold
+
+    def _cleared(self, rule: AlertRule, value: float) -> bool:
+        if rule.metric == "process":
+            return value >= rule.threshold
+        margin = rule.threshold * self._hysteresis
+        return value <= rule.threshold - margin if rule.above else value >= rule.threshold + margin
+
+    def evaluate(self, sample: Any, disk_percent: Dict[str, Optional[float]],
+                 process_names: Optional[List[str]], now: float) -> List[AlertEvent]:
+        """
+        `sample` is a `MetricsSample`, `disk_percent` maps the rules' disk paths to their usage (None when the
+        mount didn't answer), `process_names` are the lowercased names of the running processes. Returns the
+        notifications to push.
+        """
+        events = list()
+        for rule, state in zip(self._rules, self._states):
+            value = self._value(rule, sample, disk_percent, process_names)
+            if value is None:
+                continue  # unknown isn't a breach, nor a recovery
+            state.value = value
+            if state.firing:
+                if self._cleared(rule, value):
+                    state.firing, state.pending_since = False, None
+                    if state.notified:
+                        events.append(AlertEvent(rule, False, value))
+                    state.notified = False
+                continue
+            if not self._breached(rule, value):
+                state.pending_since = None
+                continue
+            if state.pending_since is None:
+                state.pending_since = now
+            if now - state.pending_since >= rule.duration:
+                state.firing = True
+                if now - state.last_notified >= self._cooldown:
+                    state.notified, state.last_notified = True, now
+                    events.append(AlertEvent(rule, True, value))
+        return events
+
+    def states(self) -> List[Tuple[AlertRule, str, Optional[float]]]:
+        """(rule, "firing" / "pending" / "ok" / "unknown", last value) for every rule"""
+        rows = list()
+        for rule, state in zip(self._rules, self._states):
+            if state.value is None:
+                status = "unknown"
+            else:
+                status = "firing" if state.firing else "pending" if state.pending_since is not None else "ok"
+            rows.append((rule, status, state.value))
+        return rows
@@ -0,0 +1,62 @@
+import os
+import time
+import threading
+
+from collections import OrderedDict
+from typing import Callable, List, NamedTuple, Optional
+
+
+class DirListingEntry(NamedTuple):
+    name: str
+    path: str
+    is_dir: bool
+
+
+class DirListingCache:
+    """
+    Short-TTL cache of `os.scandir` listings. A cached listing is reused while the directory's mtime is unchanged
+    (entries added / removed / renamed bump it), so paging and Back navigation don't rescan the directory.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_dirs: int = 64):
+        self._ttl = ttl
+        self._max_dirs = max_dirs
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()  # path -> (mtime_ns, expires_at, entries)
+        self._lock = threading.Lock()  # listings are built on worker threads
+
+    @staticmethod
+    def _scan(path: str, skip: Optional[Callable[[os.DirEntry], bool]]) -> List[DirListingEntry]:
+        entries = list()
+        with os.scandir(path) as it:
+            for entry in it:
+                if skip and skip(entry):
+                    continue
+                try:
+                    is_dir = entry.is_dir()  # served from d_type, only symlinks need a stat
+                except OSError:
+                    is_dir = False
+                entries.append(DirListingEntry(entry.name, entry.path, is_dir))
+        # directories first, then files - both alphabetically
+        entries.sort(key=lambda e: (not e.is_dir, e.name.lower()))
+        return entries
+
+    def list(self, path: str, skip: Optional[Callable[[os.DirEntry], bool]] = None) -> List[DirListingEntry]:
+        mtime_ns = os.stat(path).st_mtime_ns
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached and cached[0] == mtime_ns and cached[1] > now:
+                self._cache.move_to_end(path)
+                return cached[2]
+
+        entries = self._scan(path, skip)
+        with self._lock:
+            self._cache[path] = (mtime_ns, now + self._ttl, entries)
+            self._cache.move_to_end(path)
+            while len(self._cache) > self._max_dirs:
+                self._cache.popitem(last=False)
+        return entries
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            self._cache.pop(path, None)
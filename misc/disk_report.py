@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import concurrent.futures
+
+import psutil
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# kernel & pseudo filesystems - nothing there fills up a disk
+PSEUDO_FILESYSTEMS = {
+    "proc", "sysfs", "devtmpfs", "devpts", "tmpfs", "ramfs", "cgroup", "cgroup2", "securityfs", "pstore", "bpf",
+    "debugfs", "tracefs", "mqueue", "hugetlbfs", "configfs", "fusectl", "autofs", "binfmt_misc", "rpc_pipefs",
+    "nsfs", "efivarfs", "selinuxfs", "squashfs",  # read-only snap / live images, always 100% full
+}
+
+
+class MountUsage(NamedTuple):
+    mountpoint: str
+    device: str
+    fstype: str
+    usage: Optional[Any]  # psutil sdiskusage, None when the mount didn't answer or failed
+    status: str  # "ok", "unresponsive" or the error
+
+
+def list_mounts() -> List[Any]:
+    """Real mounts, network filesystems included (`all=False` would leave out nfs & cifs as `nodev`)"""
+    seen, mounts = set(), list()
+    for partition in psutil.disk_partitions(all=True):
+        if partition.fstype in PSEUDO_FILESYSTEMS or partition.mountpoint in seen:
+            continue
+        seen.add(partition.mountpoint)
+        mounts.append(partition)
+    return mounts
+
+
+class MountProbe:
+    """
+    `statvfs` of every mount, each on a daemon thread of its own and bounded by `timeout`. A stale NFS / CIFS
+    mount blocks `statvfs` in the kernel and the call can't be cancelled, so a mount whose previous probe is still
+    stuck is reported "unresponsive" without starting another one. The stuck threads don't pin workers of the
+    shared pool and don't hold up shutdown.
+    """
+
+    def __init__(self, timeout: float = 2.0):
+        self._timeout = timeout
+        self._in_flight: Dict[str, concurrent.futures.Future] = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _start(mountpoint: str) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+
+        def _run():
+            try:
+                future.set_result(psutil.disk_usage(mountpoint))
+            except BaseException as exc:
+                future.set_exception(exc)
+
+        threading.Thread(target=_run, name=f"systamer-statvfs {mountpoint}", daemon=True).start()
+        return future
+
+    def _probe(self, mountpoint: str) -> Tuple[concurrent.futures.Future, bool]:
+        # (probe, whether it was just started)
+        with self._lock:
+            future = self._in_flight.get(mountpoint)
+            if future is None or future.done():
+                future = self._in_flight[mountpoint] = self._start(mountpoint)
+                return future, True
+            return future, False
+
+    async def _collect(self, paths: List[str]) -> Dict[str, Tuple[Optional[Any], str]]:
+        probes = {path: self._probe(path) for path in paths}
+        fresh = [future for future, started in probes.values() if started]  # stuck ones aren't waited for again
+        if fresh:
+            # waited on from a pool thread - asyncio.wrap_future would cancel a stuck probe we want to keep track of
+            await asyncio.get_running_loop().run_in_executor(None, concurrent.futures.wait, fresh, self._timeout)
+        results = dict()
+        for path, (future, _) in probes.items():
+            if not future.done():
+                results[path] = None, "unresponsive"
+            elif future.exception() is not None:
+                results[path] = None, type(future.exception()).__name__
+            else:
+                results[path] = future.result(), "ok"
+        return results
+
+    async def usage(self, mounts: List[Any]) -> List[MountUsage]:
+        results = await self._collect([partition.mountpoint for partition in mounts])
+        return [MountUsage(partition.mountpoint, partition.device, partition.fstype, *results[partition.mountpoint])
+                for partition in mounts]
+
+    async def percent(self, paths: List[str]) -> Dict[str, Optional[float]]:
+        """Usage percent of the filesystem each path is on, None when it didn't answer or failed"""
+        return {path: usage.percent if usage is not None else None
+                for path, (usage, _) in (await self._collect(paths)).items()}
@@ -0,0 +1,182 @@
+import os
+import heapq
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+DU_TOP_FILES = 10  # largest files remembered per directory, the rest only count towards its total
+
+
+class _DirRecord(NamedTuple):
+    mtime_ns: int
+    expires_at: float
+    own_bytes: int  # files directly in the directory
+    files: int
+    subdirs: Tuple[str, ...]  # names, on the same filesystem
+    top_files: Tuple[Tuple[int, str], ...]  # (bytes, name), largest first
+
+
+class DiskUsageChild(NamedTuple):
+    name: str
+    path: str
+    size: int
+    is_dir: bool
+
+
+class DiskUsage(NamedTuple):
+    path: str
+    size: int
+    files: int
+    children: List[DiskUsageChild]  # largest first
+    unreadable: int  # directories that couldn't be listed
+
+
+def _allocated(stat: os.stat_result) -> int:
+    # what the file takes on disk, like du - sparse files count what's allocated
+    blocks = getattr(stat, "st_blocks", None)
+    return blocks * 512 if blocks is not None else stat.st_size
+
+
+class DiskUsageScanner:
+    """
+    Subtree sizes for `/du`. Directories are listed in parallel with `os.scandir`, each listing is reduced to the
+    directory's own file bytes and its subdirectories and cached while the directory's mtime is unchanged (and for
+    at most `ttl` seconds, a file growing in place doesn't touch its directory's mtime). Subtree totals are kept for
+    the same `ttl`, so drilling down into a scanned tree needs no rescan at all. Like `du -x`, the walk stays on
+    the filesystem it starts on and doesn't follow symlinks.
+    """
+
+    def __init__(self, threads: int = 4, ttl: float = 300.0, max_dirs: int = 200_000):
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="systamer-du")
+        self._ttl = ttl
+        self._max_dirs = max_dirs
+        self._records: "OrderedDict[str, _DirRecord]" = OrderedDict()
+        self._totals: Dict[str, Tuple[float, int, int]] = dict()  # path -> (expires_at, bytes, files)
+        self._lock = threading.Lock()
+
+    def _record(self, path: str, root_dev: int) -> Optional[_DirRecord]:
+        stat = os.stat(path, follow_symlinks=False)
+        if stat.st_dev != root_dev:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            cached = self._records.get(path)
+            if cached and cached.mtime_ns == stat.st_mtime_ns and cached.expires_at > now:
+                self._records.move_to_end(path)
+                return cached
+
+        own_bytes, files, subdirs, sizes = 0, 0, list(), list()
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                        continue
+                    size = _allocated(entry.stat(follow_symlinks=False))
+                except OSError:
+                    continue  # vanished while listing
+                own_bytes += size
+                files += 1
+                sizes.append((size, entry.name))
+        record = _DirRecord(stat.st_mtime_ns, now + self._ttl, own_bytes, files, tuple(subdirs),
+                            tuple(heapq.nlargest(DU_TOP_FILES, sizes)))
+        with self._lock:
+            self._records[path] = record
+            self._records.move_to_end(path)
+            while len(self._records) > self._max_dirs:
+                self._records.popitem(last=False)
+        return record
+
+    def _cached_total(self, path: str, now: float) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            cached = self._totals.get(path)
+        return cached[1:] if cached and cached[0] > now else None
+
+    def _walk(self, root: str, root_dev: int, skip: Optional[Callable[[str, bool], bool]],
+              stop: Optional[threading.Event], reuse_totals: bool) -> Tuple[Dict[str, _DirRecord], int]:
+        # with `reuse_totals`, subtrees that still have a fresh total are not entered
+        now = time.monotonic()
+        records: Dict[str, _DirRecord] = dict()
+        pending: Dict[Future, str] = {self._executor.submit(self._record, root, root_dev): root}
+        unreadable = 0
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                if stop is not None and stop.is_set():
+                    raise InterruptedError("disk usage scan was stopped")
+                for future in done:
+                    directory = pending.pop(future)
+                    try:
+                        record = future.result()
+                    except OSError:
+                        if directory == root:
+                            raise
+                        unreadable += 1
+                        continue
+                    if record is None:
+                        continue
+                    records[directory] = record
+                    for name in record.subdirs:
+                        path = os.path.join(directory, name)
+                        if skip is not None and skip(path, True):
+                            continue
+                        if not reuse_totals or self._cached_total(path, now) is None:
+                            pending[self._executor.submit(self._record, path, root_dev)] = path
+        finally:
+            for future in pending:
+                future.cancel()
+        return records, unreadable
+
+    def usage(self, path: str, top: int = 15, skip: Optional[Callable[[str, bool], bool]] = None,
+              stop: Optional[threading.Event] = None, reuse_totals: bool = True) -> DiskUsage:
+        """
+        Total size of `path` and its `top` largest children, `skip(path, is_dir)` leaves entries out. Without
+        `reuse_totals` every directory is checked again (unchanged ones are still not listed), for when the
+        caller wants to see a cleanup right away.
+        """
+        path = os.path.abspath(path)
+        root_dev = os.stat(path).st_dev
+        now = time.monotonic()
+        records, unreadable = self._walk(path, root_dev, skip, stop, reuse_totals)
+        if path not in records:
+            raise NotADirectoryError(f"{path} is not a directory on this filesystem")
+
+        # bottom up, deepest directories first - every subdirectory is either in `records` or has a fresh total
+        totals: Dict[str, Tuple[int, int]] = dict()
+        for directory in sorted(records, key=lambda p: p.count(os.sep), reverse=True):
+            record = records[directory]
+            size, files = record.own_bytes, record.files
+            for name in record.subdirs:
+                child = os.path.join(directory, name)
+                child_total = totals.get(child) or self._cached_total(child, now)
+                if child_total is not None:
+                    size += child_total[0]
+                    files += child_total[1]
+            totals[directory] = (size, files)
+        with self._lock:
+            for directory, (size, files) in totals.items():
+                self._totals[directory] = (now + self._ttl, size, files)
+            for directory in [d for d, (expires_at, _, _) in self._totals.items() if expires_at <= now]:
+                del self._totals[directory]
+
+        record = records[path]
+        children = list()
+        for name in record.subdirs:
+            child = os.path.join(path, name)
+            if skip is not None and skip(child, True):
+                continue
+            child_total = totals.get(child) or self._cached_total(child, now)
+            if child_total is not None:
+                children.append(DiskUsageChild(name, child, child_total[0], True))
+        for size, name in record.top_files:
+            child = os.path.join(path, name)
+            if skip is None or not skip(child, False):
+                children.append(DiskUsageChild(name, child, size, False))
+        children.sort(key=lambda c: c.size, reverse=True)
+        return DiskUsage(path, totals[path][0], totals[path][1], children[:top], unreadable)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import fnmatch
+import sqlite3
+import threading
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+FIND_LABEL_LENGTH = 60
+FIND_RACY_WINDOW_NS = 2 * 10 ** 9  # a directory changed this recently may change again within the same mtime tick
+
+
+class FindStats(NamedTuple):
+    matches: int
+    dirs_scanned: int  # listed with scandir
+    dirs_indexed: int  # served from the index, their mtime was unchanged
+    truncated: bool  # stopped at the result cap or on request
+
+
+def _name_matcher(pattern: str) -> Callable[[str], bool]:
+    # globs match the whole name, anything else is a substring - both case insensitive
+    pattern = pattern.lower()
+    if any(c in pattern for c in "*?["):
+        return lambda name: fnmatch.fnmatchcase(name.lower(), pattern)
+    return lambda name: pattern in name.lower()
+
+
+class FileFinder:
+    """
+    Parallel filename search. Directories are listed with `os.scandir` on a thread pool, a directory's
+    subdirectories are queued as soon as its listing is in, and matches are reported as they're found.
+    The walk stays on the root's filesystem and doesn't follow symlinked directories.
+
+    With `db_path` set, every listing is kept in a sqlite index keyed by the directory's mtime (which changes
+    whenever an entry is added, removed or renamed). A repeated search then costs one stat per directory,
+    unchanged directories are read back from the index instead of being listed again.
+    """
+
+    def __init__(self, threads: int = 4, db_path: Optional[str] = None):
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="systamer-find")
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            # paths are stored as bytes, file names don't have to be valid utf-8
+            self._db.execute("CREATE TABLE IF NOT EXISTS dirs (path BLOB PRIMARY KEY, mtime_ns INTEGER, "
+                             "entries TEXT)")
+            self._db.commit()
+
+    def _indexed(self, key: bytes, mtime_ns: int) -> Optional[List[Tuple[str, bool]]]:
+        with self._lock:
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT mtime_ns, entries FROM dirs WHERE path = ?", (key,)).fetchone()
+        if row is None or row[0] != mtime_ns:
+            return None
+        return [(name, bool(is_dir)) for name, is_dir in json.loads(row[1])]
+
+    def _store(self, key: bytes, mtime_ns: int, entries: List[Tuple[str, bool]]) -> None:
+        with self._lock:
+            if self._db is None:
+                return
+            old = self._db.execute("SELECT entries FROM dirs WHERE path = ?", (key,)).fetchone()
+            if old is not None:
+                # subdirectories that are gone take their indexed subtree with them
+                kept = set(name for name, is_dir in entries if is_dir)
+                for name, is_dir in json.loads(old[0]):
+                    if is_dir and name not in kept:
+                        child = key + b"/" + os.fsencode(name)
+                        self._db.execute("DELETE FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?",
+                                         (child, len(child) + 1, child + b"/"))
+            # json escapes lone surrogates, so undecodable names round trip
+            self._db.execute("INSERT OR REPLACE INTO dirs (path, mtime_ns, entries) VALUES (?, ?, ?)",
+                             (key, mtime_ns, json.dumps(entries)))
+
+    def _list(self, path: str, root_dev: int) -> Tuple[Optional[List[Tuple[str, bool]]], bool]:
+        """(entries, from index) - no entries for a directory on another filesystem"""
+        stat = os.stat(path)
+        if stat.st_dev != root_dev:
+            return None, False
+        key = os.fsencode(path)
+        entries = self._indexed(key, stat.st_mtime_ns)
+        if entries is not None:
+            return entries, True
+        entries = list()
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_dir = False
+                entries.append((entry.name, is_dir))
+        if time.time_ns() - stat.st_mtime_ns > FIND_RACY_WINDOW_NS:
+            self._store(key, stat.st_mtime_ns, entries)
+        return entries, False
+
+    def search(self, root: str, pattern: str, on_match: Callable[[str, bool], None], max_results: int = 50,
+               skip: Optional[Callable[[str, bool], bool]] = None,
+               stop: Optional[threading.Event] = None) -> FindStats:
+        """
+        Calls `on_match(path, is_dir)` for every entry under `root` whose name matches `pattern`, until
+        `max_results` were found or `stop` is set. Entries for which `skip(path, is_dir)` is true are left
+        out together with their subtree. Unreadable directories are skipped.
+        """
+        matches = _name_matcher(pattern)
+        root_dev = os.stat(root).st_dev
+        pending: Dict[Future, str] = {self._executor.submit(self._list, root, root_dev): root}
+        found = scanned = indexed = 0
+        truncated = False
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                if stop is not None and stop.is_set():
+                    truncated = True
+                    break
+                for future in done:
+                    directory = pending.pop(future)
+                    try:
+                        entries, from_index = future.result()
+                    except OSError:
+                        continue
+                    if entries is None:
+                        continue
+                    indexed += from_index
+                    scanned += not from_index
+                    for name, is_dir in entries:
+                        path = os.path.join(directory, name)
+                        if skip is not None and skip(path, is_dir):
+                            continue
+                        if matches(name):
+                            on_match(path, is_dir)
+                            found += 1
+                            if found >= max_results:
+                                truncated = True
+                                return FindStats(found, scanned, indexed, truncated)
+                        if is_dir:
+                            pending[self._executor.submit(self._list, path, root_dev)] = path
+        finally:
+            for future in pending:
+                future.cancel()
+            with self._lock:
+                if self._db is not None:
+                    self._db.commit()
+        return FindStats(found, scanned, indexed, truncated)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
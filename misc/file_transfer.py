@@ -0,0 +1,247 @@
+import os
+import zlib
+import gzip
+import tarfile
+import asyncio
+import hashlib
+import tempfile
+import concurrent.futures
+
+from typing import AsyncIterator, BinaryIO, Callable, List, NamedTuple, Optional
+
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 ** 2  # bot API limit for sending documents
+DEFAULT_PART_SIZE = TELEGRAM_UPLOAD_LIMIT - 1024 ** 2  # leave room for the multipart envelope
+READ_BUFFER_SIZE = 1024 ** 2
+SPOOL_SIZE = 8 * 1024 ** 2  # parts larger than this spill from memory to a temporary file
+COMPRESSION_SAMPLE_SIZE = 256 * 1024
+COMPRESSION_MIN_RATIO = 0.9  # compress only when a sample shrinks by at least 10%
+
+_COMPRESSED_EXTENSIONS = {
+    ".gz", ".tgz", ".bz2", ".xz", ".zst", ".zip", ".7z", ".rar", ".jar", ".apk", ".deb", ".rpm",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp3", ".ogg", ".mp4", ".mkv", ".webm", ".mov", ".pdf",
+}
+
+
+class TransferAborted(Exception):
+    pass
+
+
+class TransferTooLarge(Exception):
+    pass
+
+
+class TransferPart(NamedTuple):
+    index: int
+    file: BinaryIO
+    size: int
+    sha256: str
+
+
+class PartWriter:
+    """
+    Write-only file object that splits whatever is written into numbered parts of at most `part_size` bytes.
+    Finished parts are handed to `put`, which blocks while the consumer is behind - so the producer never holds
+    more than the current part (spooled to disk past `SPOOL_SIZE`) on top of what is queued.
+    """
+
+    def __init__(self, part_size: int, put: Callable[[Optional[TransferPart]], None]):
+        self._part_size = part_size
+        self._put = put
+        self._current: Optional[BinaryIO] = None
+        self._current_size = 0
+        self._current_sha = None
+        self._index = 0
+        self._total_sha = hashlib.sha256()
+        self.total_size = 0
+        self.source_bytes = 0  # producer's input progress, for status updates
+        self.aborted = False
+
+    @property
+    def parts(self) -> int:
+        return self._index
+
+    @property
+    def sha256(self) -> str:
+        return self._total_sha.hexdigest()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.aborted:
+            raise TransferAborted()
+        view = memoryview(data).cast("B")
+        while view:
+            if self._current is None:
+                self._current = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+                self._current_size = 0
+                self._current_sha = hashlib.sha256()
+            chunk = view[:self._part_size - self._current_size]
+            self._current.write(chunk)
+            self._current_sha.update(chunk)
+            self._total_sha.update(chunk)
+            self._current_size += len(chunk)
+            self.total_size += len(chunk)
+            view = view[len(chunk):]
+            if self._current_size >= self._part_size:
+                self._finish_part()
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def _finish_part(self) -> None:
+        self._index += 1
+        self._current.seek(0)
+        part = TransferPart(self._index, self._current, self._current_size, self._current_sha.hexdigest())
+        self._current = None
+        self._put(part)
+
+    def close(self) -> None:
+        if self._current is not None and self._current_size:
+            self._finish_part()
+        self._put(None)  # end of stream
+
+
+class PartStream:
+    """Bridges a blocking producer thread writing into `writer` and an async consumer iterating the parts"""
+
+    def __init__(self, part_size: int, max_pending: int):
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.writer = PartWriter(part_size, self._put)
+
+    def _put(self, part: Optional[TransferPart]) -> None:
+        # called from the producer thread
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(part), self._loop)
+        while True:
+            try:
+                return future.result(timeout=1)
+            except concurrent.futures.TimeoutError:
+                if self.writer.aborted:
+                    future.cancel()
+                    raise TransferAborted()
+
+    def abort(self) -> None:
+        self.writer.aborted = True
+        while not self._queue.empty():  # release parts nobody is going to send
+            part = self._queue.get_nowait()
+            if part is not None:
+                part.file.close()
+
+    async def parts(self, producer: asyncio.Future) -> AsyncIterator[TransferPart]:
+        # also watches the producer - if it fails, the end-of-stream marker never arrives
+        while True:
+            getter = asyncio.ensure_future(self._queue.get())
+            await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                if producer.exception() is not None:
+                    getter.cancel()
+                    raise producer.exception()
+            part = await getter
+            if part is None:
+                return
+            yield part
+
+
+def should_compress(path: str) -> bool:
+    if os.path.splitext(path)[1].lower() in _COMPRESSED_EXTENSIONS:
+        return False
+    with open(path, 'rb') as file:
+        sample = file.read(COMPRESSION_SAMPLE_SIZE)
+    return bool(sample) and len(zlib.compress(sample, 1)) < len(sample) * COMPRESSION_MIN_RATIO
+
+
+def stream_file(path: str, writer: PartWriter, compress: bool) -> None:
+    # reads through one fixed buffer, the file is never loaded as a whole
+    buffer = bytearray(READ_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb') as src:
+        sink = gzip.GzipFile(filename=os.path.basename(path), mode='wb', fileobj=writer, compresslevel=6) \
+            if compress else writer
+        while True:
+            read = src.readinto(buffer)
+            if not read:
+                break
+            sink.write(view[:read])
+            writer.source_bytes += read
+        if compress:
+            sink.close()  # writes the gzip trailer, doesn't close `writer`
+    writer.close()
+
+
+def directory_size(path: str, is_ignored: Callable[[os.DirEntry], bool], size_cap: int) -> int:
+    """
+    Bytes of the regular files `stream_directory_tar` would archive, raises TransferTooLarge as soon as they pass
+    `size_cap` - run before the first part goes out, so an oversized folder is rejected without sending anything
+    """
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue  # skipped by the archive as well
+        with entries:
+            for entry in entries:
+                if is_ignored(entry):
+                    continue
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                        if total > size_cap:
+                            raise TransferTooLarge(f"folder exceeds the {size_cap / 1024 ** 2:.0f} MB cap")
+                    elif entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                except (PermissionError, FileNotFoundError):
+                    continue
+    return total
+
+
+def stream_directory_tar(path: str, writer: PartWriter, is_ignored: Callable[[os.DirEntry], bool],
+                         size_cap: int) -> int:
+    """
+    Writes `path` as a gzipped tar into `writer`, walking it with scandir as the archive is produced - nothing is
+    staged. Symlinks are stored as links, ignored entries are pruned with their subtree. Returns the number of
+    entries that were skipped because they couldn't be read.
+    """
+    root_name = os.path.basename(path.rstrip(os.sep)) or "root"
+    skipped = 0
+    with tarfile.open(fileobj=writer, mode="w|gz") as tar:
+        tar.add(path, arcname=root_name, recursive=False)
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            try:
+                entries = os.scandir(current)
+            except OSError:
+                skipped += 1
+                continue
+            with entries:
+                for entry in entries:
+                    if is_ignored(entry):
+                        continue
+                    arcname = os.path.join(root_name, os.path.relpath(entry.path, path))
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            size = entry.stat(follow_symlinks=False).st_size
+                            if writer.source_bytes + size > size_cap:  # grew since `directory_size` checked
+                                raise TransferTooLarge(f"folder exceeds the {size_cap / 1024 ** 2:.0f} MB cap")
+                            with open(entry.path, 'rb') as file:  # open first - unreadable files are skipped whole
+                                tar.addfile(tar.gettarinfo(arcname=arcname, fileobj=file), file)
+                            writer.source_bytes += size
+                        else:
+                            tar.add(entry.path, arcname=arcname, recursive=False)
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                    except (PermissionError, FileNotFoundError):
+                        skipped += 1
+    writer.close()
+    return skipped
+
+
+def build_manifest(name: str, part_names: List[str], part_hashes: List[str], sha256: str) -> bytes:
+    # `sha256sum -c` compatible - verifies the parts, and the reassembled file once it exists
+    lines = [f"{digest}  {part_name}" for digest, part_name in zip(part_hashes, part_names)]
+    lines.append(f"{sha256}  {name}")
+    return ("\n".join(lines) + "\n").encode()
@@ -0,0 +1,387 @@
+import os
+import hmac
+import json
+import socket
+import struct
+import asyncio
+import hashlib
+import secrets
+import subprocess
+
+from types import SimpleNamespace
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .output_manager import *
+from .workers import WorkerPool
+from .dir_listing import DirListingCache
+from .ignore_rules import IgnoreMatcher
+from .metrics_sampler import MetricsSampler, MetricsSample
+from .process_tracker import ProcessTracker, PROC_SORT_KEYS, resolve_kill_targets, terminate_processes
+
+FLEET_DEFAULT_PORT = 7070
+FLEET_NONCE_SIZE = 16
+FLEET_MAX_FRAME_SIZE = 16 * 1024 ** 2
+FLEET_MAX_REQUEST_SIZE = 64 * 1024  # what an agent reads before it can check the MAC - requests are small
+FLEET_SYSTEMCTL_COMMANDS = {"status", "start", "stop", "restart", "enable", "disable"}
+FLEET_SYSTEMCTL_LIST = ("list-units", "--type=service", "--no-pager", "--no-legend")
+FLEET_PENDING_KILLS_MAX = 16
+FLEET_MAX_KILL_TIMEOUT = 60
+
+_MAC_SIZE = hashlib.sha256().digest_size
+
+
+class FleetProtocolError(Exception):
+    pass
+
+
+class FleetRemoteError(Exception):
+    pass
+
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    # "unix:/run/systamer.sock", "host:port" or a bare host (default port)
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+    return "tcp", (host.strip("[]") or "127.0.0.1", int(port) if port else FLEET_DEFAULT_PORT)
+
+
+async def _open_connection(address: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    kind, target = parse_address(address)
+    if kind == "unix":
+        return await asyncio.open_unix_connection(target, limit=FLEET_MAX_FRAME_SIZE)
+    return await asyncio.open_connection(*target, limit=FLEET_MAX_FRAME_SIZE)
+
+
+async def _read_frame(reader: asyncio.StreamReader, max_size: int = FLEET_MAX_FRAME_SIZE) -> bytes:
+    (length,) = struct.unpack(">I", await reader.readexactly(4))
+    if length > max_size:
+        raise FleetProtocolError(f"frame of {length} bytes exceeds the limit")
+    return await reader.readexactly(length)
+
+
+def _write_frame(writer: asyncio.StreamWriter, payload: bytes) -> None:
+    writer.write(struct.pack(">I", len(payload)) + payload)
+
+
+class _Session:
+    """
+    Per-connection authentication. Both ends contribute a random nonce, the session key is derived from the
+    shared secret and both nonces, and every frame carries an HMAC over its direction, sequence number and body -
+    frames can't be forged, replayed, reordered or moved to another connection.
+    """
+
+    def __init__(self, secret: bytes, client_nonce: bytes, server_nonce: bytes, is_server: bool):
+        self._key = hmac.new(secret, b"systamer-fleet" + client_nonce + server_nonce, hashlib.sha256).digest()
+        self._send_direction, self._recv_direction = (b"R", b"Q") if is_server else (b"Q", b"R")
+        self._send_seq = 0
+        self._recv_seq = 0
+
+    def _mac(self, direction: bytes, seq: int, body: bytes) -> bytes:
+        return hmac.new(self._key, direction + struct.pack(">Q", seq) + body, hashlib.sha256).digest()
+
+    def seal(self, message: Dict[str, Any]) -> bytes:
+        body = json.dumps(message, separators=(",", ":")).encode()
+        self._send_seq += 1
+        return self._mac(self._send_direction, self._send_seq, body) + body
+
+    def open(self, frame: bytes) -> Dict[str, Any]:
+        mac, body = frame[:_MAC_SIZE], frame[_MAC_SIZE:]
+        self._recv_seq += 1
+        if not hmac.compare_digest(mac, self._mac(self._recv_direction, self._recv_seq, body)):
+            raise FleetProtocolError("bad frame authentication")
+        return json.loads(body)
+
+
+def _usage_dict(usage) -> Dict[str, float]:
+    return {"percent": usage.percent, "used": usage.used, "total": usage.total}
+
+
+def sample_to_dict(sample: MetricsSample, averages: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    return {
+        "hostname": socket.gethostname(),
+        "cpu_percent": sample.cpu_percent,
+        "cpu_per_core": sample.cpu_per_core,
+        "memory": _usage_dict(sample.memory),
+        "swap": _usage_dict(sample.swap),
+        "disk": _usage_dict(sample.disk),
+        "load_avg": list(sample.load_avg),
+        "averages": averages,
+    }
+
+
+def usage_from_dict(usage: Dict[str, float]) -> SimpleNamespace:
+    # stands in for the psutil named tuples the message generators read
+    return SimpleNamespace(**usage)
+
+
+class FleetAgent:
+    """
+    Headless agent - serves system stats, processes, kill, systemctl and directory listings to a controller over
+    length-prefixed, HMAC-authenticated JSON frames. Blocking work goes through the same worker pool categories
+    the bot uses. The agent keeps the bot's guards for itself: a kill takes two calls - `kill_targets` resolves
+    and holds the targets under a token, `kill` acts on that token only once the user confirmed - and never
+    touches the agent or its parent, systemctl is limited to a fixed set of commands on a single unit, and
+    listings follow the agent's own `.browseignore`.
+    """
+
+    def __init__(self, secret: str, json_conf: dict, ignore_path: str = ".browseignore"):
+        self._secret = secret.encode()
+        self._sampler = MetricsSampler(interval=json_conf.get("sample_interval", 5))
+        self._tracker = ProcessTracker(interval=json_conf.get("process_refresh_interval", 5))
+        self._workers = WorkerPool(processes=1, categories=json_conf.get("worker_limits", None))
+        self._listing_cache = DirListingCache(ttl=json_conf.get("browse_cache_ttl", 30))
+        self._ignore_matcher = IgnoreMatcher.from_file(ignore_path)
+        self._browse_page_size = json_conf.get("browse_page_size", 40)
+        self._pending_kills: "OrderedDict[str, List[Tuple[int, Optional[float]]]]" = OrderedDict()
+        self._methods: Dict[str, Callable[..., Awaitable[Any]]] = {
+            "ping": self._rpc_ping,
+            "system": self._rpc_system,
+            "processes": self._rpc_processes,
+            "kill_targets": self._rpc_kill_targets,
+            "kill": self._rpc_kill,
+            "systemctl": self._rpc_systemctl,
+            "browse": self._rpc_browse,
+        }
+
+    async def _rpc_ping(self) -> Dict[str, Any]:
+        return {"hostname": socket.gethostname()}
+
+    async def _rpc_system(self) -> Dict[str, Any]:
+        sample = self._sampler.latest() or self._sampler.record(await self._workers.run("fs", self._sampler.collect))
+        return sample_to_dict(sample, self._sampler.window_averages())
+
+    async def _rpc_processes(self, filters: Optional[List[str]] = None, sort: str = "cpu",
+                             top: int = 30) -> Dict[str, Any]:
+        if sort not in PROC_SORT_KEYS:
+            raise ValueError(f"unknown sort key {sort}")
+        snapshot = self._tracker.snapshot or await self._workers.run("fs", self._tracker.refresh)
+        processes = ProcessTracker.matching(snapshot.values(), [f.lower() for f in filters or ()])
+        return {"total": len(processes), "processes": ProcessTracker.top(processes, sort, int(top))}
+
+    @staticmethod
+    def _protected_pids() -> Set[int]:
+        # a broad pattern must not take the agent down with it, nor whatever supervises it
+        return {os.getpid(), os.getppid()}
+
+    async def _rpc_kill_targets(self, pids: Optional[List[int]] = None,
+                                patterns: Optional[List[str]] = None) -> Dict[str, Any]:
+        pids = [int(pid) for pid in pids or ()]
+        if patterns:
+            snapshot = self._tracker.snapshot or await self._workers.run("fs", self._tracker.refresh)
+            pids += [proc["pid"] for proc in ProcessTracker.matching_names(snapshot.values(), patterns)]
+        targets, missing = await self._workers.run("fs", resolve_kill_targets,
+                                                   sorted(set(pids) - self._protected_pids()))
+        token = None
+        if targets:
+            token = secrets.token_hex(8)
+            self._pending_kills[token] = [(pid, create_time) for pid, _, create_time in targets]
+            while len(self._pending_kills) > FLEET_PENDING_KILLS_MAX:
+                self._pending_kills.popitem(last=False)
+        return {"token": token, "targets": targets, "missing": missing}
+
+    async def _rpc_kill(self, token: str, timeout: float = 5) -> List[str]:
+        targets = self._pending_kills.pop(token, None)
+        if targets is None:
+            raise ValueError("unknown or expired kill token")
+        protected = self._protected_pids()
+        result = await self._workers.run("signal", terminate_processes,
+                                         [target for target in targets if target[0] not in protected],
+                                         timeout=min(float(timeout), FLEET_MAX_KILL_TIMEOUT))
+        return result.summary()
+
+    async def _rpc_systemctl(self, args: List[str]) -> Dict[str, Any]:
+        args = [str(arg) for arg in args]
+        allowed = tuple(args) == FLEET_SYSTEMCTL_LIST or \
+            (len(args) == 2 and args[0] in FLEET_SYSTEMCTL_COMMANDS and args[1] and not args[1].startswith("-"))
+        if not allowed:
+            raise ValueError(f"systemctl {' '.join(args)} is not allowed")
+        timeout = self._workers.timeout_for("subprocess")
+        result = await self._workers.run("subprocess", subprocess.run, ["systemctl", *args],
+                                         capture_output=True, text=True, timeout=timeout)
+        return {"returncode": result.returncode, "stdout": result.stdout, "stderr": result.stderr}
+
+    def _list_directory(self, path: str, page: int) -> Dict[str, Any]:
+        path = os.path.abspath(os.path.expanduser(path))
+        resolved = os.path.realpath(path)
+        if self._ignore_matcher.is_ignored(path) or self._ignore_matcher.is_ignored(resolved):
+            raise PermissionError(f"{path} is excluded by the agent's .browseignore")
+        entries = self._listing_cache.list(path, lambda entry: self._ignore_matcher.is_entry_ignored(entry, resolved))
+        start = page * self._browse_page_size
+        return {"path": path, "total": len(entries), "page_size": self._browse_page_size,
+                "entries": [[entry.name, entry.is_dir] for entry in entries[start:start + self._browse_page_size]]}
+
+    async def _rpc_browse(self, path: str = "~", page: int = 0) -> Dict[str, Any]:
+        return await self._workers.run("fs", self._list_directory, str(path), max(int(page), 0))
+
+    async def _dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        method = self._methods.get(request.get("method"))
+        if method is None:
+            return {"id": request.get("id"), "error": f"unknown method {request.get('method')}"}
+        try:
+            return {"id": request.get("id"), "result": await method(**request.get("params", dict()))}
+        except Exception as exc:
+            return {"id": request.get("id"), "error": f"{type(exc).__name__}: {exc}"}
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername") or "unix socket"
+        try:
+            # nothing is authenticated yet - don't buffer more than a nonce for whoever connects
+            client_nonce = await asyncio.wait_for(_read_frame(reader, FLEET_NONCE_SIZE), timeout=10)
+            if len(client_nonce) != FLEET_NONCE_SIZE:
+                raise FleetProtocolError("bad handshake")
+            server_nonce = os.urandom(FLEET_NONCE_SIZE)
+            _write_frame(writer, server_nonce)
+            session = _Session(self._secret, client_nonce, server_nonce, is_server=True)
+            while True:
+                request = session.open(await _read_frame(reader, FLEET_MAX_REQUEST_SIZE))
+                _write_frame(writer, session.seal(await self._dispatch(request)))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass  # controller closed the connection
+        except (FleetProtocolError, ValueError, asyncio.TimeoutError, ConnectionError) as exc:
+            print_error(f"Dropping fleet connection from {peer}: {exc}")
+        finally:
+            writer.close()
+
+    async def serve_forever(self, address: str) -> None:
+        kind, target = parse_address(address)
+        if kind == "unix":
+            if os.path.exists(target):
+                os.remove(target)  # left behind by a previous run
+            server = await asyncio.start_unix_server(self._serve_connection, target, limit=FLEET_MAX_FRAME_SIZE)
+            os.chmod(target, 0o600)
+        else:
+            server = await asyncio.start_server(self._serve_connection, *target, limit=FLEET_MAX_FRAME_SIZE)
+        print_info(f"Fleet agent listening on -> {BOLD}{address}{RESET}")
+        background = [asyncio.create_task(self._sampler.run_forever()),
+                      asyncio.create_task(self._tracker.run_forever())]
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+            self._workers.shutdown()
+
+
+class _FleetConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, session: _Session):
+        self._reader = reader
+        self._writer = writer
+        self._session = session
+        self._next_id = 0
+
+    @classmethod
+    async def open(cls, address: str, secret: bytes) -> "_FleetConnection":
+        reader, writer = await _open_connection(address)
+        try:
+            client_nonce = os.urandom(FLEET_NONCE_SIZE)
+            _write_frame(writer, client_nonce)
+            server_nonce = await _read_frame(reader, FLEET_NONCE_SIZE)
+        except BaseException:
+            writer.close()
+            raise
+        return cls(reader, writer, _Session(secret, client_nonce, server_nonce, is_server=False))
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Any:
+        self._next_id += 1
+        _write_frame(self._writer, self._session.seal({"id": self._next_id, "method": method, "params": params}))
+        await self._writer.drain()
+        response = self._session.open(await _read_frame(self._reader))
+        if response.get("id") != self._next_id:
+            raise FleetProtocolError("response out of order")
+        if "error" in response:
+            raise FleetRemoteError(response["error"])
+        return response.get("result")
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class _HostPool:
+    """Keeps up to `size` authenticated connections to one agent, idle ones are reused by the next call"""
+
+    def __init__(self, address: str, secret: bytes, timeout: float, size: int):
+        self.address = address
+        self.timeout = timeout
+        self._secret = secret
+        self._size = size
+        self._idle: List[_FleetConnection] = list()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _call_once(self, method: str, params: Dict[str, Any]) -> Tuple[Any, bool]:
+        reused = bool(self._idle)
+        connection = self._idle.pop() if reused else await _FleetConnection.open(self.address, self._secret)
+        try:
+            result = await connection.call(method, params)
+        except FleetRemoteError:
+            self._idle.append(connection)  # the agent answered, the connection is fine
+            raise
+        except (ConnectionError, asyncio.IncompleteReadError):
+            connection.close()
+            if reused:
+                return None, False  # probably closed by an agent restart - the caller retries on a new one
+            raise
+        except BaseException:  # timeouts and protocol errors leave the connection in an unknown state
+            connection.close()
+            raise
+        self._idle.append(connection)
+        return result, True
+
+    async def call(self, method: str, params: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._size)
+        async with self._semaphore:
+            async def _call():
+                result, ok = await self._call_once(method, params)
+                if not ok:
+                    result, ok = await self._call_once(method, params)
+                return result
+            return await asyncio.wait_for(_call(), timeout or self.timeout)
+
+    def close(self) -> None:
+        for connection in self._idle:
+            connection.close()
+        self._idle.clear()
+
+
+class FleetController:
+    """
+    Client side of fleet mode: one connection pool per configured host, requests fan out to all of them at once
+    and each host is bounded by its own timeout, so one slow agent doesn't hold up the rest.
+    `hosts` maps a name to an address, or to {"address": ..., "timeout": ..., "secret": ...}.
+    """
+
+    def __init__(self, hosts: Dict[str, Any], secret: Optional[str], timeout: float = 5.0, pool_size: int = 2):
+        self._pools: Dict[str, _HostPool] = dict()
+        for name, host in hosts.items():
+            host = host if isinstance(host, dict) else {"address": host}
+            host_secret = host.get("secret", secret)
+            if not host_secret:
+                raise Exception(f"fleet host {name} has no secret, set `fleet_secret` in the config")
+            self._pools[name] = _HostPool(host["address"], host_secret.encode(), float(host.get("timeout", timeout)),
+                                          int(host.get("pool_size", pool_size)))
+
+    @property
+    def hosts(self) -> List[str]:
+        return list(self._pools)
+
+    def timeout_for(self, host: str) -> float:
+        return self._pools[host].timeout
+
+    async def call(self, host: str, method: str, *, call_timeout: Optional[float] = None, **params) -> Any:
+        """`call_timeout` replaces the host's timeout for methods that take longer by design (kill, systemctl)"""
+        return await self._pools[host].call(method, params, call_timeout)
+
+    async def fan_out(self, method: str, hosts: Optional[List[str]] = None, **params) -> Dict[str, Any]:
+        """Calls every host concurrently - values are results, or the exception a host failed with"""
+        names = hosts or self.hosts
+        results = await asyncio.gather(*[self.call(name, method, **params) for name in names], return_exceptions=True)
+        return dict(zip(names, results))
+
+    def close(self) -> None:
+        for pool in self._pools.values():
+            pool.close()
@@ -0,0 +1,156 @@
+import math
+import time
+import asyncio
+
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple
+
+from .output_manager import *
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, the same layout prometheus expects, with interpolated quantiles"""
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total, buckets = 0, list()
+        for bound, bucket_count in zip(list(self.bounds) + [math.inf], self.counts):
+            total += bucket_count
+            buckets.append(("+Inf" if bound == math.inf else f"{bound:g}", total))
+        return buckets
+
+
+class HandlerStats:
+    """Per-command call / error counts and latency histograms, filled in by the handler decorators"""
+
+    def __init__(self):
+        self.latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.denied: Dict[Tuple[str, str], int] = defaultdict(int)  # (command, reason)
+        self.started = time.time()
+
+    def record(self, command: str, seconds: float, failed: bool = False) -> None:
+        self.latency[command].observe(seconds)
+        if failed:
+            self.errors[command] += 1
+
+    def record_denied(self, command: str, reason: str) -> None:
+        self.denied[(command, reason)] += 1
+
+
+class LoopLagProbe:
+    """Schedules a wake-up every `interval` seconds, how late it fires is how long the loop was blocked"""
+
+    def __init__(self, interval: float = 0.5):
+        self._interval = interval
+        self.histogram = Histogram(LOOP_LAG_BUCKETS)
+        self.last = 0.0
+
+    async def run_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self._interval)
+            self.last = max(loop.time() - start - self._interval, 0.0)
+            self.histogram.observe(self.last)
+
+
+class StartupProfile:
+    """Wall clock of the startup phases, counted from process creation so interpreter start & imports are included"""
+
+    def __init__(self, process_start: float):
+        self._start = process_start
+        self._marks: List[Tuple[str, float]] = list()
+
+    def mark(self, phase: str) -> None:
+        self._marks.append((phase, time.time()))
+
+    def report(self) -> List[str]:
+        lines, previous = list(), self._start
+        for phase, at in self._marks:
+            lines.append(f"{phase:<20} +{(at - previous) * 1000:8.1f} ms  (total {(at - self._start) * 1000:8.1f} ms)")
+            previous = at
+        return lines
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(name: str, histogram: Histogram, labels: str = "") -> List[str]:
+    prefix, suffix = (f"{labels},", f"{{{labels}}}") if labels else ("", "")
+    lines = [f'{name}_bucket{{{prefix}le="{bound}"}} {count}' for bound, count in histogram.cumulative()]
+    lines.append(f"{name}_sum{suffix} {histogram.sum}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
+
+
+def render_prometheus(stats: HandlerStats, probe: LoopLagProbe) -> str:
+    lines = ["# HELP systamer_handler_latency_seconds Handler latency by command.",
+             "# TYPE systamer_handler_latency_seconds histogram"]
+    for command, histogram in sorted(stats.latency.items()):
+        lines.extend(_histogram_lines("systamer_handler_latency_seconds", histogram, f'command="{_label(command)}"'))
+    lines += ["# HELP systamer_handler_errors_total Handler calls that raised.",
+              "# TYPE systamer_handler_errors_total counter"]
+    lines.extend(f'systamer_handler_errors_total{{command="{_label(command)}"}} {count}'
+                 for command, count in sorted(stats.errors.items()))
+    lines += ["# HELP systamer_handler_denied_total Calls refused for lack of authentication or permissions.",
+              "# TYPE systamer_handler_denied_total counter"]
+    lines.extend(f'systamer_handler_denied_total{{command="{_label(command)}",reason="{reason}"}} {count}'
+                 for (command, reason), count in sorted(stats.denied.items()))
+    lines += ["# HELP systamer_event_loop_lag_seconds How late the event loop served a scheduled wake-up.",
+              "# TYPE systamer_event_loop_lag_seconds histogram"]
+    lines.extend(_histogram_lines("systamer_event_loop_lag_seconds", probe.histogram))
+    lines += ["# TYPE systamer_start_time_seconds gauge", f"systamer_start_time_seconds {stats.started}"]
+    return "\n".join(lines) + "\n"
+
+
+async def serve_metrics(host: str, port: int, render: Callable[[], str]) -> None:
+    """Minimal HTTP endpoint answering every request with the prometheus text exposition"""
+
+    async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+            body = render().encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(_handle, host, port)
+    print_info(f"Serving metrics on -> {BOLD}http://{host}:{port}/metrics{RESET}")
+    async with server:
+        await server.serve_forever()
@@ -1,81 +1,350 @@
 import json
+import time
+import asyncio
 
 from .output_manager import *
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
 from pathlib import Path
 
+MAX_TELEGRAM_MSG_LEN = 4000  # a bit less than 4096 to be safe
+
 COMMANDS_DICT = {
     "start": "Get the list of all commands",
     "login": "Authenticate the session",
     "browse": "Navigate file system",
+    "find": "Find files by name",
+    "du": "Disk usage of a directory",
     "upload": "Upload a file to the server",
     "list_uploads": "Uploads directory contents",
+    "tail": "Last lines of a file",
+    "follow": "Stream new lines of a file",
     "system": "Get system resource usage",
+    "net": "Network throughput & connections",
+    "disks": "Usage of every mount & disk I/O",
     "processes": "Active processes <F=FILTER>",
-    "kill": "Kill a process by its PID",
+    "kill": "Kill processes by PID or name",
+    "proc": "Details of one process",
+    "ptree": "Process tree",
     "systemctl": "Handle systemd services",
     "screenshot": "Take & send a screenshot",
+    "record": "Record a short screen clip",
+    "stats": "Handler latency & loop lag",
+    "alerts": "Alert rules & their state",
     "logout": "De-authenticate the session",
     "help": "Refers to /start"
 }
 
 PARAMS_DICT = {
     "login": ["PASS"],
-    "processes": ["F"],
-    "kill": ["PID"],
-    "systemctl": ["ACT", "SRVC"]
+    "browse": ["@HOST", "PATH"],
+    "system": ["HOST|all"],
+    "processes": ["@HOST", "F", "sort=K", "top=N"],
+    "kill": ["@HOST", "PID|PAT"],
+    "proc": ["PID"],
+    "ptree": ["PID"],
+    "systemctl": ["@HOST", "ACT", "SRVC"],
+    "screenshot": ["MON", "FMT", "Q"],
+    "record": ["SEC", "FPS"],
+    "list_uploads": ["PAGE", "sort=K", "F"],
+    "find": ["PAT", "ROOT"],
+    "du": ["PATH"],
+    "tail": ["PATH", "N"],
+    "follow": ["PATH|stop"]
 }
 
 
-def generate_cmd_dict_msg(description, commands: dict) -> str:
-    header = f"{description}:\n| Command                  | Description                    |\n"
-    separator = "|--------------------------|--------------------------------|\n"
+def utf16_len(text: str) -> int:
+    # telegram counts message length in UTF-16 code units - emoji and other astral characters take two
+    return len(text.encode("utf-16-le")) // 2
+
+
+def escape_code(text: str) -> str:
+    # inside MarkdownV2 pre / code entities only ` and \ have to be escaped
+    return text.replace("\\", "\\\\").replace("`", "\\`")
+
+
+def _split_line(line: str, escape, budget: int) -> Iterator[str]:
+    # a single line longer than a whole message is hard wrapped, on characters so escapes are never cut in half
+    piece, size = list(), 0
+    for char in line:
+        char_len = utf16_len(escape(char))
+        if size + char_len > budget and piece:
+            yield "".join(piece)
+            piece, size = list(), 0
+        piece.append(char)
+        size += char_len
+    yield "".join(piece)
+
+
+def iter_message_chunks(lines: Iterable[str], header: Sequence[str] = (), code_block: bool = True,
+                        preamble: str = "", max_len: int = MAX_TELEGRAM_MSG_LEN) -> Iterator[str]:
+    """
+    Streams `lines` into ready to send messages of at most `max_len` UTF-16 code units, each starting with the
+    `header` lines (`preamble` is put before the first message only, as is). With `code_block` the text is escaped
+    for and wrapped in a MarkdownV2 pre block, and the length is measured after escaping and wrapping. Each line
+    is measured once, so rendering is linear in the output size.
+    """
+    escape = escape_code if code_block else (lambda text: text)
+    opening, closing = ("```\n", "```") if code_block else ("", "")
+    head = "".join(escape(line) + "\n" for line in header)
+    budget = max_len - utf16_len(opening + head + closing)
+
+    def _pieces(line: str) -> Iterator[str]:
+        escaped = escape(line) + "\n"
+        if utf16_len(escaped) <= budget:
+            yield escaped
+        else:
+            yield from (escape(piece) + "\n" for piece in _split_line(line, escape, budget - 1))
+
+    parts, size, rows = [preamble, opening, head], utf16_len(preamble), 0
+    for line in lines:
+        for piece in _pieces(line):
+            piece_len = utf16_len(piece)
+            if rows and size + piece_len > budget:
+                parts.append(closing)
+                yield "".join(parts)
+                parts, size, rows = [opening, head], 0, 0
+            parts.append(piece)
+            size += piece_len
+            rows += 1
+    if rows or header or preamble:  # an empty table still shows its header
+        parts.append(closing)
+        yield "".join(parts)
+
+
+def table_row(cells: Sequence[Any], widths: Sequence[int]) -> str:
+    return "| " + " | ".join(str(cell).ljust(width) for cell, width in zip(cells, widths)) + " |"
+
+
+def table_separator(widths: Sequence[int]) -> str:
+    return "|" + "|".join("-" * (width + 2) for width in widths) + "|"
+
+
+def generate_cmd_dict_msg(description, commands: dict, preamble: str = "") -> Iterator[str]:
+    widths = (24, 30)
+
+    def _rows():
+        for command, command_description in commands.items():
+            if command in PARAMS_DICT:
+                command += "\t" + ','.join([f"<{arg}>" for arg in PARAMS_DICT[command]])
+            yield table_row(("/" + command, command_description), widths)
+
+    return iter_message_chunks(_rows(), header=(f"{description}:", table_row(("Command", "Description"), widths),
+                                                table_separator(widths)), preamble=preamble)
+
+
+def format_size(num_bytes: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(num_bytes) < 1024 or unit == "TB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def _usage(info) -> str:
+    return f"{info.percent}% ({info.used / (1024 ** 3):.1f}/{info.total / (1024 ** 3):.1f} GB)"
+
+
+def generate_machine_stats_msg(description, cpu_usage, memory_info, disk_usage, swap_info=None, load_avg=None,
+                               per_core=None, averages=None) -> Iterator[str]:
+    widths = (10, 25)
+
+    def _rows():
+        yield table_row(("CPU", f"{cpu_usage}%"), widths)
+        for i in range(0, len(per_core or ()), 4):
+            cores = per_core[i:i + 4]
+            yield table_row((f"Cores {i}-{i + len(cores) - 1}", " ".join(f"{c:>4.0f}" for c in cores)), widths)
+        yield table_row(("Memory", _usage(memory_info)), widths)
+        if swap_info is not None:
+            yield table_row(("Swap", _usage(swap_info)), widths)
+        yield table_row(("Disk", _usage(disk_usage)), widths)
+        if load_avg is not None:
+            yield table_row(("Load", " ".join(f"{la:.2f}" for la in load_avg)), widths)
+        for label, avg in (averages or dict()).items():
+            yield table_row((f"Avg {label}", f"CPU {avg['cpu']:.1f}% Mem {avg['memory']:.1f}%"), widths)
+
+    return iter_message_chunks(_rows(), header=(description, table_row(("Resource", "Usage"), widths),
+                                                table_separator(widths)))
+
+
+def generate_proc_stats_msg(description, processes: list, show_io=False) -> Iterator[str]:
+    widths = (5, 20, 7, 8, 8) + ((9,) if show_io else ())
+    titles = ("PID", "Name", "CPU (%)", "Mem (%)", "RSS (MB)") + (("IO (KB/s)",) if show_io else ())
+
+    def _rows():
+        for proc in processes:
+            yield table_row((proc['pid'], (proc['name'] or "N/A")[:20], f"{proc['cpu_percent']:.1f}",
+                             f"{proc['memory_percent']:.1f}", f"{proc['rss'] / (1024 ** 2):.1f}",
+                             f"{proc['io_rate'] / 1024:.1f}"), widths)
+
+    return iter_message_chunks(_rows(), header=(description, table_row(titles, widths), table_separator(widths)))
+
+
+def generate_proc_detail_msg(description, info: Dict[str, Any], children: List[Dict[str, Any]]) -> Iterator[str]:
+    """`info` as returned by `ProcessTracker.details`, None marks what we weren't permitted to read"""
+    widths = (10, 30)
+
+    def _value(value, render=str):
+        return "N/A" if value is None else render(value)
+
+    def _rows():
+        yield table_row(("Name", _value(info["name"])), widths)
+        yield table_row(("Status", _value(info["status"])), widths)
+        yield table_row(("User", _value(info["username"])), widths)
+        yield table_row(("Parent", _value(info["ppid"])), widths)
+        yield table_row(("Started", _value(info["create_time"],
+                                           lambda t: time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)))), widths)
+        yield table_row(("CPU", _value(info["cpu_percent"], lambda c: f"{c:.1f}%")), widths)
+        yield table_row(("CPU time", _value(info["cpu_times"], lambda t: f"user {t.user:.1f}s sys {t.system:.1f}s")),
+                        widths)
+        yield table_row(("Threads", _value(info["num_threads"])), widths)
+        yield table_row(("RSS", _value(info["memory_info"], lambda m: format_size(m.rss))), widths)
+        yield table_row(("VMS", _value(info["memory_info"], lambda m: format_size(m.vms))), widths)
+        yield table_row(("Memory", _value(info["memory_percent"], lambda m: f"{m:.1f}%")), widths)
+        yield table_row(("Open FDs", _value(info.get("num_fds"))), widths)
+        yield table_row(("IO read", _value(info.get("io_counters"), lambda io: format_size(io.read_bytes))), widths)
+        yield table_row(("IO write", _value(info.get("io_counters"), lambda io: format_size(io.write_bytes))), widths)
+        yield table_row(("Ctx sw", _value(info["num_ctx_switches"],
+                                          lambda c: f"{c.voluntary} vol {c.involuntary} invol")), widths)
+        yield table_row(("Nice", _value(info["nice"])), widths)
+        yield table_row(("Children", f"{len(children)}: " + " ".join(str(c["pid"]) for c in children[:10]) +
+                         (" ..." if len(children) > 10 else "") if children else "0"), widths)
+        yield f"Exe: {_value(info['exe'])}"
+        yield f"Cwd: {_value(info['cwd'])}"
+        yield f"Cmdline: {_value(info['cmdline'], lambda c: ' '.join(c) or '-')}"
+
+    return iter_message_chunks(_rows(), header=(description, table_separator(widths)))
+
+
+def generate_proc_tree_msg(description, rows: List[tuple], ancestors: List[Dict[str, Any]] = ()) -> Iterator[str]:
+    """`rows` are (prefix, info) pairs from `ProcessTracker.tree`, the tree is drawn next to the numbers"""
+    widths = (7, 5, 8)
+    header = [description]
+    if ancestors:
+        header.append("Parents: " + " > ".join(f"{proc['pid']} {proc['name']}" for proc in ancestors))
+    header += [table_row(("PID", "CPU%", "RSS (MB)"), widths) + " Name", table_separator(widths)]
+
+    def _rows():
+        for prefix, proc in rows:
+            yield table_row((proc['pid'], f"{proc['cpu_percent']:.1f}", f"{proc['rss'] / (1024 ** 2):.1f}"),
+                            widths) + f" {prefix}{proc['name'] or 'N/A'}"
+
+    return iter_message_chunks(_rows(), header=header)
+
+
+def generate_net_stats_msg(description, rates: Dict[str, Any], speeds: Dict[str, tuple], connections=None,
+                           names: Dict[int, str] = None) -> Iterator[str]:
+    """`rates` from `MetricsSampler.nic_rates`, `connections` a `ConnectionSummary` (None when not permitted)"""
+    widths = (10, 10, 10, 5, 9)
+
+    def _rows():
+        for nic, rate in sorted(rates.items(), key=lambda item: item[1].rx + item[1].tx, reverse=True):
+            is_up, speed = speeds.get(nic, (True, 0))
+            if not is_up and not rate.rx and not rate.tx:
+                continue
+            utilization = f"{max(rate.rx, rate.tx) * 8 / (speed * 10 ** 6) * 100:.0f}" if speed else "-"
+            yield table_row((nic[:10], f"{format_size(rate.rx)}/s", f"{format_size(rate.tx)}/s", utilization,
+                             f"{rate.errors}/{rate.drops}"), widths)
+        if connections is None:
+            yield "Connections: not permitted, try running as superuser."
+            return
+        yield f"Connections: {connections.total} (" + \
+              ", ".join(f"{state} {count}" for state, count in connections.by_state) + ")"
+        if connections.by_remote:
+            yield "Top remotes:"
+            yield from (f"  {remote:<28} {count}" for remote, count in connections.by_remote)
+        if connections.by_process:
+            yield "Top processes by connections:"
+            yield from (f"  {pid:<7} {(names or dict()).get(pid, '?')[:20]:<20} {count}"
+                        for pid, count in connections.by_process)
+        if connections.unattributed:
+            # other users' sockets show an owner to root only, closing ones have none at all
+            yield f"{connections.unattributed} sockets without a visible owner process"
+
+    return iter_message_chunks(_rows(), header=(description, table_row(("Iface", "RX", "TX", "Util%", "Err/Drop"),
+                                                                        widths), table_separator(widths)))
+
+
+def generate_disks_msg(description, mounts: list, rates: Dict[str, Any]) -> Iterator[str]:
+    """`mounts` are `MountUsage` rows, `rates` from `MetricsSampler.disk_rates`"""
+    widths = (16, 6, 5, 19)
+    io_widths = (10, 10, 10, 6, 5)
+
+    def _rows():
+        for mount in mounts:
+            if mount.usage is None:
+                yield table_row((mount.mountpoint[-16:], mount.fstype[:6], "-", mount.status[:19]), widths)
+            else:
+                yield table_row((mount.mountpoint[-16:], mount.fstype[:6], f"{mount.usage.percent:.0f}",
+                                 f"{format_size(mount.usage.used)}/{format_size(mount.usage.total)}"), widths)
+        if not rates:
+            return
+        yield ""
+        yield table_row(("Disk", "Read", "Write", "IOPS", "Busy%"), io_widths)
+        yield table_separator(io_widths)
+        for disk, rate in sorted(rates.items(), key=lambda item: item[1].read + item[1].write, reverse=True):
+            yield table_row((disk[:10], f"{format_size(rate.read)}/s", f"{format_size(rate.write)}/s",
+                             f"{rate.iops:.0f}", "-" if rate.busy_percent is None else f"{rate.busy_percent:.0f}"),
+                            io_widths)
+
+    return iter_message_chunks(_rows(), header=(description, table_row(("Mount", "FS", "Use%", "Used/Total"),
+                                                                        widths), table_separator(widths)))
 
-    # Create the table with the header and separator
-    table = header + separator
 
-    # Loop through the dictionary to create each row
-    for command, description in commands.items():
-        # Formatting each row to have aligned columns
-        if command in PARAMS_DICT:
-            command += "\t" + ','.join([f"<{arg}>" for arg in PARAMS_DICT[command]])
-        command = "/" + command
-        table += f"| {command:<24} | {description:<30} |\n"
+def generate_fleet_stats_msg(description, hosts: Dict[str, Any]) -> Iterator[str]:
+    """`hosts` maps a host name to its system stats dict, or to the error that host failed with"""
+    widths = (12, 5, 5, 5, 5, 12)
 
-    return f"```{table}```"
+    def _rows():
+        for name, stats in hosts.items():
+            if isinstance(stats, dict):
+                yield table_row((name[:12], f"{stats['cpu_percent']:.0f}", f"{stats['memory']['percent']:.0f}",
+                                 f"{stats['disk']['percent']:.0f}", f"{stats['load_avg'][0]:.2f}", "ok"), widths)
+            else:
+                if isinstance(stats, (TimeoutError, asyncio.TimeoutError)):
+                    status = "timeout"
+                elif isinstance(stats, ConnectionError):
+                    status = "unreachable"
+                elif isinstance(stats, EOFError):
+                    status = "dropped"  # agent hung up - usually a secret mismatch
+                else:
+                    status = "error"
+                yield table_row((name[:12], "-", "-", "-", "-", status), widths)
 
+    return iter_message_chunks(_rows(), header=(description, table_row(("Host", "CPU%", "Mem%", "Disk%", "Load",
+                                                                        "Status"), widths),
+                                                table_separator(widths)))
 
-def generate_machine_stats_msg(description, cpu_usage, memory_info, disk_usage) -> str:
-    header = f"{description}\n| Resource   | Usage                     |\n"
-    separator = "|------------|---------------------------|\n"
 
-    table = header + separator
-    table += f"| {'CPU':<10} | {f'{cpu_usage}%':<25} |\n"
-    table += f"| {'Memory':<10} | {f'{memory_info.percent}% ({memory_info.used / (1024 ** 3):.1f}/{memory_info.total / (1024 ** 3):.1f} GB)':<25} |\n"
-    table += f"| {'Disk':<10} | {f'{disk_usage.percent}% ({disk_usage.used / (1024 ** 3):.1f}/{disk_usage.total / (1024 ** 3):.1f} GB)':<25} |\n"
+def generate_handler_stats_msg(description, stats, loop_probe) -> Iterator[str]:
+    widths = (14, 6, 6, 7, 7, 7)
 
-    return f"```{table}```"
+    def _rows():
+        by_p99 = sorted(stats.latency.items(), key=lambda item: item[1].quantile(0.99), reverse=True)
+        for command, histogram in by_p99:
+            yield table_row((command[:14], histogram.count, stats.errors.get(command, 0),
+                             f"{histogram.quantile(0.5) * 1000:.0f}", f"{histogram.quantile(0.99) * 1000:.0f}",
+                             f"{histogram.max * 1000:.0f}"), widths)
+        for (command, reason), count in sorted(stats.denied.items()):
+            yield f"denied {command} ({reason}): {count}"
+        lag = loop_probe.histogram
+        yield f"Loop lag ms: last {loop_probe.last * 1000:.1f}, p99 {lag.quantile(0.99) * 1000:.1f}, " \
+              f"max {lag.max * 1000:.1f}"
 
+    return iter_message_chunks(_rows(), header=(description, table_row(("Command", "Calls", "Errors", "p50 ms",
+                                                                        "p99 ms", "max ms"), widths),
+                                                table_separator(widths)))
 
-def generate_proc_stats_msg(description, processes: list) -> List[str]:
-    table_header = f"{description}\n| PID   | Name                 | CPU (%) | Mem (%)  |\n"
-    separator = "|-------|----------------------|---------|----------|\n"
-    table = table_header + separator
-    chunks = list()
 
-    for proc in processes:
-        pid = str(proc['pid']).ljust(5)
-        name = (proc['name'] or "N/A")[:20].ljust(20)
-        cpu = f"{proc['cpu_percent']:.1f}".ljust(7)
-        mem = f"{round(proc['memory_percent'], 1):.1f}".ljust(8)
+def generate_alerts_msg(description, states: list) -> Iterator[str]:
+    """`states` are (rule, status, last value) rows from `AlertEngine.states`"""
+    widths = (30, 7, 6)
 
-        table += f"| {pid} | {name} | {cpu} | {mem} |\n"
-        if len(table) > 3500:  # Telegram's max message size is about 4096 bytes
-            chunks.append(table)
-            table = table_header + separator
+    def _rows():
+        for rule, status, value in states:
+            yield table_row((rule.text[:30], status, "-" if value is None else f"{value:.1f}"), widths)
 
-    chunks.append(table)
-    return chunks
+    return iter_message_chunks(_rows(), header=(description, table_row(("Rule", "State", "Now"), widths),
+                                                table_separator(widths)))
 
 
 def load_config(conf_path: Path) -> Dict[str, Any]:
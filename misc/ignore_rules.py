@@ -0,0 +1,157 @@
+import os
+import re
+import threading
+
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Pattern
+
+from .output_manager import *
+
+
+class _IgnoreRule(NamedTuple):
+    regex: Pattern
+    negate: bool
+    dir_only: bool
+
+
+def _glob_to_regex(pattern: str) -> str:
+    # gitignore flavoured globs - `*` and `?` stop at `/`, `**` spans directories
+    i, out = 0, []
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                members = pattern[i + 1:end]
+                out.append("[" + ("^" + members[1:] if members.startswith("!") else members) + "]")
+                i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class IgnoreMatcher:
+    """
+    Compiled `.browseignore` rules:
+        /abs/path or rel/path   - a path (relative ones are anchored at the ignore file's directory) and its subtree
+        *.log, build/, **/tmp   - gitignore style globs, patterns without a `/` match a name at any depth
+        !pattern                - re-include something an earlier rule ignored (the last matching rule wins)
+    A path whose parent directory is ignored is ignored as well, so a whole subtree is skipped by one check on
+    its root - parent results are cached.
+    """
+
+    def __init__(self, lines: List[str], base_dir: str, cache_size: int = 4096):
+        self._rules: List[_IgnoreRule] = list()
+        self._base_dir = os.path.realpath(base_dir)
+        for line in lines:
+            self._add_rule(line)
+        # without negations the order of rules doesn't matter - fold them into one alternation per entry type
+        self._combined = None
+        if not any(rule.negate for rule in self._rules):
+            self._combined = {
+                False: self._fold(rule.regex for rule in self._rules if not rule.dir_only),
+                True: self._fold(rule.regex for rule in self._rules),
+            }
+        self._dir_cache: "OrderedDict[str, bool]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str) -> "IgnoreMatcher":
+        try:
+            with open(path, 'r') as file:
+                lines = file.read().splitlines()
+        except FileNotFoundError:
+            print_error(f"{path} was not loaded")
+            lines = list()
+        return cls(lines, os.path.dirname(os.path.abspath(path)))
+
+    def __bool__(self) -> bool:
+        return bool(self._rules)
+
+    def _add_rule(self, line: str) -> None:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            return
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/") and line != "/"
+        line = line.rstrip("/") or "/"
+        if line.startswith("/") or line.startswith("~") or "/" in line:
+            # path pattern - absolute, or anchored at the ignore file's directory
+            line = os.path.expanduser(line)
+            if not os.path.isabs(line):
+                line = os.path.join(self._base_dir, line)
+            pattern = "^" + _glob_to_regex(os.path.normpath(line)) + "$"
+        else:
+            pattern = "(?:^|/)" + _glob_to_regex(line) + "$"  # bare name, at any depth
+        self._rules.append(_IgnoreRule(re.compile(pattern), negate, dir_only))
+
+    @staticmethod
+    def _fold(regexes) -> Optional[Pattern]:
+        patterns = [regex.pattern for regex in regexes]
+        return re.compile("|".join(f"(?:{p})" for p in patterns)) if patterns else None
+
+    def _match_self(self, path: str, is_dir: bool) -> bool:
+        if self._combined is not None:
+            combined = self._combined[is_dir]
+            return bool(combined and combined.search(path))
+        for rule in reversed(self._rules):
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.search(path):
+                return not rule.negate
+        return False
+
+    def _dir_ignored(self, path: str) -> bool:
+        if path == "/" or not path:
+            return self._match_self("/", True)
+        with self._lock:
+            cached = self._dir_cache.get(path)
+            if cached is not None:
+                self._dir_cache.move_to_end(path)
+                return cached
+        ignored = self._dir_ignored(os.path.dirname(path)) or self._match_self(path, True)
+        with self._lock:
+            self._dir_cache[path] = ignored
+            if len(self._dir_cache) > self._cache_size:
+                self._dir_cache.popitem(last=False)
+        return ignored
+
+    def is_ignored(self, path: str, is_dir: Optional[bool] = None) -> bool:
+        """`path` must be absolute & normalized, `is_dir` is looked up when not given"""
+        if not self._rules:
+            return False
+        if is_dir is None:
+            is_dir = os.path.isdir(path)
+        if is_dir:
+            return self._dir_ignored(path)
+        return self._dir_ignored(os.path.dirname(path)) or self._match_self(path, False)
+
+    def is_entry_ignored(self, entry: os.DirEntry, resolved_parent: Optional[str] = None) -> bool:
+        # the parent is resolved once per listing by the caller, only symlinks need a resolve of their own
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if self.is_ignored(entry.path, is_dir):
+            return True
+        if resolved_parent and self.is_ignored(os.path.join(resolved_parent, entry.name), is_dir):
+            return True
+        return entry.is_symlink() and self.is_ignored(os.path.realpath(entry.path), is_dir)
@@ -0,0 +1,92 @@
+import os
+
+from typing import List, Tuple
+
+TAIL_BLOCK_SIZE = 64 * 1024
+TAIL_MAX_BYTES = 8 * 1024 ** 2  # a handful of huge lines must not turn a tail into a full read
+FOLLOW_READ_SIZE = 1024 ** 2
+FOLLOW_MAX_LINE_LENGTH = 1000  # per line, so a message always holds a few of them
+FOLLOW_MAX_LINES_PER_READ = 200  # a burst beyond this is summarized as skipped, the chat only keeps the newest
+
+
+def tail_lines(path: str, n: int, block_size: int = TAIL_BLOCK_SIZE) -> List[str]:
+    """Last `n` lines of `path`, read backwards from EOF in blocks - the cost depends on `n`, not the file size"""
+    with open(path, 'rb') as file:
+        position = file.seek(0, os.SEEK_END)
+        blocks, newlines, read = list(), 0, 0
+        # one newline more than asked for, so the first returned line is complete
+        while position > 0 and newlines <= n and read < TAIL_MAX_BYTES:
+            size = min(block_size, position)
+            position -= size
+            file.seek(position)
+            block = file.read(size)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+            read += size
+    lines = b"".join(reversed(blocks)).split(b"\n")
+    if lines and not lines[-1]:
+        lines.pop()  # the file ends with a newline
+    return [line.decode("utf-8", errors="replace").rstrip("\r") for line in lines[-n:]] if n > 0 else []
+
+
+class FileFollower:
+    """
+    Incremental reader for a growing file. It keeps the open file's offset and identity (device & inode), so each
+    read returns only what was appended since the last one. When the path is rotated to a new file or truncated,
+    the rest of the old file is drained, an unterminated last line included, and reading continues from the start
+    of the new one.
+    """
+
+    def __init__(self, path: str, from_end: bool = True):
+        self._path = path
+        self._file = open(path, 'rb')
+        self._identity = self._stat_identity(os.fstat(self._file.fileno()))
+        if from_end:
+            self._file.seek(0, os.SEEK_END)
+        self._partial = b""
+
+    @staticmethod
+    def _stat_identity(stat: os.stat_result) -> Tuple[int, int]:
+        return stat.st_dev, stat.st_ino
+
+    @property
+    def offset(self) -> int:
+        return self._file.tell()
+
+    def _reopen_if_rotated(self) -> bool:
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return False  # rotated away and not recreated yet - keep the old file
+        if self._stat_identity(stat) != self._identity:
+            self._file.close()
+            self._file = open(self._path, 'rb')
+            self._identity = self._stat_identity(os.fstat(self._file.fileno()))
+            self._partial = b""
+            return True
+        if stat.st_size < self._file.tell():  # truncated in place (copytruncate)
+            self._file.seek(0)
+            self._partial = b""
+            return True
+        return False
+
+    def read_new(self, max_bytes: int = FOLLOW_READ_SIZE) -> List[str]:
+        """Complete lines appended since the last call, at most `max_bytes` worth per call"""
+        data = self._file.read(max_bytes)
+        flushed = list()
+        if not data:
+            unterminated = self._partial
+            if self._reopen_if_rotated():
+                # the old file is drained and won't be written to anymore - its last line is complete as it is
+                flushed = [unterminated] if unterminated else []
+                data = self._file.read(max_bytes)
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        lines = flushed + lines
+        if len(self._partial) > max_bytes:  # a runaway line without newlines - show what we have
+            lines.append(self._partial)
+            self._partial = b""
+        return [line.decode("utf-8", errors="replace").rstrip("\r") for line in lines]
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,159 @@
+import time
+import asyncio
+import psutil
+
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from .output_manager import *
+
+AVERAGE_WINDOWS = {"1m": 60, "5m": 5 * 60, "15m": 15 * 60}
+
+
+class MetricsSample(NamedTuple):
+    timestamp: float
+    cpu_percent: float
+    cpu_per_core: List[float]
+    memory: Any  # psutil svmem
+    swap: Any  # psutil sswap
+    disk: Any  # psutil sdiskusage
+    load_avg: Tuple[float, float, float]
+    net_io: Dict[str, Any]  # psutil snetio per interface
+    disk_io: Dict[str, Any]  # psutil sdiskio per disk
+
+
+class NicRate(NamedTuple):
+    rx: float  # bytes per second
+    tx: float
+    errors: int  # in + out, since the previous sample
+    drops: int
+
+
+class DiskRate(NamedTuple):
+    read: float  # bytes per second
+    write: float
+    iops: float
+    busy_percent: Optional[float]  # share of the time the disk had requests in flight, Linux only
+
+
+def _disk_io_counters() -> Dict[str, Any]:
+    try:
+        return psutil.disk_io_counters(perdisk=True) or dict()
+    except (RuntimeError, OSError):  # no /proc/diskstats in some containers
+        return dict()
+
+
+class MetricsSampler:
+    """
+    Samples system metrics in the background into a fixed-size ring buffer, so handlers can answer
+    from the newest sample instead of blocking the event loop on `psutil.cpu_percent(interval=...)`.
+    The buffer is only touched on the event loop - `collect` may run on any thread, `record` appends its result.
+    """
+
+    def __init__(self, interval: float = 5.0, history: float = max(AVERAGE_WINDOWS.values()), disk_path: str = '/'):
+        self._interval = max(float(interval), 0.5)
+        self._disk_path = disk_path
+        self._samples: Deque[MetricsSample] = deque(maxlen=int(history // self._interval) + 1)
+
+        # the first cpu_percent() call always returns 0.0 - prime the counters so the first sample is meaningful
+        psutil.cpu_percent(interval=None)
+        psutil.cpu_percent(interval=None, percpu=True)
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    @property
+    def disk_path(self) -> str:
+        return self._disk_path
+
+    def collect(self) -> MetricsSample:
+        """Reads the counters without recording them, blocking - run it off the loop"""
+        return MetricsSample(
+            timestamp=time.monotonic(),
+            cpu_percent=psutil.cpu_percent(interval=None),
+            cpu_per_core=psutil.cpu_percent(interval=None, percpu=True),
+            memory=psutil.virtual_memory(),
+            swap=psutil.swap_memory(),
+            disk=psutil.disk_usage(self._disk_path),
+            load_avg=psutil.getloadavg(),
+            net_io=psutil.net_io_counters(pernic=True),
+            disk_io=_disk_io_counters(),
+        )
+
+    def record(self, sample: MetricsSample) -> MetricsSample:
+        self._samples.append(sample)
+        return sample
+
+    def sample(self) -> MetricsSample:
+        """Collects and records a sample inline, for when there's none yet"""
+        return self.record(self.collect())
+
+    def latest(self) -> Optional[MetricsSample]:
+        return self._samples[-1] if self._samples else None
+
+    def nic_rates(self) -> Dict[str, NicRate]:
+        """Per interface rates between the two newest samples - empty until there are two"""
+        if len(self._samples) < 2:
+            return dict()
+        previous, last = self._samples[-2], self._samples[-1]
+        elapsed = last.timestamp - previous.timestamp
+        rates = dict()
+        for nic, counters in last.net_io.items():
+            before = previous.net_io.get(nic)
+            if before is None or elapsed <= 0:
+                continue
+            # counters can go backwards when an interface is recreated - count that as no traffic
+            rates[nic] = NicRate(rx=max(counters.bytes_recv - before.bytes_recv, 0) / elapsed,
+                                 tx=max(counters.bytes_sent - before.bytes_sent, 0) / elapsed,
+                                 errors=max(counters.errin + counters.errout - before.errin - before.errout, 0),
+                                 drops=max(counters.dropin + counters.dropout - before.dropin - before.dropout, 0))
+        return rates
+
+    def disk_rates(self) -> Dict[str, DiskRate]:
+        """Per disk rates between the two newest samples, disks that never saw any I/O are left out"""
+        if len(self._samples) < 2:
+            return dict()
+        previous, last = self._samples[-2], self._samples[-1]
+        elapsed = last.timestamp - previous.timestamp
+        rates = dict()
+        for disk, counters in last.disk_io.items():
+            before = previous.disk_io.get(disk)
+            if before is None or elapsed <= 0 or not (counters.read_count or counters.write_count):
+                continue
+            busy_time = getattr(counters, "busy_time", None)
+            rates[disk] = DiskRate(
+                read=max(counters.read_bytes - before.read_bytes, 0) / elapsed,
+                write=max(counters.write_bytes - before.write_bytes, 0) / elapsed,
+                iops=max(counters.read_count + counters.write_count - before.read_count - before.write_count, 0)
+                / elapsed,
+                busy_percent=min(max(busy_time - before.busy_time, 0) / (elapsed * 10), 100.0)
+                if busy_time is not None else None)  # busy_time is in ms
+        return rates
+
+    def window(self, seconds: float) -> List[MetricsSample]:
+        # deque iteration is cheap here - the buffer holds at most `history / interval` samples
+        since = time.monotonic() - seconds
+        return [s for s in self._samples if s.timestamp >= since]
+
+    def window_averages(self) -> Dict[str, Dict[str, float]]:
+        averages = dict()
+        for label, seconds in AVERAGE_WINDOWS.items():
+            samples = self.window(seconds)
+            if not samples:
+                continue
+            averages[label] = {
+                "cpu": sum(s.cpu_percent for s in samples) / len(samples),
+                "memory": sum(s.memory.percent for s in samples) / len(samples),
+            }
+        return averages
+
+    async def run_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # collected on a pool thread, appended here - readers iterate the buffer on the loop
+                self.record(await loop.run_in_executor(None, self.collect))
+            except Exception as exc:
+                print_error(f"Metrics sampling failed: {exc}")
+            await asyncio.sleep(self._interval)
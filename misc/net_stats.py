@@ -0,0 +1,41 @@
+import psutil
+
+from collections import Counter
+from typing import Dict, List, NamedTuple, Tuple
+
+
+class ConnectionSummary(NamedTuple):
+    total: int
+    by_state: List[Tuple[str, int]]  # most common first
+    by_remote: List[Tuple[str, int]]  # "host:port"
+    by_process: List[Tuple[int, int]]  # (pid, connections)
+    unattributed: int  # sockets without an owner we may see
+
+
+def _address(addr) -> str:
+    return f"[{addr.ip}]:{addr.port}" if ":" in addr.ip else f"{addr.ip}:{addr.port}"
+
+
+def summarize_connections(top: int = 10) -> ConnectionSummary:
+    """
+    Counts inet sockets by state, remote endpoint and owning process in one pass over `psutil.net_connections`.
+    Sockets of other users' processes come without a pid unless running as root, they're only counted.
+    """
+    states, remotes, owners = Counter(), Counter(), Counter()
+    unattributed = 0
+    connections = psutil.net_connections(kind="inet")
+    for conn in connections:
+        states["UDP" if conn.status == psutil.CONN_NONE else conn.status] += 1
+        if conn.raddr:
+            remotes[_address(conn.raddr)] += 1
+        if conn.pid is None:
+            unattributed += 1
+        else:
+            owners[conn.pid] += 1
+    return ConnectionSummary(len(connections), states.most_common(), remotes.most_common(top),
+                             owners.most_common(top), unattributed)
+
+
+def interface_speeds() -> Dict[str, Tuple[bool, int]]:
+    # (is up, link speed in Mbit/s - 0 when the driver doesn't report one)
+    return {nic: (stats.isup, stats.speed) for nic, stats in psutil.net_if_stats().items()}
@@ -0,0 +1,161 @@
+import time
+import asyncio
+import datetime
+
+import telegram.error
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from .output_manager import *
+from .helper_definitions import utf16_len
+
+OUTBOUND_MAX_RETRIES = 5
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:  # no await between the check and the take - safe on a single loop
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class _OutboundJob:
+    def __init__(self, call: Callable[..., Awaitable[Any]], text: Optional[str], kwargs: dict,
+                 mergeable: bool = False):
+        self.call = call
+        self.text = text  # set for plain text sends, which are the only ones that may be merged
+        self.kwargs = kwargs
+        self.mergeable = mergeable and text is not None and "reply_markup" not in kwargs
+        self.futures: List[asyncio.Future] = [asyncio.get_running_loop().create_future()]
+
+    def can_merge(self, other: "_OutboundJob", max_length: int) -> bool:
+        # `==` and not `is` - every `message.reply_text` access is a new bound method, equal for the same message
+        return (self.mergeable and other.mergeable and self.call == other.call and self.kwargs == other.kwargs
+                and utf16_len(self.text) + utf16_len(other.text) + 1 <= max_length)
+
+
+def _retry_after_seconds(exc: telegram.error.RetryAfter) -> float:
+    retry_after = exc.retry_after
+    if isinstance(retry_after, datetime.timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class OutboundScheduler:
+    """
+    Single exit point for bot messages. Every chat has its own FIFO queue drained by one task, so replies keep
+    their order, and sends are paced by a per-chat and a global token bucket (Telegram allows about one message
+    per second per chat and 30 per second overall). A `RetryAfter` pauses the chat and the send is retried instead
+    of being lost. Plain text messages that pile up for the same reply target with the same options are merged
+    into one, unless the caller asked for its own message back (`mergeable=False`) to edit it later.
+    """
+
+    def __init__(self, global_rate: float = 25.0, chat_rate: float = 1.0, chat_burst: int = 3,
+                 max_merge_length: int = 4000):
+        self._global_bucket = _TokenBucket(global_rate, max(int(global_rate), 1))
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._max_merge_length = max_merge_length
+        self._chat_buckets: Dict[int, _TokenBucket] = dict()
+        self._queues: Dict[int, Deque[_OutboundJob]] = dict()
+        self._drainers: Dict[int, asyncio.Task] = dict()
+
+    def _enqueue(self, chat_id: int, job: _OutboundJob) -> asyncio.Future:
+        self._queues.setdefault(chat_id, deque()).append(job)
+        if chat_id not in self._drainers:
+            self._drainers[chat_id] = asyncio.get_running_loop().create_task(self._drain(chat_id))
+        return job.futures[0]
+
+    def enqueue_text(self, chat_id: int, send: Callable[..., Awaitable[Any]], text: str, *, mergeable: bool = True,
+                     **kwargs) -> asyncio.Future:
+        """
+        Queues `send(text, **kwargs)` without waiting - enqueue a batch first so its messages can be merged. A
+        merged send resolves every caller with the same message, pass `mergeable=False` to edit the result.
+        """
+        return self._enqueue(chat_id, _OutboundJob(send, text, kwargs, mergeable))
+
+    async def send_text(self, chat_id: int, send: Callable[..., Awaitable[Any]], text: str, *, mergeable: bool = True,
+                        **kwargs) -> Any:
+        return await self.enqueue_text(chat_id, send, text, mergeable=mergeable, **kwargs)
+
+    def enqueue(self, chat_id: int, call: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Queues any other request (media, edits). `call` may run more than once if it's rate limited"""
+        return self._enqueue(chat_id, _OutboundJob(call, None, dict()))
+
+    async def send(self, chat_id: int, call: Callable[[], Awaitable[Any]]) -> Any:
+        return await self.enqueue(chat_id, call)
+
+    def _take(self, queue: Deque[_OutboundJob]) -> _OutboundJob:
+        job = queue.popleft()
+        parts = [job.text]
+        while queue and job.can_merge(queue[0], self._max_merge_length):
+            merged = queue.popleft()
+            parts.append(merged.text)
+            job.text = "\n".join(parts)
+            job.futures.extend(merged.futures)
+        return job
+
+    async def _drain(self, chat_id: int) -> None:
+        queue = self._queues[chat_id]
+        bucket = self._chat_buckets.setdefault(chat_id, _TokenBucket(self._chat_rate, self._chat_burst))
+        job = None
+        try:
+            while queue:
+                job = self._take(queue)
+                try:
+                    result = await self._execute(job, bucket)
+                except Exception as exc:
+                    for future in job.futures:
+                        if not future.done():
+                            future.set_exception(exc)
+                else:
+                    for future in job.futures:
+                        if not future.done():
+                            future.set_result(result)
+        finally:
+            del self._drainers[chat_id]
+            # only left over when cancelled - release whoever waits on the job in flight and the queued ones
+            for left in ([job] if job else []) + list(self._queues.pop(chat_id, ())):
+                for future in left.futures:
+                    if not future.done():
+                        future.cancel()
+
+    async def _execute(self, job: _OutboundJob, bucket: _TokenBucket) -> Any:
+        for attempt in range(OUTBOUND_MAX_RETRIES):
+            await bucket.acquire()
+            await self._global_bucket.acquire()
+            try:
+                if job.text is not None:
+                    return await job.call(job.text, **job.kwargs)
+                return await job.call()
+            except telegram.error.RetryAfter as exc:
+                if attempt == OUTBOUND_MAX_RETRIES - 1:
+                    raise
+                delay = _retry_after_seconds(exc)
+                print_error(f"Flood control hit, retrying in {delay:g} seconds")
+                bucket.pause(delay)
+
+    async def close(self) -> None:
+        drainers = list(self._drainers.values())
+        for task in drainers:
+            task.cancel()
+        await asyncio.gather(*drainers, return_exceptions=True)
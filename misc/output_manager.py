@@ -4,6 +4,7 @@ import sys
 _DEVNULL = open(os.devnull, "w")
 _ORIG_STDOUT = sys.stdout
 _CLEAR_LINE = "\x1b[1A\x1b[2K"
+_QUIET = False
 DELIM = 89 * "="
 
 RESET = '\033[0m'
@@ -24,8 +25,15 @@ def restore_print():
     sys.stdout = _ORIG_STDOUT
 
 
+def set_quiet(quiet: bool):
+    global _QUIET
+    _QUIET = quiet
+
+
 def printf(text, end="\n"):
     global _ORIG_STDOUT, _DEVNULL
+    if _QUIET:
+        return
     sys.stdout = _ORIG_STDOUT
     print(text, end=end)
     sys.stdout = _DEVNULL
@@ -0,0 +1,99 @@
+import sqlite3
+import threading
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+_HANDLE_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _to_handle(seq: int) -> str:
+    handle = ""
+    while True:
+        seq, rem = divmod(seq, len(_HANDLE_ALPHABET))
+        handle = _HANDLE_ALPHABET[rem] + handle
+        if seq == 0:
+            return handle
+
+
+class _ChatHandles:
+    def __init__(self):
+        self.by_handle: "OrderedDict[str, str]" = OrderedDict()  # LRU order, oldest first
+        self.by_path: Dict[str, str] = dict()
+        self.seq = 0
+
+
+class PathRegistry:
+    """
+    Interns paths into short per-chat handles for inline keyboard callbacks. A path keeps its handle while it is
+    in use, so keyboards of different chats never invalidate each other. Each chat holds at most `capacity` handles
+    (least recently used are evicted), and with `db_path` set they are mirrored to sqlite to survive restarts.
+    """
+
+    def __init__(self, capacity: int = 4096, db_path: Optional[str] = None):
+        self._capacity = capacity
+        self._chats: Dict[int, _ChatHandles] = dict()
+        self._lock = threading.Lock()  # listings intern paths from worker threads
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS handles (chat_id INTEGER, seq INTEGER, path TEXT, "
+                             "PRIMARY KEY (chat_id, seq))")
+            self._db.commit()
+
+    def _chat(self, chat_id: int) -> _ChatHandles:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _ChatHandles()
+            if self._db is not None:  # first touch since start - restore what was persisted
+                for seq, path in self._db.execute("SELECT seq, path FROM handles WHERE chat_id = ? ORDER BY seq",
+                                                  (chat_id,)):
+                    handle = _to_handle(seq)
+                    chat.by_handle[handle] = path
+                    chat.by_path[path] = handle
+                    chat.seq = seq
+        return chat
+
+    def intern_many(self, chat_id: int, paths: Iterable[str]) -> List[str]:
+        handles = list()
+        with self._lock:
+            chat = self._chat(chat_id)
+            inserted, evicted = list(), list()
+            for path in paths:
+                handle = chat.by_path.get(path)
+                if handle is not None:
+                    chat.by_handle.move_to_end(handle)
+                else:
+                    chat.seq += 1
+                    handle = _to_handle(chat.seq)
+                    chat.by_handle[handle] = path
+                    chat.by_path[path] = handle
+                    inserted.append((chat_id, chat.seq, path))
+                    if len(chat.by_handle) > self._capacity:
+                        old_handle, old_path = chat.by_handle.popitem(last=False)
+                        del chat.by_path[old_path]
+                        evicted.append((chat_id, int(old_handle, len(_HANDLE_ALPHABET))))
+                handles.append(handle)
+
+            if self._db is not None and (inserted or evicted):
+                self._db.executemany("INSERT OR REPLACE INTO handles (chat_id, seq, path) VALUES (?, ?, ?)", inserted)
+                self._db.executemany("DELETE FROM handles WHERE chat_id = ? AND seq = ?", evicted)
+                self._db.commit()
+        return handles
+
+    def intern(self, chat_id: int, path: str) -> str:
+        return self.intern_many(chat_id, [path])[0]
+
+    def resolve(self, chat_id: int, handle: str) -> Optional[str]:
+        with self._lock:
+            chat = self._chat(chat_id)
+            path = chat.by_handle.get(handle)
+            if path is not None:
+                chat.by_handle.move_to_end(handle)
+            return path
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,283 @@
+import time
+import heapq
+import fnmatch
+import asyncio
+import psutil
+import threading
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .output_manager import *
+
+PROC_DETAIL_ATTRS = ["pid", "ppid", "name", "exe", "cmdline", "status", "username", "create_time", "cwd", "nice",
+                     "num_threads", "num_fds", "cpu_percent", "cpu_times", "memory_info", "memory_percent",
+                     "io_counters", "num_ctx_switches"]
+
+PROC_SORT_KEYS = {
+    "cpu": "cpu_percent",
+    "mem": "memory_percent",
+    "rss": "rss",
+    "io": "io_rate",
+}
+
+
+class KillResult(NamedTuple):
+    terminated: List[Tuple[int, str]]  # (pid, name) - exited after SIGTERM
+    killed: List[Tuple[int, str]]  # ignored SIGTERM, exited after SIGKILL
+    survived: List[Tuple[int, str]]  # still there after SIGKILL (uninterruptible sleep)
+    denied: List[Tuple[int, str]]
+    missing: List[int]  # gone before it was signalled, or the pid was reused
+
+    def summary(self) -> List[str]:
+        counts = [f"{len(group)} {label}" for group, label in (
+            (self.terminated, "terminated"), (self.killed, "killed"), (self.survived, "survived SIGKILL"),
+            (self.denied, "denied"), (self.missing, "not found")) if group]
+        lines = [", ".join(counts) + "."]
+        for group, label in ((self.terminated, "terminated"), (self.killed, "killed after ignoring SIGTERM"),
+                             (self.survived, "still running"), (self.denied, "no permissions")):
+            lines.extend(f"{pid} {name} - {label}" for pid, name in group)
+        lines.extend(f"{pid} - not found" for pid in self.missing)
+        return lines
+
+
+def resolve_kill_targets(pids: Iterable[int]) -> Tuple[List[Tuple[int, str, Optional[float]]], List[int]]:
+    """(pid, name, create_time) for every pid that exists, and the missing pids"""
+    # the create time pins each pid to its process, the kill is skipped if the pid was reused meanwhile
+    targets, missing = list(), list()
+    for pid in pids:
+        try:
+            proc = psutil.Process(pid)
+            with proc.oneshot():
+                targets.append((pid, proc.name(), proc.create_time()))
+        except psutil.NoSuchProcess:
+            missing.append(pid)
+        except psutil.AccessDenied:
+            targets.append((pid, "?", None))
+    return targets, missing
+
+
+def terminate_processes(targets: Iterable[Tuple[int, Optional[float]]], timeout: float = 5.0,
+                        kill_timeout: float = 2.0) -> KillResult:
+    """
+    SIGTERM every (pid, create_time) target at once, wait for all of them together and SIGKILL the ones still
+    running after `timeout`. A target whose create_time doesn't match is a reused pid and is left alone.
+    """
+    result = KillResult(list(), list(), list(), list(), list())
+    names: Dict[int, str] = dict()
+    signalled: List[psutil.Process] = list()
+    for pid, create_time in targets:
+        try:
+            proc = psutil.Process(pid)
+            if create_time is not None and proc.create_time() != create_time:
+                result.missing.append(pid)
+                continue
+            names[pid] = proc.name()
+            proc.terminate()
+            signalled.append(proc)
+        except psutil.NoSuchProcess:
+            result.missing.append(pid)
+        except psutil.AccessDenied:
+            result.denied.append((pid, names.get(pid, "?")))
+
+    def _exited(proc: psutil.Process) -> bool:
+        # a zombie is dead, it just waits for its parent to reap it
+        try:
+            return proc.status() == psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return True
+
+    gone, alive = psutil.wait_procs(signalled, timeout=timeout)
+    result.terminated.extend((proc.pid, names[proc.pid]) for proc in gone)
+    to_kill = list()
+    for proc in alive:
+        if _exited(proc):
+            result.terminated.append((proc.pid, names[proc.pid]))
+            continue
+        try:
+            proc.kill()
+            to_kill.append(proc)
+        except psutil.NoSuchProcess:
+            result.terminated.append((proc.pid, names[proc.pid]))
+        except psutil.AccessDenied:
+            result.denied.append((proc.pid, names[proc.pid]))
+    gone, alive = psutil.wait_procs(to_kill, timeout=kill_timeout)
+    result.killed.extend((proc.pid, names[proc.pid]) for proc in gone)
+    for proc in alive:
+        (result.killed if _exited(proc) else result.survived).append((proc.pid, names[proc.pid]))
+    return result
+
+
+class ProcessTracker:
+    """
+    Long-lived PID -> `psutil.Process` cache. Reusing the same objects between refreshes is what makes
+    `cpu_percent()` return real deltas (a fresh object always reports 0.0 on its first read).
+    """
+
+    def __init__(self, interval: float = 5.0):
+        self._interval = max(float(interval), 1.0)
+        self._procs: Dict[int, psutil.Process] = dict()
+        self._last_io: Dict[int, tuple] = dict()  # pid -> (timestamp, total io bytes)
+        self._snapshot: Dict[int, Dict[str, Any]] = dict()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Dict[int, Dict[str, Any]]:
+        # the dict is swapped atomically on refresh, readers never see a half-built table
+        return self._snapshot
+
+    def _forget(self, pid: int) -> None:
+        self._procs.pop(pid, None)
+        self._last_io.pop(pid, None)
+
+    def _sync_pids(self) -> None:
+        current = set(psutil.pids())
+        for pid in self._procs.keys() - current:
+            self._forget(pid)
+        for pid in current - self._procs.keys():
+            try:
+                proc = psutil.Process(pid)
+                proc.cpu_percent(interval=None)  # prime, the next read returns a real delta
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            self._procs[pid] = proc
+
+    def _collect(self, proc: psutil.Process, now: float) -> Dict[str, Any]:
+        with proc.oneshot():
+            mem_info = proc.memory_info()
+            info = {
+                "pid": proc.pid,
+                "ppid": proc.ppid(),
+                "name": proc.name(),
+                "cpu_percent": proc.cpu_percent(interval=None),
+                "memory_percent": proc.memory_percent(),
+                "rss": mem_info.rss,
+                "io_rate": 0.0,
+            }
+            try:
+                io = proc.io_counters()
+                total_io = io.read_bytes + io.write_bytes
+            except (psutil.AccessDenied, AttributeError):  # not permitted / not supported on this platform
+                total_io = None
+
+        if total_io is not None:
+            last = self._last_io.get(proc.pid)
+            if last and now > last[0]:
+                info["io_rate"] = max(total_io - last[1], 0) / (now - last[0])
+            self._last_io[proc.pid] = (now, total_io)
+        return info
+
+    def refresh(self) -> Dict[int, Dict[str, Any]]:
+        with self._refresh_lock:
+            now = time.monotonic()
+            self._sync_pids()
+            snapshot = dict()
+            for pid, proc in list(self._procs.items()):
+                try:
+                    if not proc.is_running():  # pid was reused by a new process
+                        self._forget(pid)
+                        continue
+                    snapshot[pid] = self._collect(proc, now)
+                except psutil.NoSuchProcess:
+                    self._forget(pid)
+                except psutil.AccessDenied:
+                    continue
+            self._snapshot = snapshot
+            return snapshot
+
+    def details(self, pid: int) -> Dict[str, Any]:
+        """
+        Everything `/proc` shows for one process, read in a single `oneshot()` pass (`as_dict` opens one). The
+        tracked object is reused when there is one, so `cpu_percent` is a delta since the last refresh. Fields the
+        caller isn't permitted to read are None, a missing process raises `psutil.NoSuchProcess`.
+        """
+        proc = self._procs.get(pid)
+        if proc is None or not proc.is_running():
+            proc = psutil.Process(pid)
+        return proc.as_dict(attrs=[attr for attr in PROC_DETAIL_ATTRS if hasattr(proc, attr)], ad_value=None)
+
+    @staticmethod
+    def children_map(snapshot: Dict[int, Dict[str, Any]]) -> Dict[int, List[int]]:
+        # one pass over the table instead of a `children()` call (a full /proc scan) per process
+        children: Dict[int, List[int]] = dict()
+        for pid, info in snapshot.items():
+            if info["ppid"] != pid:
+                children.setdefault(info["ppid"], list()).append(pid)
+        for pids in children.values():
+            pids.sort()
+        return children
+
+    @staticmethod
+    def tree(snapshot: Dict[int, Dict[str, Any]], root: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Depth first (prefix, info) rows of the process tree under `root`, or of the whole table. `prefix` holds
+        the tree drawing for the row. Built from the snapshot's ppids alone, no per-process parent lookups.
+        """
+        children = ProcessTracker.children_map(snapshot)
+        if root is not None:
+            roots = [root] if root in snapshot else []
+        else:
+            roots = sorted(pid for pid, info in snapshot.items() if info["ppid"] not in snapshot or info["ppid"] == pid)
+        rows, seen = list(), set()
+        stack = [(pid, "", "") for pid in reversed(roots)]  # (pid, indent, connector)
+        while stack:
+            pid, indent, connector = stack.pop()
+            if pid in seen:  # a reused pid can make the ppids circular
+                continue
+            seen.add(pid)
+            rows.append((indent + connector, snapshot[pid]))
+            child_indent = indent + ("" if not connector else "   " if connector == "└─ " else "│  ")
+            kids = [kid for kid in children.get(pid, ()) if kid in snapshot]
+            for i, kid in reversed(list(enumerate(kids))):
+                stack.append((kid, child_indent, "└─ " if i == len(kids) - 1 else "├─ "))
+        return rows
+
+    @staticmethod
+    def ancestors(snapshot: Dict[int, Dict[str, Any]], pid: int) -> List[Dict[str, Any]]:
+        chain, seen = list(), {pid}
+        ppid = snapshot[pid]["ppid"] if pid in snapshot else None
+        while ppid in snapshot and ppid not in seen:
+            seen.add(ppid)
+            chain.append(snapshot[ppid])
+            ppid = snapshot[ppid]["ppid"]
+        return list(reversed(chain))
+
+    @staticmethod
+    def matching(processes, filters_lower: List[str]) -> List[Dict[str, Any]]:
+        if not filters_lower:
+            return list(processes)
+        matched = list()
+        for proc_info in processes:
+            # substring match on the name or the pid
+            filter_name = any(s in proc_info['name'].lower() for s in filters_lower if proc_info['name'])
+            filter_pid = any(s in str(proc_info['pid']) for s in filters_lower)
+            if filter_name or filter_pid:
+                matched.append(proc_info)
+        return matched
+
+    @staticmethod
+    def matching_names(processes, patterns: List[str]) -> List[Dict[str, Any]]:
+        # stricter than `matching` - names only, a glob matches the whole name, anything else a substring
+        patterns = [pattern.lower() for pattern in patterns]
+        matched = list()
+        for proc_info in processes:
+            name = (proc_info['name'] or "").lower()
+            if name and any(fnmatch.fnmatchcase(name, p) if any(c in p for c in "*?[") else p in name
+                            for p in patterns):
+                matched.append(proc_info)
+        return matched
+
+    @staticmethod
+    def top(processes: List[Dict[str, Any]], sort_key: str = "cpu", limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        field = PROC_SORT_KEYS[sort_key]
+        if limit is None or limit >= len(processes):
+            return sorted(processes, key=lambda p: p[field], reverse=True)
+        return heapq.nlargest(limit, processes, key=lambda p: p[field])
+
+    async def run_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.refresh)
+            except Exception as exc:
+                print_error(f"Process table refresh failed: {exc}")
+            await asyncio.sleep(self._interval)
@@ -0,0 +1,132 @@
+import time
+
+from io import BytesIO
+from typing import TYPE_CHECKING, BinaryIO, Tuple
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# mss and Pillow are imported where they're used - they only ever load in the capture worker process
+
+SCREENSHOT_FORMATS = {
+    # format: (Pillow format, file extension)
+    "jpeg": ("JPEG", "jpg"),
+    "webp": ("WEBP", "webp"),
+    "png": ("PNG", "png"),
+}
+
+QUALITY_PRESETS = {
+    # preset: (max dimension, lossy quality)
+    "low": (1280, 60),
+    "medium": (1920, 80),
+    "high": (2560, 90),
+    "max": (4096, 95),
+}
+
+
+def grab_monitor(sct, monitor: int = 0) -> "Image.Image":
+    from PIL import Image
+
+    # monitors[0] is all monitors combined, monitors[1:] are the individual screens
+    if not 0 <= monitor < len(sct.monitors):
+        raise ValueError(f"monitor {monitor} not found, available: 0-{len(sct.monitors) - 1}")
+    shot = sct.grab(sct.monitors[monitor])
+    # wrap the raw BGRA buffer directly instead of building an intermediate RGB copy
+    return Image.frombuffer("RGB", shot.size, shot.bgra, "raw", "BGRX", 0, 1)
+
+
+def downscale(img: "Image.Image", max_dimension: int) -> "Image.Image":
+    from PIL import Image
+
+    if img.width > max_dimension or img.height > max_dimension:
+        # reducing_gap lets Pillow do a cheap integer reduce() first and resample only the remainder
+        img.thumbnail((max_dimension, max_dimension), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return img
+
+
+def encode_image(img: "Image.Image", fmt: str = "jpeg", quality: int = 80) -> bytes:
+    byte_io = BytesIO()
+    if fmt == "jpeg":
+        img.save(byte_io, "JPEG", quality=quality, subsampling="4:2:0")
+    elif fmt == "webp":
+        img.save(byte_io, "WEBP", quality=quality, method=2)  # method trades size for speed (0 fastest - 6 smallest)
+    else:
+        img.save(byte_io, "PNG", compress_level=1)  # lossless, favour speed over size
+    return byte_io.getvalue()
+
+
+def capture_screenshot(monitor: int = 0, fmt: str = "jpeg", quality: str = "medium") -> bytes:
+    # runs inside a worker process - grab & encode without touching the bot's event loop
+    import mss
+
+    max_dimension, lossy_quality = QUALITY_PRESETS[quality]
+    with mss.mss() as sct:
+        img = grab_monitor(sct, monitor)
+    return encode_image(downscale(img, max_dimension), fmt, lossy_quality)
+
+
+class GifStreamWriter:
+    """
+    Writes an animated GIF frame by frame instead of collecting all frames for `Image.save()`.
+    Frames are diffed against the previous one - unchanged frames only extend the previous frame's duration
+    and changed frames are encoded as the changed region only, against one global palette.
+    """
+
+    def __init__(self, fp: BinaryIO, first_frame: "Image.Image", timestamp: float):
+        from PIL import Image, GifImagePlugin
+
+        self._fp = fp
+        self._palette = first_frame.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+        header, _ = GifImagePlugin.getheader(self._palette.copy(), info={"optimize": False, "loop": 0})
+        self._fp.write(b"".join(header))
+        self._prev = first_frame
+        self._pending = (self._palette, (0, 0), timestamp)  # the last frame waits until its duration is known
+        self.frames_written = 0
+
+    def _flush(self, timestamp: float) -> None:
+        from PIL import GifImagePlugin
+
+        region, offset, started = self._pending
+        duration = max(int((timestamp - started) * 1000), 20)
+        for chunk in GifImagePlugin.getdata(region, offset, duration=duration):
+            self._fp.write(chunk)
+        self.frames_written += 1
+
+    def add(self, frame: "Image.Image", timestamp: float) -> bool:
+        from PIL import Image, ImageChops
+
+        bbox = ImageChops.difference(frame, self._prev).getbbox()
+        if bbox is None:
+            return False
+        self._flush(timestamp)
+        region = frame.crop(bbox).quantize(palette=self._palette, dither=Image.Dither.NONE)
+        self._pending = (region, bbox[:2], timestamp)
+        self._prev = frame
+        return True
+
+    def close(self, timestamp: float) -> None:
+        self._flush(timestamp)
+        self._fp.write(b";")  # trailer
+
+
+def record_clip(monitor: int = 0, seconds: float = 5.0, fps: float = 5.0,
+                max_dimension: int = 1280) -> Tuple[bytes, int, int]:
+    # runs inside a worker process - returns (gif bytes, frames captured, frames encoded)
+    import mss
+
+    frame_interval = 1.0 / fps
+    out = BytesIO()
+    with mss.mss() as sct:
+        start = time.monotonic()
+        writer = GifStreamWriter(out, downscale(grab_monitor(sct, monitor), max_dimension), start)
+        captured = 1
+        next_tick = start + frame_interval
+        while next_tick < start + seconds:
+            time.sleep(max(next_tick - time.monotonic(), 0))
+            now = time.monotonic()
+            writer.add(downscale(grab_monitor(sct, monitor), max_dimension), now)
+            captured += 1
+            # if a grab took longer than a frame, skip the missed ticks instead of bursting to catch up
+            next_tick = max(next_tick + frame_interval, now)
+        writer.close(start + seconds)
+    return out.getvalue(), captured, writer.frames_written
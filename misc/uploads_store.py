@@ -0,0 +1,253 @@
+import os
+import stat
+import time
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+UPLOADS_SORT_KEYS = {
+    "date": "mtime DESC",
+    "name": "name COLLATE NOCASE ASC",
+    "size": "size DESC",
+}
+UPLOADS_RACY_WINDOW_NS = 2 * 10 ** 9  # a directory changed this recently may change again within the same mtime tick
+
+
+class UploadRecord(NamedTuple):
+    name: str
+    size: int
+    mtime: float
+    sha256: str
+    uploader: str
+
+
+class HashingWriter:
+    """File-like sink that hashes content while spooling it to a temporary file next to the store"""
+
+    def __init__(self, tmp_dir: str):
+        fd, self.path = tempfile.mkstemp(dir=tmp_dir, prefix="upload-")
+        self._file = os.fdopen(fd, "wb")
+        self._sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._file.write(data)
+        self._sha.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    @property
+    def sha256(self) -> str:
+        return self._sha.hexdigest()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self) -> None:
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class UploadsStore:
+    """
+    Content-addressed uploads: every distinct content is stored once under `.blobs/<sha256>`, and each uploaded
+    name is a hard link to its blob in the uploads directory. A small sqlite index keeps name, size, mtime, hash and
+    uploader, so listings page / sort / filter without rescanning the directory. The index is synced with the
+    directory again whenever the directory's mtime changed (entries added, removed or renamed) or `sync_ttl`
+    seconds passed, and blobs no name links to anymore are deleted.
+
+    A name shares its inode with the blob, so blobs are stored read-only. A file edited in place regardless is
+    re-hashed by the next sync (its size or mtime no longer match the index) and its blob is detached from the
+    store, and a blob is re-hashed before new content is deduplicated against it.
+    """
+
+    def __init__(self, root: str, sync_ttl: float = 60.0):
+        self._root = root
+        self._blobs_dir = os.path.join(root, ".blobs")
+        self._tmp_dir = os.path.join(root, ".tmp")
+        os.makedirs(self._blobs_dir, exist_ok=True)
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, ".index.db"), check_same_thread=False)
+        # `mtime` is when the name was uploaded, `mtime_ns` the file's own mtime when its content was hashed
+        self._db.execute("CREATE TABLE IF NOT EXISTS uploads (name TEXT PRIMARY KEY, size INTEGER, mtime REAL, "
+                         "sha256 TEXT, uploader TEXT, mtime_ns INTEGER)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS uploads_sha256 ON uploads (sha256)")
+        self._db.commit()
+        self._sync_ttl = sync_ttl
+        self._synced_mtime_ns: Optional[int] = None
+        self._synced_at = float("-inf")
+
+    @property
+    def root(self) -> str:
+        return self._root
+
+    def new_writer(self) -> HashingWriter:
+        return HashingWriter(self._tmp_dir)
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self._blobs_dir, sha256[:2], sha256)
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 ** 2), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def _free_name(self, name: str) -> str:
+        base, ext = os.path.splitext(name)
+        candidate, index = name, 0
+        while os.path.lexists(os.path.join(self._root, candidate)):
+            index += 1
+            candidate = f"{base} ({index}){ext}"
+        return candidate
+
+    @staticmethod
+    def _remove_blob(blob_path: str) -> None:
+        try:
+            os.chmod(blob_path, stat.S_IRUSR | stat.S_IWUSR)  # read-only files can't be removed on Windows
+            os.remove(blob_path)
+        except FileNotFoundError:
+            pass
+
+    def _verify_blob(self, blob_path: str, size: int, sha256: str) -> bool:
+        """Whether the blob still holds `sha256` - one that was edited through a name is detached"""
+        try:
+            if os.stat(blob_path).st_size == size and self._hash_file(blob_path) == sha256:
+                return True
+        except FileNotFoundError:
+            return False
+        self._remove_blob(blob_path)  # the names linking to it keep the edited content
+        return False
+
+    def _detach_blob(self, sha256: str, path: str) -> None:
+        # `path` no longer holds `sha256` - if it is still linked to that blob, the blob was edited along with it
+        blob_path = self._blob_path(sha256)
+        try:
+            if os.path.samefile(blob_path, path):
+                self._remove_blob(blob_path)
+        except FileNotFoundError:
+            pass
+
+    def _link(self, blob_path: str, name: str) -> None:
+        try:
+            os.link(blob_path, os.path.join(self._root, name))
+        except OSError:  # filesystem without hard links
+            shutil.copyfile(blob_path, os.path.join(self._root, name))
+
+    def commit(self, writer: HashingWriter, name: str, uploader: str) -> Tuple[UploadRecord, bool]:
+        """Stores the written content as `name`. Returns the record and whether identical content already existed"""
+        writer.close()
+        name = os.path.basename(name) or writer.sha256
+        with self._lock:
+            existing = self._db.execute("SELECT name, size, mtime, sha256, uploader, mtime_ns FROM uploads "
+                                        "WHERE name = ?", (name,)).fetchone()
+            if existing and existing[3] == writer.sha256 and \
+                    self._stat_key(os.path.join(self._root, name)) == (existing[1], existing[5]):
+                # same name, same content, untouched since it was hashed - nothing to store
+                writer.discard()
+                return UploadRecord(*existing[:5]), True
+
+            blob_path = self._blob_path(writer.sha256)
+            duplicate = self._verify_blob(blob_path, writer.size, writer.sha256)
+            if duplicate:
+                writer.discard()
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.chmod(writer.path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(writer.path, blob_path)
+
+            name = self._free_name(name)  # never overwrite a different upload with the same name
+            self._link(blob_path, name)
+            record = UploadRecord(name, writer.size, time.time(), writer.sha256, uploader)
+            self._db.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?)",
+                             (*record, os.stat(os.path.join(self._root, name)).st_mtime_ns))
+            self._db.commit()
+            return record, duplicate
+
+    @staticmethod
+    def _stat_key(path: str) -> Tuple[Optional[int], Optional[int]]:
+        try:
+            result = os.stat(path, follow_symlinks=False)
+        except FileNotFoundError:
+            return None, None
+        return result.st_size, result.st_mtime_ns
+
+    def _needs_sync(self) -> bool:
+        if time.monotonic() - self._synced_at >= self._sync_ttl:
+            return True
+        return os.stat(self._root).st_mtime_ns != self._synced_mtime_ns
+
+    def _collect_blobs(self, hashes: Set[str]) -> None:
+        # a blob is only ever reached through the index - once no name has its hash, nothing links to it
+        for sha256 in hashes:
+            if self._db.execute("SELECT 1 FROM uploads WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone() is None:
+                self._remove_blob(self._blob_path(sha256))  # a no-op for files indexed by `sync`, they have none
+
+    def sync(self) -> None:
+        """
+        Index files that were placed in the uploads directory by other means, re-hash the ones whose size or mtime
+        changed since they were indexed, and forget removed ones
+        """
+        with self._lock:
+            mtime_ns = os.stat(self._root).st_mtime_ns  # before the scan - a change during it triggers another
+            indexed = {name: (size, file_mtime_ns, sha256) for name, size, file_mtime_ns, sha256
+                       in self._db.execute("SELECT name, size, mtime_ns, sha256 FROM uploads")}
+            present, replaced = set(), set()
+            with os.scandir(self._root) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or not entry.is_file(follow_symlinks=False):
+                        continue
+                    present.add(entry.name)
+                    result = entry.stat(follow_symlinks=False)
+                    known = indexed.get(entry.name)
+                    if known is not None and known[:2] == (result.st_size, result.st_mtime_ns):
+                        continue
+                    sha256 = self._hash_file(entry.path)
+                    if known is None:
+                        self._db.execute("INSERT INTO uploads VALUES (?, ?, ?, ?, ?, ?)",
+                                         (entry.name, result.st_size, result.st_mtime, sha256, "", result.st_mtime_ns))
+                        continue
+                    if sha256 != known[2]:  # edited in place
+                        self._detach_blob(known[2], entry.path)
+                        replaced.add(known[2])
+                    self._db.execute("UPDATE uploads SET size = ?, mtime = ?, sha256 = ?, mtime_ns = ? WHERE name = ?",
+                                     (result.st_size, result.st_mtime, sha256, result.st_mtime_ns, entry.name))
+            removed = indexed.keys() - present
+            self._db.executemany("DELETE FROM uploads WHERE name = ?", [(name,) for name in removed])
+            self._collect_blobs({indexed[name][2] for name in removed} | replaced)
+            self._db.commit()
+            # a just-changed directory's mtime can't be trusted yet, the next query syncs again
+            racy = time.time_ns() - mtime_ns < UPLOADS_RACY_WINDOW_NS
+            self._synced_mtime_ns, self._synced_at = None if racy else mtime_ns, time.monotonic()
+
+    def query(self, sort: str = "date", name_filter: Optional[str] = None, offset: int = 0,
+              limit: int = 20) -> Tuple[int, List[UploadRecord]]:
+        if self._needs_sync():
+            self.sync()
+        where, params = "", list()
+        if name_filter:
+            where = "WHERE name LIKE ? ESCAPE '\\'"
+            escaped = name_filter.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM uploads {where}", params).fetchone()[0]
+            rows = self._db.execute(f"SELECT name, size, mtime, sha256, uploader FROM uploads {where} "
+                                    f"ORDER BY {UPLOADS_SORT_KEYS[sort]} LIMIT ? OFFSET ?",
+                                    params + [limit, offset]).fetchall()
+        return total, [UploadRecord(*row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
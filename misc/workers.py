@@ -0,0 +1,104 @@
+import asyncio
+import functools
+import multiprocessing
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .output_manager import *
+
+WORKER_CATEGORIES = {
+    # category: (max concurrent jobs, timeout in seconds)
+    "subprocess": (4, 30),
+    "fs": (8, 15),
+    "search": (2, 120),  # /find walks, each one fans out on the finder's own threads
+    "du": (2, 300),  # /du walks, on the scanner's own threads
+    "signal": (2, 30),  # terminate, wait & escalate batches of /kill
+    "screenshot": (1, 30),
+    "record": (1, 30),  # the handler extends the timeout by the clip length
+    "transfer": (2, 6 * 60 * 60),  # streaming producers of chunked downloads
+}
+
+
+class WorkerPool:
+    """
+    Execution layer for blocking handler work. Threads serve I/O bound jobs (subprocesses, filesystem),
+    a process pool serves CPU bound jobs (capture & encoding). Every job belongs to a category that
+    bounds how many of its kind run at once and how long the handler waits for it. Each category runs
+    on threads of its own, so slow /du walks can't hold back a quick `fs` call queued behind them.
+    """
+
+    def __init__(self, processes: int = 2, categories: Optional[Dict[str, Tuple[int, float]]] = None):
+        self._thread_pools: Dict[str, ThreadPoolExecutor] = dict()  # per category, created on first use
+        self._process_pool: Optional[ProcessPoolExecutor] = None  # spawned on first use
+        self._processes = processes
+        self._limits = dict(WORKER_CATEGORIES)
+        for category, (limit, timeout) in (categories or dict()).items():
+            self._limits[category] = (int(limit), float(timeout))
+        self._semaphores: Dict[str, asyncio.Semaphore] = dict()
+
+    def _semaphore(self, category: str) -> asyncio.Semaphore:
+        # created lazily so they bind to the running loop
+        if category not in self._semaphores:
+            self._semaphores[category] = asyncio.Semaphore(self._limits[category][0])
+        return self._semaphores[category]
+
+    def _get_thread_pool(self, category: str) -> ThreadPoolExecutor:
+        if category not in self._thread_pools:
+            # as many threads as the category may run at once - a job that got its slot starts right away
+            self._thread_pools[category] = ThreadPoolExecutor(max_workers=self._limits[category][0],
+                                                              thread_name_prefix=f"systamer-{category}")
+        return self._thread_pools[category]
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            # spawn - forking a process that runs an event loop and worker threads is not safe
+            self._process_pool = ProcessPoolExecutor(max_workers=self._processes,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+        return self._process_pool
+
+    def timeout_for(self, category: str) -> float:
+        return self._limits[category][1]
+
+    async def _submit(self, executor, category: str, func: Callable[..., Any], args, kwargs,
+                      wait_timeout: Optional[float]) -> Any:
+        semaphore = self._semaphore(category)
+        await semaphore.acquire()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args, **kwargs))
+        except BaseException:
+            semaphore.release()
+            raise
+        # the slot is held until the job is done, not until the handler stops waiting for it - a timed out job
+        # keeps running on its thread and must go on counting against the category's limit
+        future.add_done_callback(functools.partial(self._job_done, semaphore))
+        return await asyncio.wait_for(asyncio.shield(future), wait_timeout or self.timeout_for(category))
+
+    @staticmethod
+    def _job_done(semaphore: asyncio.Semaphore, future: asyncio.Future) -> None:
+        semaphore.release()
+        if not future.cancelled():
+            future.exception()  # nobody awaits a timed out job's outcome, retrieve it so it isn't logged as lost
+
+    async def run(self, category: str, func: Callable[..., Any], *args, wait_timeout: Optional[float] = None,
+                  **kwargs) -> Any:
+        return await self._submit(self._get_thread_pool(category), category, func, args, kwargs, wait_timeout)
+
+    async def run_in_process(self, category: str, func: Callable[..., Any], *args,
+                             wait_timeout: Optional[float] = None, **kwargs) -> Any:
+        # `func` and its arguments must be picklable (module level functions)
+        try:
+            return await self._submit(self._get_process_pool(), category, func, args, kwargs, wait_timeout)
+        except BrokenProcessPool:
+            print_error("Worker process pool broke, it will be recreated on next use")
+            self._process_pool = None
+            raise
+
+    def shutdown(self) -> None:
+        for pool in self._thread_pools.values():
+            pool.shutdown(wait=False)
+        self._thread_pools.clear()
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 
 import psutil
-import hashlib
+import time
 import asyncio
+import socket
+import secrets
+import functools
+import threading
+import argparse
 import subprocess
 import httpcore
-import nest_asyncio
 import telegram.error
 
 try:
@@ -13,18 +17,30 @@ try:
 except ImportError:
     from misc import *
 
-import mss
 from io import BytesIO
-from PIL import Image
+from collections import OrderedDict
 
 from pathlib import Path
-from typing import NoReturn, Any, Callable, Awaitable
-from telegram import Update, BotCommand, InlineKeyboardButton, InlineKeyboardMarkup
+from typing import TYPE_CHECKING, NoReturn, Any, Callable, Awaitable, Optional, Tuple
+from telegram import Update, BotCommand, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
+from telegram.helpers import escape_markdown
 from telegram.ext import ApplicationBuilder, MessageHandler, filters, ContextTypes, CommandHandler, CallbackQueryHandler
 
-nest_asyncio.apply()
+if TYPE_CHECKING:  # feature modules are imported where they are first used, see `misc/__init__.py`
+    from misc.alerts import AlertEvent
+    from misc.disk_report import MountProbe
+    from misc.disk_usage import DiskUsage, DiskUsageScanner
+    from misc.file_search import FileFinder
+    from misc.file_transfer import PartWriter, TransferPart
+    from misc.log_tail import FileFollower
+    from misc.path_registry import PathRegistry
+    from misc.uploads_store import UploadsStore
 
-MAX_TELEGRAM_MSG_LEN = 4000  # a bit less than 4096 to be safe
+KILL_LIST_MAX = 30
+KILL_PENDING_MAX = 8
+
+_STARTUP_PROFILE = StartupProfile(psutil.Process().create_time())
+_STARTUP_PROFILE.mark("imports")
 
 #   --------------------------------------------------------------------------------------------------------------------
 #   ....................................................................................................................
@@ -47,11 +63,24 @@ def require_authentication(func, *_args, **_kwargs):
             return await func(self, update, context, *args, **kwargs)
         else:
             # User is not authenticated, prompt for password
+            self._handler_stats.record_denied(_command_label(update), "unauthenticated")
             await update.message.reply_text("please login via /login *<password\>*", parse_mode='MarkdownV2')
 
     return _impl
 
 
+def _command_label(update: Update) -> str:
+    # first word of the message text or callback data, without a `@botname` suffix
+    if update.message and update.message.text:
+        text = update.message.text
+    elif update.callback_query and update.callback_query.data:
+        text = update.callback_query.data
+    else:
+        text = ""
+    parts = text.split()
+    return parts[0].split("@")[0] if parts else ""
+
+
 def log_action(func, *_args, **_kwargs):
     async def _impl(self, update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         # Try to get the message text from either a message or a callback query
@@ -67,7 +96,14 @@ def log_action(func, *_args, **_kwargs):
         command_args = parts[1:] if len(parts) > 1 else []
         print_cmd(f"user {SysTamer.get_update_username(update)}\t|\tcmd {command_name}" +
                   (f"\t|\targs {','.join(command_args)}" if command_args else ''))
-        return await func(self, update, context, *args, **kwargs)
+        start, failed = time.perf_counter(), False
+        try:
+            return await func(self, update, context, *args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._handler_stats.record(_command_label(update) or func.__name__, time.perf_counter() - start, failed)
     return _impl
 
 
@@ -76,6 +112,7 @@ def check_for_permission(func, *_args, **_kwargs):
         try:
             return await func(self, update, context, *args, **kwargs)
         except PermissionError:
+            self._handler_stats.record_denied(_command_label(update), "permission")
             if update.effective_message:
                 await update.effective_message.reply_text("No permissions for this action, try running as superuser.")
             if update.callback_query:
@@ -83,6 +120,31 @@ def check_for_permission(func, *_args, **_kwargs):
     return _impl
 
 
+class lazy_attribute:
+    """
+    Instance attribute built by the decorated method on first access - from the loop or a worker thread - so a
+    feature's module is only imported once the feature is used
+    """
+
+    def __init__(self, build: Callable[[Any], Any]):
+        self._build = build
+        self._lock = threading.Lock()
+
+    def __set_name__(self, owner, name: str):
+        self._name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        with self._lock:
+            if self._name not in instance.__dict__:
+                instance.__dict__[self._name] = self._build(instance)
+        return instance.__dict__[self._name]
+
+    def is_built(self, instance) -> bool:
+        return self._name in instance.__dict__
+
+
 def require_allowed_user(func):
     async def _impl(self, update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         user_id = str(update.effective_user.id) if update.effective_user else None
@@ -111,7 +173,9 @@ class SysTamer:
     _PASSWORD = str()
     _ALLOWED_USERS = set()
 
-    def __init__(self, json_conf: dict):
+    def __init__(self, json_conf: dict, startup_profile: Optional[StartupProfile] = None):
+        self._startup_profile = startup_profile
+        self._json_conf = json_conf  # read again by the features built on first use
         self._bot_token = json_conf.get("bot_token", None)
         if self._bot_token:
             print_info(f"Bot token was set to -> {BOLD}{self._bot_token}{RESET}")
@@ -130,22 +194,124 @@ class SysTamer:
             print_info("No allowed users were set, running an unauthenticated session...")
 
         self._timeout_duration = json_conf.get("timeout_duration", 10)
+        self._metrics_sampler = MetricsSampler(interval=json_conf.get("sample_interval", 5))
+        self._process_tracker = ProcessTracker(interval=json_conf.get("process_refresh_interval", 5))
+        self._processes_top_n = json_conf.get("processes_top_n", 30)
+        self._kill_timeout = json_conf.get("kill_timeout", 5)
+        self._net_top_n = json_conf.get("net_top_n", 10)
+        self._background_tasks: List[asyncio.Task] = list()
+        self._workers = WorkerPool(processes=json_conf.get("worker_processes", 2),
+                                   categories=json_conf.get("worker_limits", None))
         self._uploads_dir = os.path.join(os.getcwd(), "uploads")
+        self._uploads_page_size = json_conf.get("uploads_page_size", 20)
+        self._screenshot_format = json_conf.get("screenshot_format", "jpeg")
+        self._screenshot_quality = json_conf.get("screenshot_quality", "medium")
+        self._record_max_seconds = json_conf.get("record_max_seconds", 30)
+        self._record_max_fps = json_conf.get("record_max_fps", 10)
+        self._upload_timeout = json_conf.get("upload_timeout", 300)
+        self._download_concurrency = json_conf.get("download_concurrency", 2)
+        self._download_compress_min_size = json_conf.get("download_compress_min_size", 1024 ** 2)
+        self._download_folder_max_size = json_conf.get("download_folder_max_size", 2 * 1024 ** 3)
+        self._outbound = OutboundScheduler(global_rate=json_conf.get("outbound_global_rate", 25),
+                                           chat_rate=json_conf.get("outbound_chat_rate", 1),
+                                           chat_burst=json_conf.get("outbound_chat_burst", 3),
+                                           max_merge_length=MAX_TELEGRAM_MSG_LEN)
+
+        fleet_hosts = json_conf.get("fleet_hosts", dict())
+        self._fleet = None
+        if fleet_hosts:
+            from misc.fleet import FleetController
+            self._fleet = FleetController(fleet_hosts, json_conf.get("fleet_secret"),
+                                          timeout=json_conf.get("fleet_timeout", 5),
+                                          pool_size=json_conf.get("fleet_pool_size", 2))
+            print_info(f"Fleet hosts set to -> {BOLD}{', '.join(self._fleet.hosts)}{RESET}")
+        self._handler_stats = HandlerStats()
+        self._loop_lag_probe = LoopLagProbe(interval=json_conf.get("loop_lag_interval", 0.5))
+        self._metrics_host = json_conf.get("metrics_host", "127.0.0.1")
+        self._metrics_port = json_conf.get("metrics_port", None)  # prometheus endpoint, off unless set
 
         self._application: telegram.ext.Application = self._build_app()
 
-        self._browse_path_dict = dict()
-        self._ignored_paths = SysTamer.load_ignore_paths()
+        self._browse_page_size = json_conf.get("browse_page_size", 40)
+        self._dir_listing_cache = DirListingCache(ttl=json_conf.get("browse_cache_ttl", 30))
+        self._ignore_matcher = SysTamer.load_ignore_paths()
+        self._tail_default_lines = json_conf.get("tail_default_lines", 20)
+        self._tail_max_lines = json_conf.get("tail_max_lines", 1000)
+        self._follow_interval = json_conf.get("follow_interval", 1)
+        self._follow_edit_interval = json_conf.get("follow_edit_interval", 3)
+        self._follow_max_duration = json_conf.get("follow_max_duration", 3600)
+        self._followers: Dict[int, asyncio.Task] = dict()
+        self._find_max_results = json_conf.get("find_max_results", 50)
+        self._find_edit_interval = json_conf.get("find_edit_interval", 2)
+        self._du_top_n = json_conf.get("du_top_n", 15)
+        self._alerts = None
+        if json_conf.get("alert_rules"):
+            from misc.alerts import AlertEngine, parse_alert_rule
+            alert_rules = list()
+            for text in json_conf["alert_rules"]:
+                try:
+                    alert_rules.append(parse_alert_rule(text))
+                except ValueError as exc:
+                    print_error(f"Ignoring alert rule: {exc}")
+            self._alerts = AlertEngine(alert_rules, hysteresis=json_conf.get("alert_hysteresis", 0.05),
+                                       cooldown=json_conf.get("alert_cooldown", 900))
+            if alert_rules and not SysTamer._ALLOWED_USERS:
+                print_info("Alert rules are set but `allowed_users` is empty - alerts are only printed here")
+
+    # ============= features built on first use =============
+
+    @lazy_attribute
+    def _path_registry(self) -> "PathRegistry":
+        from misc.path_registry import PathRegistry
+        return PathRegistry(capacity=self._json_conf.get("browse_handles_capacity", 4096),
+                            db_path=self._json_conf.get("browse_handles_db", ".browse_handles.db"))
+
+    @lazy_attribute
+    def _uploads_store(self) -> "UploadsStore":
+        from misc.uploads_store import UploadsStore
+        return UploadsStore(self._uploads_dir, sync_ttl=self._json_conf.get("uploads_sync_ttl", 60))
+
+    @lazy_attribute
+    def _file_finder(self) -> "FileFinder":
+        from misc.file_search import FileFinder
+        return FileFinder(threads=self._json_conf.get("find_threads", 4),
+                          db_path=self._json_conf.get("find_index_db", None))  # the index is opt-in
+
+    @lazy_attribute
+    def _du_scanner(self) -> "DiskUsageScanner":
+        from misc.disk_usage import DiskUsageScanner
+        return DiskUsageScanner(threads=self._json_conf.get("du_threads", 4),
+                                ttl=self._json_conf.get("du_cache_ttl", 300))
+
+    @lazy_attribute
+    def _mount_probe(self) -> "MountProbe":
+        from misc.disk_report import MountProbe
+        return MountProbe(timeout=self._json_conf.get("disk_probe_timeout", 2))
+
+    @lazy_attribute
+    def _download_part_size(self) -> int:
+        from misc.file_transfer import DEFAULT_PART_SIZE
+        return min(self._json_conf.get("download_part_size", DEFAULT_PART_SIZE), DEFAULT_PART_SIZE)
+
+    def _close_features(self) -> None:
+        # only the ones that were used - closing the others would build them first
+        for name in ("_path_registry", "_file_finder", "_du_scanner", "_uploads_store"):
+            if getattr(SysTamer, name).is_built(self):
+                getattr(self, name).close()
 
     # ============= static method helpers =============
 
     @staticmethod
     def build_navigate_keyboard(all_buttons: List[InlineKeyboardButton]) -> List[List[InlineKeyboardButton]]:
-        # separate navigation buttons from path buttons...
-        navigation_buttons = all_buttons[-1] if isinstance(all_buttons[-1], list) else [all_buttons[-1]]
-        regular_buttons = all_buttons[:-1] if isinstance(all_buttons[-1], list) else all_buttons
+        # separate navigation buttons from path buttons... trailing lists are full rows (actions, navigation)
+        if not isinstance(all_buttons[-1], list):
+            return [all_buttons[i:i + 2] for i in range(0, len(all_buttons) - 1, 2)] + [[all_buttons[-1]]]
+        split = len(all_buttons)
+        while split and isinstance(all_buttons[split - 1], list):
+            split -= 1
+        regular_buttons = all_buttons[:split]
         keyboard = [regular_buttons[i:i + 2] for i in range(0, len(regular_buttons), 2)]
-        keyboard.append(navigation_buttons)
+        keyboard.extend(all_buttons[split:])
         return keyboard
 
     @staticmethod
@@ -162,68 +328,74 @@ class SysTamer:
     def get_update_username(update: Update) -> str:
         return update.effective_user.username if update.effective_user.username else update.effective_user.id
 
-    @staticmethod
-    async def safe_reply(update: Update, text: str, **kwargs):
+    async def safe_reply(self, update: Update, text: str, **kwargs):
+        chat_id = update.effective_chat.id
         if update.message:
-            await update.message.reply_text(text, **kwargs)
+            await self._outbound.send_text(chat_id, update.message.reply_text, text, **kwargs)
         elif update.callback_query:
+            query = update.callback_query
             # Prefer editing the message for callback queries
             try:
-                await update.callback_query.edit_message_text(text, **kwargs)
+                await self._outbound.send(chat_id, lambda: query.edit_message_text(text, **kwargs))
             except telegram.error.BadRequest:
                 # If editing fails (e.g., message already edited), send a new message
-                await update.callback_query.message.reply_text(text, **kwargs)
+                await self._outbound.send_text(chat_id, query.message.reply_text, text, **kwargs)
+
+    @staticmethod
+    def describe_fleet_error(host: str, exc: Exception) -> str:
+        if isinstance(exc, asyncio.TimeoutError):
+            return f"{host}: no answer within the timeout."
+        return f"{host}: {exc or type(exc).__name__}"
+
+    @staticmethod
+    def split_fleet_host(args: List[str]) -> Tuple[Optional[str], List[str]]:
+        # `/kill @web1 nginx` - a leading @host runs the command on that fleet agent
+        if args and args[0].startswith("@"):
+            return args[0][1:], list(args[1:])
+        return None, list(args)
+
+    async def check_fleet_host(self, update: Update, host: Optional[str]) -> bool:
+        if host is None or (self._fleet and host in self._fleet.hosts):
+            return True
+        hosts = ", ".join(self._fleet.hosts) if self._fleet else "no fleet_hosts configured"
+        await self.safe_reply(update, f"Unknown fleet host {host} ({hosts}).")
+        return False
 
     @staticmethod
     def should_authenticate():
         return len(SysTamer._PASSWORD) > 0
 
     @staticmethod
-    def load_ignore_paths() -> set:
-        ignored_paths = set()
-        try:
-            with open(SysTamer._BROWSE_IGNORE_PATH, 'r') as file:
-                for line in file:
-                    line = line.strip()
-                    if line:  # Ignore empty lines
-                        ignored_paths.add(line)
-                        full_path = str(Path(line).resolve())
-                        ignored_paths.add(full_path)
-        except FileNotFoundError:
-            print_error(f"{SysTamer._BROWSE_IGNORE_PATH} was not loaded")
+    def load_ignore_paths() -> IgnoreMatcher:
+        ignore_matcher = IgnoreMatcher.from_file(SysTamer._BROWSE_IGNORE_PATH)
         print_info(f"Loaded `/browse` ignore paths from -> {BOLD}{SysTamer._BROWSE_IGNORE_PATH}{RESET}")
-        return ignored_paths
+        return ignore_matcher
 
-    @staticmethod
-    def split_message(text, max_length=MAX_TELEGRAM_MSG_LEN):
-        """Split text into chunks suitable for Telegram messages."""
-        lines = text.splitlines(keepends=True)
-        chunks = []
-        current = ""
-        for line in lines:
-            if len(current) + len(line) > max_length:
-                chunks.append(current)
-                current = ""
-            current += line
-        if current:
-            chunks.append(current)
-        return chunks
+    def is_path_ignored(self, path: str) -> bool:
+        # for paths that didn't come from a listing (callbacks, command arguments) - check both spellings
+        path = os.path.abspath(path)
+        return self._ignore_matcher.is_ignored(path) or self._ignore_matcher.is_ignored(os.path.realpath(path))
 
     async def send_long_message(self, update_or_query, text, parse_mode=None):
         """Send long text as multiple messages/chunks."""
-        chunks = self.split_message(text)
-        for i, chunk in enumerate(chunks):
-            msg = f"```\n{chunk}\n```" if parse_mode and "Markdown" in parse_mode else chunk
+        chunks = iter_message_chunks(text.splitlines(), code_block=bool(parse_mode and "Markdown" in parse_mode))
+        pending = list()  # all chunks are queued up front, the scheduler paces them and merges what fits
+        for i, msg in enumerate(chunks):
             # Handle Update object (from command)
             if hasattr(update_or_query, "message") and update_or_query.message:
-                await update_or_query.message.reply_text(msg, parse_mode=parse_mode)
+                pending.append(self._outbound.enqueue_text(update_or_query.message.chat_id,
+                                                           update_or_query.message.reply_text, msg,
+                                                           parse_mode=parse_mode))
             # Handle CallbackQuery object (from inline button)
-            elif hasattr(update_or_query, "edit_message_text"):
+            elif hasattr(update_or_query, "edit_message_text") and update_or_query.message:
+                chat_id = update_or_query.message.chat_id
                 if i == 0:
-                    await update_or_query.edit_message_text(msg, parse_mode=parse_mode)
+                    pending.append(self._outbound.enqueue(
+                        chat_id, lambda first=msg: update_or_query.edit_message_text(first, parse_mode=parse_mode)))
                 else:
-                    if hasattr(update_or_query, "message") and update_or_query.message:
-                        await update_or_query.message.reply_text(msg, parse_mode=parse_mode)
+                    pending.append(self._outbound.enqueue_text(chat_id, update_or_query.message.reply_text, msg,
+                                                               parse_mode=parse_mode))
+        await asyncio.gather(*pending)
 
     @log_action
     @require_allowed_user
@@ -267,178 +439,572 @@ class SysTamer:
     @log_action
     @require_authentication
     @require_allowed_user
-    async def send_screenshot(self, update: Update, _context: ContextTypes.DEFAULT_TYPE):
-        with mss.mss() as sct:
-            screenshot = sct.grab(sct.monitors[0])  # Capture the full screen
+    async def send_screenshot(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        from misc.screen_capture import QUALITY_PRESETS, SCREENSHOT_FORMATS, capture_screenshot
+        monitor, fmt, quality = 0, self._screenshot_format, self._screenshot_quality
+        for arg in context.args:
+            arg_lower = arg.lower()
+            if arg_lower.isdigit():
+                monitor = int(arg_lower)
+            elif arg_lower in SCREENSHOT_FORMATS or arg_lower == "jpg":
+                fmt = "jpeg" if arg_lower == "jpg" else arg_lower
+            elif arg_lower in QUALITY_PRESETS:
+                quality = arg_lower
+            else:
+                await update.message.reply_text(f"Usage: /screenshot [monitor] [{'|'.join(SCREENSHOT_FORMATS)}] "
+                                                f"[{'|'.join(QUALITY_PRESETS)}]")
+                return
+
+        try:
+            screenshot = await self._workers.run_in_process("screenshot", capture_screenshot, monitor, fmt, quality)
+        except asyncio.TimeoutError:
+            await update.message.reply_text(f"Screenshot timed out after {self._workers.timeout_for('screenshot')} "
+                                            f"seconds.")
+            return
+        except Exception as exc:
+            await update.message.reply_text(f"Error capturing screenshot: {exc}")
+            return
 
-            img = Image.frombytes("RGB", (screenshot.width, screenshot.height), screenshot.rgb)
+        if fmt == "jpeg":
+            await self.reply_with_timeout(update, update.message.reply_photo, photo=BytesIO(screenshot))
+        else:  # telegram recompresses photos to jpeg, send lossless / webp captures untouched
+            await self.reply_with_timeout(update, update.message.reply_document, document=BytesIO(screenshot),
+                                          filename=f"screenshot.{SCREENSHOT_FORMATS[fmt][1]}")
 
-            max_dimension = 4096
-            if img.width > max_dimension or img.height > max_dimension:
-                img.thumbnail((max_dimension, max_dimension))
+    @log_action
+    @require_authentication
+    @require_allowed_user
+    async def record_screen(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        from misc.screen_capture import record_clip
+        try:
+            seconds = float(context.args[0])
+            fps = float(context.args[1]) if len(context.args) > 1 else 5.0
+            if not (0 < seconds <= self._record_max_seconds and 0 < fps <= self._record_max_fps):
+                raise ValueError
+        except (IndexError, ValueError):
+            await update.message.reply_text(f"Usage: /record <seconds> [fps] (up to {self._record_max_seconds} "
+                                            f"seconds at {self._record_max_fps} fps)")
+            return
 
-            byte_io = BytesIO()
-            img.save(byte_io, 'PNG')
-            byte_io.seek(0)
+        await update.message.reply_text(f"Recording {seconds:g} seconds at {fps:g} fps...")
+        try:
+            clip, captured, encoded = await self._workers.run_in_process(
+                "record", record_clip, 0, seconds, fps,
+                wait_timeout=seconds + self._workers.timeout_for("record"))
+        except asyncio.TimeoutError:
+            await update.message.reply_text("Recording timed out.")
+            return
+        except Exception as exc:
+            await update.message.reply_text(f"Error recording screen: {exc}")
+            return
 
-            await self.reply_with_timeout(update, update.message.reply_photo, photo=byte_io)
+        await self.reply_with_timeout(update, update.message.reply_animation, animation=BytesIO(clip),
+                                      filename="record.gif",
+                                      caption=f"{captured} frames captured, {encoded} changed "
+                                              f"({len(clip) / 1024:.0f} KB)")
 
     async def reply_with_timeout(self, update: Update, async_reply_ptr: Callable[..., Awaitable[Any]], *args, **kwargs):
+        def _send():
+            for value in kwargs.values():  # the scheduler may retry the send, file arguments are read from the start
+                if hasattr(value, "seek"):
+                    value.seek(0)
+            return async_reply_ptr(*args, write_timeout=self._timeout_duration,
+                                   connect_timeout=self._timeout_duration, read_timeout=self._timeout_duration,
+                                   **kwargs)
+
+        chat_id = update.effective_chat.id
         try:
-            await async_reply_ptr(*args, write_timeout=self._timeout_duration,
-                                  connect_timeout=self._timeout_duration, read_timeout=self._timeout_duration, **kwargs)
-        except telegram.error.TimedOut as _exc:
-            await update.message.reply_text(f"Request timed out after {self._timeout_duration} seconds.")
+            await self._outbound.send(chat_id, _send)
+        except telegram.error.TimedOut:
+            await self._outbound.send_text(chat_id, update.effective_message.reply_text,
+                                           f"Request timed out after {self._timeout_duration} seconds.")
         except telegram.error.NetworkError as exc:
-            await update.message.reply_text(f"Network error occurred: {exc}. Please try again later.")
+            await self._outbound.send_text(chat_id, update.effective_message.reply_text,
+                                           f"Network error occurred: {exc}. Please try again later.")
+
+    async def send_file(self, update: Update, message, path: str):
+        from misc.file_transfer import should_compress, stream_file
+        size = await self._workers.run("fs", os.path.getsize, path)
+        compress = size >= self._download_compress_min_size and await self._workers.run("fs", should_compress, path)
+        if size <= self._download_part_size and not compress:
+            # read on a worker - handing PTB the open file would have it read up to a part's size on the loop
+            data = await self._workers.run("fs", Path(path).read_bytes)
+            await self.reply_with_timeout(update, message.reply_document,
+                                          document=InputFile(data, filename=os.path.basename(path)))
+            return
+        name = os.path.basename(path) + (".gz" if compress else "")
+        await self.send_in_parts(update, message, name, size, lambda writer: stream_file(path, writer, compress))
+
+    async def send_directory(self, update: Update, message, path: str):
+        from misc.file_transfer import directory_size, stream_directory_tar
+        name = (os.path.basename(path.rstrip(os.sep)) or "root") + ".tar.gz"
+        # sized up front - the cap check inside the walk alone would only trip after parts were already sent
+        await self._workers.run("fs", directory_size, path, self._ignore_matcher.is_entry_ignored,
+                                self._download_folder_max_size)
+        skipped = await self.send_in_parts(update, message, name, None,
+                                           lambda writer: stream_directory_tar(path, writer,
+                                                                               self._ignore_matcher.is_entry_ignored,
+                                                                               self._download_folder_max_size))
+        if skipped:
+            await self._outbound.send_text(message.chat_id, message.reply_text,
+                                           f"{skipped} unreadable entries were left out of {name}.")
+
+    async def send_in_parts(self, update: Update, message, name: str, source_size: Optional[int],
+                            produce: Callable[["PartWriter"], Any]) -> Any:
+        """Send the output of a blocking `produce(writer)` as numbered parts under the upload limit"""
+        from misc.file_transfer import PartStream, build_manifest
+        stream = PartStream(self._download_part_size, self._download_concurrency)
+        producer = asyncio.ensure_future(self._workers.run("transfer", produce, stream.writer))
+        semaphore = asyncio.Semaphore(self._download_concurrency)
+        chat_id = message.chat_id
+        status = await self._outbound.send_text(chat_id, message.reply_text, f"Preparing {name}...", mergeable=False)
+        uploads, part_names, part_hashes = list(), list(), list()
+        sent_parts, last_status = 0, 0.0
+
+        async def _edit_status(text: str):
+            await self._outbound.send(chat_id, lambda: status.edit_text(text))
+
+        async def _upload(part: "TransferPart", part_name: str):
+            nonlocal sent_parts, last_status
+            try:
+                # read on a worker - PTB reads a file object whole on the loop, and a part spools up to ~49 MB
+                data = await self._workers.run("fs", part.file.read)
+                await self._outbound.send(chat_id, lambda: message.reply_document(
+                    document=InputFile(data, filename=part_name), write_timeout=self._upload_timeout,
+                    read_timeout=self._upload_timeout, connect_timeout=self._timeout_duration))
+            finally:
+                part.file.close()
+                semaphore.release()
+            sent_parts += 1
+            now = asyncio.get_running_loop().time()
+            if now - last_status > 2:  # throttle progress edits
+                last_status = now
+                await _edit_status(f"Sending {name}: {sent_parts} part(s) sent, "
+                                   f"{stream.writer.source_bytes / 1024 ** 2:.1f}" +
+                                   (f"/{source_size / 1024 ** 2:.1f}" if source_size else "") + " MB read...")
+
+        first_part = None  # held back until we know whether a second part follows
+        try:
+            async for part in stream.parts(producer):
+                if part.index == 1:
+                    first_part = part
+                    continue
+                for pending in ((first_part, part) if part.index == 2 else (part,)):
+                    part_name = f"{name}.part{pending.index:03d}"
+                    part_names.append(part_name)
+                    part_hashes.append(pending.sha256)
+                    await semaphore.acquire()
+                    uploads.append(asyncio.ensure_future(_upload(pending, part_name)))
+            if first_part is not None and not part_names:  # fits in a single part
+                await semaphore.acquire()
+                uploads.append(asyncio.ensure_future(_upload(first_part, name)))
+            await asyncio.gather(*uploads)
+            result = await producer
+        except (Exception, asyncio.CancelledError):
+            stream.abort()
+            for upload in uploads:
+                upload.cancel()
+            await asyncio.gather(producer, *uploads, return_exceptions=True)
+            if first_part is not None:
+                first_part.file.close()
+            await _edit_status(f"Sending {name} failed.")
+            raise
+
+        if part_names:
+            manifest = build_manifest(name, part_names, part_hashes, stream.writer.sha256)
+            await self._outbound.send(chat_id, lambda: message.reply_document(
+                document=manifest, filename=f"{name}.sha256",
+                caption=f"Reassemble with: cat {name}.part* > {name} && sha256sum -c {name}.sha256"))
+        await _edit_status(f"Sent {name} ({stream.writer.total_size / 1024 ** 2:.1f} MB"
+                           + (f" in {len(part_names)} parts" if part_names else "") + ").")
+        return result
 
+    @log_action
     @require_authentication
     @require_allowed_user
     async def handle_file_upload(self, update: Update, _context: ContextTypes.DEFAULT_TYPE):
-        if not os.path.exists(self._uploads_dir):
-            os.makedirs(self._uploads_dir)
-        file_path = str()
-
-        if update.message.document:
-            file = await update.message.document.get_file()
-            filename = update.message.document.file_name
-            file_path = os.path.join(self._uploads_dir, filename)
-            await file.download_to_drive(file_path)
-            await update.message.reply_text(f"Document has been uploaded to '{self._uploads_dir}' as '{filename}'.")
-
-        elif update.message.photo:
-            photo = await update.message.photo[-1].get_file()  # Get the best quality photo
-            filename = f"{photo.file_id}.jpg"
-            file_path = os.path.join(self._uploads_dir, filename)
-            await photo.download_to_drive(file_path)
-            await update.message.reply_text(f"Photo has been uploaded to '{self._uploads_dir}' as '{filename}'.")
-
-        elif update.message.video:
-            video = await update.message.video.get_file()
-            filename = f"{update.message.video.file_name or video.file_id}.mp4"
-            file_path = os.path.join(self._uploads_dir, filename)
-            await video.download_to_drive(file_path)
-            await update.message.reply_text(
-                f"Video has been uploaded to '{self._uploads_dir}' as '{filename}'.")
-
-        elif update.message.audio:
-            audio = await update.message.audio.get_file()
-            filename = f"{update.message.audio.file_name or audio.file_id}.mp3"
-            file_path = os.path.join(self._uploads_dir, filename)
-            await audio.download_to_drive(file_path)
-            await update.message.reply_text(
-                f"Audio file has been uploaded to '{self._uploads_dir}' as '{filename}'.")
-
-        elif update.message.voice:
-            voice = await update.message.voice.get_file()
-            filename = f"{voice.file_id}.ogg"
-            file_path = os.path.join(self._uploads_dir, filename)
-            await voice.download_to_drive(file_path)
-            await update.message.reply_text(
-                f"Voice message has been uploaded to '{self._uploads_dir}' as '{filename}'.")
-
-        elif update.message.video_note:
-            video_note = await update.message.video_note.get_file()
-            filename = f"{video_note.file_id}.mp4"
-            file_path = os.path.join(self._uploads_dir, filename)
-            await video_note.download_to_drive(file_path)
-            await update.message.reply_text(
-                f"Video note has been uploaded to '{self._uploads_dir}' as '{filename}'.")
-
+        message = update.message
+        if message.document:
+            media, label, filename = message.document, "Document", message.document.file_name
+        elif message.photo:
+            media, label, filename = message.photo[-1], "Photo", None  # Get the best quality photo
+        elif message.video:
+            media, label, filename = message.video, "Video", message.video.file_name
+        elif message.audio:
+            media, label, filename = message.audio, "Audio file", message.audio.file_name
+        elif message.voice:
+            media, label, filename = message.voice, "Voice message", None
+        elif message.video_note:
+            media, label, filename = message.video_note, "Video note", None
         else:
-            await update.message.reply_text("No file or media was uploaded. Please try again.")
+            await message.reply_text("No file or media was uploaded. Please try again.")
+            return
+
+        file = await media.get_file()
+        if not filename:
+            extension = {"Photo": ".jpg", "Voice message": ".ogg", "Audio file": ".mp3"}.get(label, ".mp4")
+            filename = f"{file.file_id}{extension}"
 
-        print_cmd(f"user {SysTamer.get_update_username(update)}\t|\tuploaded {file_path}")
+        # content is hashed while it is written, identical content is stored once
+        writer = self._uploads_store.new_writer()
+        try:
+            data = await file.download_as_bytearray()  # bot API downloads are capped at 20 MB
+            await self._workers.run("fs", writer.write, data)
+            record, duplicate = await self._workers.run("fs", self._uploads_store.commit, writer, filename,
+                                                        str(SysTamer.get_update_username(update)))
+        except Exception:
+            await self._workers.run("fs", writer.discard)
+            raise
+
+        await message.reply_text(f"{label} has been uploaded to '{self._uploads_dir}' as '{record.name}'." +
+                                 (" Identical content was already stored, no extra space used." if duplicate else ""))
+        print_cmd(f"user {SysTamer.get_update_username(update)}\t|\tuploaded "
+                  f"{os.path.join(self._uploads_dir, record.name)}")
+
+    def _render_uploads_page(self, sort: str, name_filter: str, page: int):
+        total, records = self._uploads_store.query(sort, name_filter, page * self._uploads_page_size,
+                                                   self._uploads_page_size)
+        pages = max((total + self._uploads_page_size - 1) // self._uploads_page_size, 1)
+        if not records:
+            return ("No uploads match the filter." if name_filter else "Upload directory is empty."), None
+
+        response_lines = [escape_markdown(f"Uploads: {total}, Sort: {sort}, Filter: {name_filter or None}, "
+                                          f"Page: {page + 1}/{pages}", version=2)]
+        for index, record in enumerate(records, start=page * self._uploads_page_size + 1):
+            details = f"{record.size / 1024:.1f} KB, {time.strftime('%Y-%m-%d %H:%M', time.localtime(record.mtime))}"
+            response_lines.append(f"*{index}\\.* {escape_markdown(record.name, version=2)} "
+                                  f"\\({escape_markdown(details, version=2)}\\)")
+
+        navigation_buttons = []
+        # callback data is capped at 64 bytes, long filters are cut to fit
+        callback_filter = name_filter.encode()[:40].decode(errors="ignore")
+        if page > 0:
+            navigation_buttons.append(InlineKeyboardButton(
+                "◀️ Prev", callback_data=f"uploads {page - 1} {sort} {callback_filter}".rstrip()))
+        if page < pages - 1:
+            navigation_buttons.append(InlineKeyboardButton(
+                "Next ▶️", callback_data=f"uploads {page + 1} {sort} {callback_filter}".rstrip()))
+        return "\n".join(response_lines), InlineKeyboardMarkup([navigation_buttons]) if navigation_buttons else None
 
     @log_action
     @require_authentication
     @require_allowed_user
-    async def list_uploads(self, update: Update, _context: ContextTypes.DEFAULT_TYPE) -> None:
+    async def list_uploads(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        from misc.uploads_store import UPLOADS_SORT_KEYS
+        page, sort, filters_list = 0, "date", list()
+        for arg in context.args:
+            if arg.isdigit():
+                page = max(int(arg) - 1, 0)
+            elif arg.lower().startswith("sort="):
+                sort = arg.lower().split('=', 1)[1]
+            else:
+                filters_list.append(arg)
+        if sort not in UPLOADS_SORT_KEYS:
+            await update.message.reply_text(f"Usage: /list_uploads [page] [sort={'|'.join(UPLOADS_SORT_KEYS)}] "
+                                            f"[filter]")
+            return
+
         try:
-            if not os.path.exists(self._uploads_dir):
-                await update.message.reply_text("Upload directory does not exist.")
-                return
+            text, reply_markup = await self._workers.run("fs", self._render_uploads_page, sort,
+                                                         " ".join(filters_list), page)
+            await update.message.reply_text(text, parse_mode='MarkdownV2', reply_markup=reply_markup)
+        except Exception as e:
+            await update.message.reply_text(f"An error occurred: {str(e)}")
 
-            entries = os.listdir(self._uploads_dir)
-            if not entries:
-                await update.message.reply_text("Upload directory is empty.")
+    @log_action
+    @require_authentication
+    @require_allowed_user
+    async def handle_uploads_page(self, update: Update, _context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+        data = query.data.split(' ', 3)
+        page, sort = int(data[1]), data[2]
+        name_filter = data[3] if len(data) > 3 else ""
+        text, reply_markup = await self._workers.run("fs", self._render_uploads_page, sort, name_filter, page)
+        await query.edit_message_text(text, parse_mode='MarkdownV2', reply_markup=reply_markup)
+
+    @log_action
+    @require_authentication
+    @require_allowed_user
+    async def system_resource_monitoring(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        target = context.args[0] if context.args else None
+        if target is not None:
+            await self._fleet_system(update, target)
+            return
+        # answer from the background sampler, only sample inline if it hasn't produced anything yet
+        sample = self._metrics_sampler.latest() or self._metrics_sampler.sample()
+
+        table_chunks = generate_machine_stats_msg("MachineStats", sample.cpu_percent, sample.memory, sample.disk,
+                                                  swap_info=sample.swap, load_avg=sample.load_avg,
+                                                  per_core=sample.cpu_per_core,
+                                                  averages=self._metrics_sampler.window_averages())
+        await asyncio.gather(*[self._outbound.enqueue_text(update.message.chat_id, update.message.reply_text, chunk,
+                                                           parse_mode="MarkdownV2") for chunk in table_chunks])
+
+    async def _fleet_system(self, update: Update, target: str):
+        from misc.fleet import sample_to_dict, usage_from_dict
+        if not self._fleet or (target != "all" and target not in self._fleet.hosts):
+            hosts = "|".join(["all"] + self._fleet.hosts) if self._fleet else "no fleet_hosts configured"
+            await update.message.reply_text(f"Usage: /system [{hosts}]")
+            return
+
+        if target == "all":
+            # this host first, then every agent - all of them requested at once
+            local = sample_to_dict(self._metrics_sampler.latest() or self._metrics_sampler.sample(), dict())
+            results = {f"{local['hostname']}*": local}
+            results.update(await self._fleet.fan_out("system"))
+            table_chunks = generate_fleet_stats_msg(f"Fleet:{len(results)},Failed:"
+                                                    f"{sum(not isinstance(r, dict) for r in results.values())}",
+                                                    results)
+        else:
+            try:
+                stats = await self._fleet.call(target, "system")
+            except Exception as exc:
+                await update.message.reply_text(self.describe_fleet_error(target, exc))
                 return
+            table_chunks = generate_machine_stats_msg(f"MachineStats {target} ({stats['hostname']})",
+                                                      stats['cpu_percent'], usage_from_dict(stats['memory']),
+                                                      usage_from_dict(stats['disk']),
+                                                      swap_info=usage_from_dict(stats['swap']),
+                                                      load_avg=stats['load_avg'], per_core=stats['cpu_per_core'],
+                                                      averages=stats['averages'])
+        await asyncio.gather(*[self._outbound.enqueue_text(update.message.chat_id, update.message.reply_text, chunk,
+                                                           parse_mode="MarkdownV2") for chunk in table_chunks])
 
-            response_lines = []
-            for index, entry in enumerate(entries, start=1):
-                # Truncate the filename to 20 characters, including the extension
-                name, ext = os.path.splitext(entry)
-                max_name_length = 20 - len(ext)  # Calculate max length for the name part
-                if len(entry) > 20:
-                    if len(name) > max_name_length:
-                        name = name[:max_name_length - 3] + '...'  # Truncate and add '...' if needed
+    @log_action
+    @require_authentication
+    @require_allowed_user
+    async def network_monitoring(self, update: Update, _context: ContextTypes.DEFAULT_TYPE):
+        from misc.net_stats import interface_speeds, summarize_connections
+        # rates come from the sampler's last two counter readings, nothing here sleeps to measure a delta
+        rates = self._metrics_sampler.nic_rates()
+        if not rates:
+            await update.message.reply_text(f"Collecting network counters, try again in "
+                                            f"{self._metrics_sampler.interval:g} seconds.")
+            return
+        speeds = await self._workers.run("fs", interface_speeds)
+        try:
+            connections = await self._workers.run("fs", summarize_connections, self._net_top_n)
+        except psutil.AccessDenied:
+            connections = None
+        names = {pid: info["name"] for pid, info in self._process_tracker.snapshot.items()}
+        chunks = generate_net_stats_msg(f"Network, rates over the last {self._metrics_sampler.interval:g}s",
+                                        rates, speeds, connections, names)
+        await asyncio.gather(*[self._outbound.enqueue_text(update.message.chat_id, update.message.reply_text,
+                                                           chunk, parse_mode="MarkdownV2") for chunk in chunks])
 
-                    entry = name + ext  # Reassemble the filename with the extension
+    @log_action
+    @require_authentication
+    @require_allowed_user
+    async def disks_report(self, update: Update, _context: ContextTypes.DEFAULT_TYPE):
+        from misc.disk_report import list_mounts
+        mounts = await self._workers.run("fs", list_mounts)
+        # every statvfs runs on its own thread with its own timeout, a hung network mount can't stall the reply
+        usages = await self._mount_probe.usage(mounts)
+        chunks = generate_disks_msg(f"Disks, I/O over the last {self._metrics_sampler.interval:g}s", usages,
+                                    self._metrics_sampler.disk_rates())
+        await asyncio.gather(*[self._outbound.enqueue_text(update.message.chat_id, update.message.reply_text,
+                                                           chunk, parse_mode="MarkdownV2") for chunk in chunks])
+
+    async def _process_snapshot(self) -> Dict[int, Dict[str, Any]]:
+        snapshot = self._process_tracker.snapshot
+        if not snapshot:  # background refresh hasn't completed yet
+            snapshot = await self._workers.run("fs", self._process_tracker.refresh)
+        return snapshot
 
-                response_lines.append(f"**{index}**. {entry}")
+    @log_action
+    @require_authentication
+    @require_allowed_user
+    async def list_processes(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        sort_key, top_n, filters_lower, host = "cpu", self._processes_top_n, list(), None
+        for arg in context.args:
+            arg_lower = arg.lower()
+            if arg.startswith("@"):
+                host = arg[1:]
+            elif arg_lower.startswith("sort="):
+                sort_key = arg_lower.split('=', 1)[1]
+            elif arg_lower.startswith("top="):
+                top_n = arg_lower.split('=', 1)[1]
+            else:
+                filters_lower.append(arg_lower)
+        if sort_key not in PROC_SORT_KEYS or not str(top_n).isdigit() or int(top_n) <= 0 or \
+                (host is not None and (not self._fleet or host not in self._fleet.hosts)):
+            await update.message.reply_text(f"Usage: /processes [@host] [filter...] [sort={'|'.join(PROC_SORT_KEYS)}] "
+                                            f"[top=N]")
+            return
+        top_n = int(top_n)
 
-            response_text = "\n".join(response_lines)
-            await update.message.reply_text(response_text, parse_mode='MarkdownV2')
+        if host is not None:
+            try:
+                remote = await self._fleet.call(host, "processes", filters=filters_lower, sort=sort_key, top=top_n)
+            except Exception as exc:
+                await update.message.reply_text(self.describe_fleet_error(host, exc))
+                return
+            total, top_processes = remote["total"], remote["processes"]
+        else:
+            snapshot = await self._process_snapshot()
+            processes = ProcessTracker.matching(snapshot.values(), filters_lower)
+            total, top_processes = len(processes), ProcessTracker.top(processes, sort_key, top_n)
+
+        table_chunks = generate_proc_stats_msg(f"{'@' + host + ',' if host else ''}"
+                                               f"Processes:{total},Top:{len(top_processes)},"
+                                               f"Sort:{sort_key},Filters:{filters_lower if filters_lower else None}",
+                                               top_processes, show_io=(sort_key == "io"))
+        await asyncio.gather(*[self._outbound.enqueue_text(update.message.chat_id, update.message.reply_text,
+                                                           chunk, parse_mode="MarkdownV2")
+                               for chunk in table_chunks])
 
-        except Exception as e:
-            await update.message.reply_text(f"An error occurred: {str(e)}")
+    @log_action
+    @check_for_permission
+    @require_authentication
+    @require_allowed_user
+    async def process_details(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if len(context.args) != 1 or not context.args[0].isdigit():
+            await update.message.reply_text("Usage: /proc <pid>")
+            return
+        pid = int(context.args[0])
+        try:
+            info = await self._workers.run("fs", self._process_tracker.details, pid)
+        except psutil.NoSuchProcess:
+            await update.message.reply_text(f"No process with PID {pid}.")
+            return
+        snapshot = await self._process_snapshot()
+        children = sorted((proc for proc in snapshot.values() if proc["ppid"] == pid and proc["pid"] != pid),
+                          key=lambda proc: proc["pid"])
+        chunks = generate_proc_detail_msg(f"Process {pid}", info, children)
+        await asyncio.gather(*[self._outbound.enqueue_text(update.message.chat_id, update.message.reply_text,
+                                                           chunk, parse_mode="MarkdownV2") for chunk in chunks])
 
     @log_action
     @require_authentication
     @require_allowed_user
-    async def system_resource_monitoring(self, update: Update, _context: ContextTypes.DEFAULT_TYPE):
-        cpu_usage = psutil.cpu_percent(interval=1)
-        memory_info = psutil.virtual_memory()
-        disk_usage = psutil.disk_usage('/')
+    async def process_tree(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        root = None
+        if context.args:
+            if len(context.args) != 1 or not context.args[0].isdigit():
+                await update.message.reply_text("Usage: /ptree [pid]")
+                return
+            root = int(context.args[0])
+        snapshot = await self._process_snapshot()
+        if root is not None and root not in snapshot:
+            await update.message.reply_text(f"No process with PID {root}.")
+            return
+        rows = ProcessTracker.tree(snapshot, root)
+        ancestors = ProcessTracker.ancestors(snapshot, root) if root is not None else []
+        chunks = generate_proc_tree_msg(f"Process tree{f' of {root}' if root is not None else ''},"
+                                        f"Processes:{len(rows)}", rows, ancestors)
+        await asyncio.gather(*[self._outbound.enqueue_text(update.message.chat_id, update.message.reply_text,
+                                                           chunk, parse_mode="MarkdownV2") for chunk in chunks])
 
-        await update.message.reply_text(generate_machine_stats_msg("MachineStats", cpu_usage, memory_info, disk_usage),
-                                        parse_mode="MarkdownV2")
+    @log_action
+    @require_authentication
+    @require_allowed_user
+    async def show_stats(self, update: Update, _context: ContextTypes.DEFAULT_TYPE):
+        uptime = time.time() - self._handler_stats.started
+        table_chunks = generate_handler_stats_msg(f"HandlerStats (uptime {uptime / 3600:.1f}h)", self._handler_stats,
+                                                  self._loop_lag_probe)
+        await asyncio.gather(*[self._outbound.enqueue_text(update.message.chat_id, update.message.reply_text, chunk,
+                                                           parse_mode="MarkdownV2") for chunk in table_chunks])
 
     @log_action
     @require_authentication
     @require_allowed_user
-    async def list_processes(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        processes = []
-        args_lower = [i.lower() for i in context.args]
+    async def show_alerts(self, update: Update, _context: ContextTypes.DEFAULT_TYPE):
+        if not self._alerts or not self._alerts.rules:
+            await update.message.reply_text("No alert rules, set `alert_rules` in config.json.")
+            return
+        table_chunks = generate_alerts_msg(f"Alerts, evaluated every {self._metrics_sampler.interval:g}s",
+                                           self._alerts.states())
+        await asyncio.gather(*[self._outbound.enqueue_text(update.message.chat_id, update.message.reply_text, chunk,
+                                                           parse_mode="MarkdownV2") for chunk in table_chunks])
 
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
+    @log_action
+    @require_authentication
+    @require_allowed_user
+    async def kill_process(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        host, args = self.split_fleet_host(context.args)
+        if not args:
+            await update.message.reply_text("Usage: /kill [@host] <pid|pattern> [...], e.g. /kill 1234 5678 or "
+                                            "/kill @web1 chrome")
+            return
+        if not await self.check_fleet_host(update, host):
+            return
+        pids = [int(arg) for arg in args if arg.isdigit()]
+        patterns = [arg for arg in args if not arg.isdigit()]
+        if host is not None:
+            # the agent resolves the targets, leaves itself out and holds them until the kill is confirmed
             try:
-                proc_info = proc.as_dict(attrs=['pid', 'name', 'cpu_percent', 'memory_percent'])
-                if len(context.args) > 0:
-                    # filter provided - and proc is not in list (using any() to check for substr)
-                    filter_name = any(s in proc_info['name'].lower() for s in args_lower if proc_info['name'])
-                    filter_pid = any(s in str(proc_info['pid']) for s in args_lower)
-                    if not (filter_name or filter_pid):
-                        continue
-                processes.append(proc_info)
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                continue
-
-        table_chunks = generate_proc_stats_msg(f"Processes:{len(processes)},"
-                                               f"Filters:{context.args if context.args else None}", processes)
-        for chunk in table_chunks:
-            await update.message.reply_text(f"```{chunk}```", parse_mode="MarkdownV2")
+                remote = await self._fleet.call(host, "kill_targets", pids=pids, patterns=patterns)
+            except Exception as exc:
+                await update.message.reply_text(self.describe_fleet_error(host, exc))
+                return
+            targets, missing, kill = [tuple(target) for target in remote["targets"]], remote["missing"], remote["token"]
+        else:
+            if patterns:
+                snapshot = await self._process_snapshot()
+                pids += [proc["pid"] for proc in ProcessTracker.matching_names(snapshot.values(), patterns)]
+            pids = sorted(set(pids) - {os.getpid()})  # a broad pattern must not take the bot down with it
+            targets, missing = await self._workers.run("fs", resolve_kill_targets, pids)
+            kill = [(pid, create_time) for pid, _, create_time in targets]
+        missing = [pid for pid in missing if str(pid) in args]  # pattern matches may just have exited
+        if not targets:
+            await update.message.reply_text("No matching processes." +
+                                            (f" Not found: {', '.join(map(str, missing))}" if missing else ""))
+            return
+
+        # callback data is capped at 64 bytes, the targets wait in the user's data under a short token
+        pending = context.user_data.setdefault("pending_kills", OrderedDict())
+        token = secrets.token_hex(4)
+        pending[token] = (host, kill, len(targets))
+        while len(pending) > KILL_PENDING_MAX:
+            pending.popitem(last=False)
+        lines = [f"{pid} {name}" for pid, name, _ in targets[:KILL_LIST_MAX]]
+        if len(targets) > KILL_LIST_MAX:
+            lines.append(f"...and {len(targets) - KILL_LIST_MAX} more.")
+        if missing:
+            lines.append(f"Not found: {', '.join(map(str, missing))}")
+        keyboard = [[InlineKeyboardButton("✅ Yes", callback_data=f"kill_confirm {token}"),
+                     InlineKeyboardButton("❌ No", callback_data=f"kill_cancel {token}")]]
+        await update.message.reply_text(f"Terminate {len(targets)} processes{' on ' + host if host else ''}? "
+                                        f"Those still running after "
+                                        f"{self._kill_timeout:g}s get SIGKILL.\n" + "\n".join(lines),
+                                        reply_markup=InlineKeyboardMarkup(keyboard))
 
     @log_action
     @require_authentication
     @require_allowed_user
-    async def kill_process(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        process_ids = [int(i) for i in context.args]
-        if not process_ids:
-            await update.message.reply_text("No PID provided, usage: /kill *<pid\>*", parse_mode="MarkdownV2")
+    async def handle_kill_confirmation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+        action, _, token = query.data.partition(' ')
+        pending = context.user_data.get("pending_kills", dict()).pop(token, None)
+        if action == "kill_cancel":
+            await query.edit_message_text("Operation cancelled.")
             return
-        for process_id in process_ids:
+        if pending is None:
+            await query.edit_message_text("This confirmation has expired, run /kill again.")
+            return
+        host, kill, count = pending
+        chat_id = update.effective_chat.id
+        await self._outbound.send(chat_id, lambda: query.edit_message_text(
+            f"Terminating {count} processes{' on ' + host if host else ''}..."))
+        if host is not None:
             try:
-                proc = psutil.Process(process_id)
-                proc.terminate()
-                await update.message.reply_text(f"Process {process_id} ({proc.name()}) terminated.")
-            except (psutil.NoSuchProcess, IndexError, ValueError):
-                await update.message.reply_text("Invalid process ID or process does not exist.")
+                # the agent waits up to the same timeout, plus up to 2 seconds for SIGKILL to land
+                lines = await self._fleet.call(host, "kill", token=kill, timeout=self._kill_timeout,
+                                               call_timeout=self._fleet.timeout_for(host) + self._kill_timeout + 2)
+            except Exception as exc:
+                lines = [self.describe_fleet_error(host, exc)]
+            await self.send_long_message(query, "\n".join(lines))
+            return
+        # signalled together and waited on together, so the whole batch takes at most one timeout (plus SIGKILL's)
+        result = await self._workers.run("signal", terminate_processes, kill, timeout=self._kill_timeout)
+        await self.send_long_message(query, "\n".join(result.summary()))
 
     @log_action
     async def start(self, update: Update, _context: ContextTypes.DEFAULT_TYPE):
-        welcome_message = TG_BANNER + START_INTRO + generate_cmd_dict_msg("Commands", COMMANDS_DICT)
-        await update.message.reply_text(welcome_message, parse_mode='MarkdownV2', disable_web_page_preview=True)
+        for chunk in generate_cmd_dict_msg("Commands", COMMANDS_DICT, preamble=TG_BANNER + START_INTRO):
+            await update.message.reply_text(chunk, parse_mode='MarkdownV2', disable_web_page_preview=True)
 
     @log_action
     @require_authentication
@@ -449,86 +1015,411 @@ class SysTamer:
         )
         await update.message.reply_text(upload_message)
 
-    def list_files_and_directories(self, path: str):
-        entries = os.listdir(path)
-        buttons = []
-        self._browse_path_dict.clear()
+    @staticmethod
+    def _parse_path_args(args: List[str]) -> Tuple[str, Optional[int]]:
+        # `<path> [n]` - paths may contain spaces, a trailing number is the count
+        args = list(args)
+        count = int(args.pop()) if len(args) > 1 and args[-1].isdigit() else None
+        return os.path.abspath(os.path.expanduser(" ".join(args))), count
 
-        for entry in entries:
-            full_path = os.path.join(path, entry)
-            if full_path in self._ignored_paths or str(Path(full_path).resolve()) in self._ignored_paths:
-                continue
+    @log_action
+    @check_for_permission
+    @require_authentication
+    @require_allowed_user
+    async def tail_file(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        from misc.log_tail import tail_lines
+        if not context.args:
+            await update.message.reply_text("Usage: /tail <path> [lines]")
+            return
+        path, count = self._parse_path_args(context.args)
+        count = min(count or self._tail_default_lines, self._tail_max_lines)
+        if self.is_path_ignored(path):
+            await update.message.reply_text(f"{path} is excluded by `{SysTamer._BROWSE_IGNORE_PATH}`.")
+            return
+        try:
+            lines = await self._workers.run("fs", tail_lines, path, count)
+        except (FileNotFoundError, IsADirectoryError):
+            await update.message.reply_text(f"{path} is not a file.")
+            return
+        if not lines:
+            await update.message.reply_text(f"{path} is empty.")
+            return
+        await self.send_long_message(update, "\n".join([f"{path} (last {len(lines)} lines)"] + lines),
+                                     parse_mode="MarkdownV2")
 
-            entry_hashed = hashlib.md5(full_path.encode()).hexdigest()
-            self._browse_path_dict[entry_hashed] = full_path
+    def _stop_follow(self, chat_id: int) -> bool:
+        task = self._followers.pop(chat_id, None)
+        if task is None:
+            return False
+        task.cancel()
+        return True
 
-            if os.path.isdir(full_path):
-                buttons.append(InlineKeyboardButton(entry + '/', callback_data=f"cd {entry_hashed}"))
-            else:
-                buttons.append(InlineKeyboardButton(entry, callback_data=f"file {entry_hashed}"))
+    @log_action
+    @check_for_permission
+    @require_authentication
+    @require_allowed_user
+    async def follow_file(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        from misc.log_tail import FileFollower
+        chat_id = update.effective_chat.id
+        if not context.args:
+            await update.message.reply_text("Usage: /follow <path> | /follow stop")
+            return
+        if len(context.args) == 1 and context.args[0].lower() == "stop":
+            stopped = self._stop_follow(chat_id)
+            await update.message.reply_text("Stopped following." if stopped else "Nothing is being followed.")
+            return
+        path = os.path.abspath(os.path.expanduser(" ".join(context.args)))
+        if self.is_path_ignored(path):
+            await update.message.reply_text(f"{path} is excluded by `{SysTamer._BROWSE_IGNORE_PATH}`.")
+            return
+        try:
+            follower = await self._workers.run("fs", FileFollower, path)
+        except (FileNotFoundError, IsADirectoryError):
+            await update.message.reply_text(f"{path} is not a file.")
+            return
+        self._stop_follow(chat_id)  # one follow per chat, a new one replaces the old
+        message = await self._outbound.send_text(chat_id, update.message.reply_text, f"Following {path}...",
+                                                 mergeable=False, reply_markup=self._follow_markup())
+        self._followers[chat_id] = asyncio.create_task(self._follow_loop(chat_id, path, follower, message))
+
+    @staticmethod
+    def _follow_markup() -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup([[InlineKeyboardButton("⏹ Stop", callback_data="follow stop")]])
 
+    async def _edit_follow(self, chat_id: int, message, title: str, lines: List[str], live: bool) -> None:
+        text = next(iter_message_chunks(lines, header=(title,)))
+        markup = self._follow_markup() if live else None
+        try:
+            await self._outbound.send(chat_id, lambda: message.edit_text(text, parse_mode="MarkdownV2",
+                                                                         reply_markup=markup))
+        except telegram.error.BadRequest as exc:
+            if "not modified" not in str(exc):
+                raise
+
+    async def _follow_loop(self, chat_id: int, path: str, follower: "FileFollower", message) -> None:
+        from misc.log_tail import FOLLOW_MAX_LINE_LENGTH, FOLLOW_MAX_LINES_PER_READ
+        """
+        Polls the file for appended lines and shows them by editing one message, at most once per edit interval
+        so a chatty log costs a bounded number of requests. When the message is full it's left as is and the
+        following lines go to a new one.
+        """
+        title = f"{path} (following)"
+        budget = MAX_TELEGRAM_MSG_LEN - utf16_len("```\n" + escape_code(title) + "\n```")
+        lines, size, dirty = list(), 0, False
+        loop = asyncio.get_running_loop()
+        started = last_edit = loop.time()
+        try:
+            while loop.time() - started < self._follow_max_duration:
+                new_lines = await self._workers.run("fs", follower.read_new)
+                if len(new_lines) > FOLLOW_MAX_LINES_PER_READ:
+                    skipped = len(new_lines) - FOLLOW_MAX_LINES_PER_READ
+                    new_lines = [f"... {skipped} lines skipped ..."] + new_lines[-FOLLOW_MAX_LINES_PER_READ:]
+                for line in new_lines:
+                    line = line[:FOLLOW_MAX_LINE_LENGTH]
+                    line_size = utf16_len(escape_code(line) + "\n")
+                    if lines and size + line_size > budget:
+                        await self._edit_follow(chat_id, message, title, lines, live=False)
+                        message = await self._outbound.send_text(chat_id, message.reply_text, f"Following {path}...",
+                                                                 mergeable=False, reply_markup=self._follow_markup())
+                        lines, size = list(), 0
+                    lines.append(line)
+                    size += line_size
+                    dirty = True
+                if dirty and loop.time() - last_edit >= self._follow_edit_interval:
+                    await self._edit_follow(chat_id, message, title, lines, live=True)
+                    dirty, last_edit = False, loop.time()
+                await asyncio.sleep(self._follow_interval)
+            await self._outbound.send_text(chat_id, message.reply_text,
+                                           f"Stopped following {path} after {self._follow_max_duration // 60} minutes.")
+        except PermissionError:
+            await self._outbound.send_text(chat_id, message.reply_text, f"No permissions to read {path} anymore.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            print_error(f"Following {path} failed: {exc}")
+            await self._outbound.send_text(chat_id, message.reply_text, f"Stopped following {path}: {exc}")
+        finally:
+            follower.close()
+            if self._followers.get(chat_id) is asyncio.current_task():
+                del self._followers[chat_id]
+            try:  # flush what wasn't shown yet and drop the stop button
+                await self._edit_follow(chat_id, message, title, lines, live=False)
+            except (Exception, asyncio.CancelledError):
+                pass
+
+    @log_action
+    @require_authentication
+    @require_allowed_user
+    async def handle_follow_stop(self, update: Update, _context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        stopped = self._stop_follow(update.effective_chat.id)
+        await query.answer("Stopped following." if stopped else "Nothing is being followed.")
+
+    def list_files_and_directories(self, chat_id: int, path: str, page: int = 0):
+        resolved_parent = os.path.realpath(path)
+        entries = self._dir_listing_cache.list(path, skip=lambda e: self._ignore_matcher.is_entry_ignored(
+            e, resolved_parent if resolved_parent != path else None))
+        pages = max((len(entries) + self._browse_page_size - 1) // self._browse_page_size, 1)
+        page = min(max(page, 0), pages - 1)
+        page_entries = entries[page * self._browse_page_size:(page + 1) * self._browse_page_size]
         parent_directory = os.path.dirname(path)
-        if os.path.isdir(parent_directory):
-            parent_hashed = hashlib.md5(parent_directory.encode()).hexdigest()
-            self._browse_path_dict[parent_hashed] = parent_directory
-            buttons.append([InlineKeyboardButton("⬅️ Back", callback_data=f"cd {parent_hashed}"),
-                            InlineKeyboardButton("❌️ Close", callback_data=f"action close")])
-        else:
-            buttons.append([InlineKeyboardButton("❌️ Close", callback_data=f"action close")])
-        return buttons
+        path_handle, parent_handle, *entry_handles = self._path_registry.intern_many(
+            chat_id, [path, parent_directory] + [entry.path for entry in page_entries])
+        buttons = []
+
+        for entry, entry_handle in zip(page_entries, entry_handles):
+            if entry.is_dir:
+                buttons.append(InlineKeyboardButton(entry.name + '/', callback_data=f"cd {entry_handle}"))
+            else:
+                buttons.append(InlineKeyboardButton(entry.name, callback_data=f"file {entry_handle} {page}"))
+
+        buttons.append([InlineKeyboardButton("📦 Download folder", callback_data=f"action tar {path_handle}")])
+        navigation_buttons = []
+        if page > 0:
+            navigation_buttons.append(InlineKeyboardButton("◀️ Prev", callback_data=f"cd {path_handle} {page - 1}"))
+        if parent_directory != path and os.path.isdir(parent_directory):
+            navigation_buttons.append(InlineKeyboardButton("⬅️ Back", callback_data=f"cd {parent_handle}"))
+        navigation_buttons.append(InlineKeyboardButton("❌️ Close", callback_data="action close"))
+        if page < pages - 1:
+            navigation_buttons.append(InlineKeyboardButton("Next ▶️", callback_data=f"cd {path_handle} {page + 1}"))
+        buttons.append(navigation_buttons)
+        return buttons, page, pages
 
     @log_action
     @check_for_permission
     @require_authentication
     @require_allowed_user
-    async def browse(self, update: Update, _context: ContextTypes.DEFAULT_TYPE):
+    async def browse(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        host, args = self.split_fleet_host(context.args)
+        if host is not None:
+            await self._fleet_browse(update, host, args)
+            return
         path = str(Path.home())
-        all_buttons = self.list_files_and_directories(path)
+        all_buttons, page, pages = await self._workers.run("fs", self.list_files_and_directories,
+                                                           update.effective_chat.id, path)
         keyboard = self.build_navigate_keyboard(all_buttons)
 
         reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text('Choose a directory or file:', reply_markup=reply_markup)
+        await update.message.reply_text('Choose a directory or file:' + (f' (page {page + 1}/{pages})'
+                                                                         if pages > 1 else ''),
+                                        reply_markup=reply_markup)
+
+    async def _fleet_browse(self, update: Update, host: str, args: List[str]):
+        if not await self.check_fleet_host(update, host):
+            return
+        page = 0
+        if args and args[-1].lower().startswith("page="):
+            page = args.pop()[len("page="):]
+            if not page.isdigit() or int(page) < 1:
+                await update.message.reply_text("Usage: /browse @host [path] [page=N]")
+                return
+            page = int(page) - 1
+        try:
+            listing = await self._fleet.call(host, "browse", path=" ".join(args) or "~", page=page)
+        except Exception as exc:
+            await update.message.reply_text(self.describe_fleet_error(host, exc))
+            return
+        pages = max((listing["total"] + listing["page_size"] - 1) // listing["page_size"], 1)
+        if page >= pages:
+            await update.message.reply_text(f"{host}:{listing['path']} has {pages} page(s).")
+            return
+        lines = [f"{host}:{listing['path']} - {listing['total']} entries, page {page + 1}/{pages}"]
+        lines.extend(f"📁 {name}/" if is_dir else f"📄 {name}" for name, is_dir in listing["entries"])
+        if page + 1 < pages:
+            lines.append(f"Next: /browse @{host} {listing['path']} page={page + 2}")
+        await self.send_long_message(update, "\n".join(lines))
+
+    def _find_keyboard(self, chat_id: int, root: str, matches: List[Tuple[str, bool]]) -> InlineKeyboardMarkup:
+        from misc.file_search import FIND_LABEL_LENGTH
+        # same callbacks as /browse, so a result opens right into the browser
+        handles = self._path_registry.intern_many(chat_id, [path for path, _ in matches])
+        keyboard = list()
+        for (path, is_dir), handle in zip(matches, handles):
+            label = os.path.relpath(path, root) + ("/" if is_dir else "")
+            if len(label) > FIND_LABEL_LENGTH:
+                label = "…" + label[-(FIND_LABEL_LENGTH - 1):]
+            keyboard.append([InlineKeyboardButton(label, callback_data=f"cd {handle}" if is_dir else f"file {handle}")])
+        keyboard.append([InlineKeyboardButton("❌️ Close", callback_data="action close")])
+        return InlineKeyboardMarkup(keyboard)
 
+    @log_action
+    @check_for_permission
+    @require_authentication
+    @require_allowed_user
+    async def find_files(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not context.args:
+            await update.message.reply_text("Usage: /find <pattern> [root], e.g. /find *.log /var")
+            return
+        pattern = context.args[0]
+        root = os.path.abspath(os.path.expanduser(" ".join(context.args[1:]))) if len(context.args) > 1 \
+            else str(Path.home())
+        if self.is_path_ignored(root):
+            await update.message.reply_text(f"{root} is excluded by `{SysTamer._BROWSE_IGNORE_PATH}`.")
+            return
+        if not await self._workers.run("fs", os.path.isdir, root):
+            await update.message.reply_text(f"{root} is not a directory.")
+            return
+
+        chat_id = update.effective_chat.id
+        loop = asyncio.get_running_loop()
+        matches: List[Tuple[str, bool]] = list()  # appended on the loop, in the order the walker found them
+        stop = threading.Event()
+        title = f"Searching {root} for {pattern}..."
+        message = await self._outbound.send_text(chat_id, update.message.reply_text, title, mergeable=False)
+        search = asyncio.ensure_future(self._workers.run(
+            "search", self._file_finder.search, root, pattern,
+            on_match=lambda path, is_dir: loop.call_soon_threadsafe(matches.append, (path, is_dir)),
+            max_results=self._find_max_results, skip=self._ignore_matcher.is_ignored, stop=stop))
+        shown = 0
+        try:
+            # stream what was found so far, one edit per interval
+            while not search.done():
+                await asyncio.wait([search], timeout=self._find_edit_interval)
+                if not search.done() and len(matches) > shown:
+                    shown = len(matches)
+                    markup = await self._workers.run("fs", self._find_keyboard, chat_id, root, list(matches))
+                    await self._outbound.send(chat_id, lambda: message.edit_text(
+                        f"{title} {shown} found so far", reply_markup=markup))
+            stats = search.result()
+        except asyncio.TimeoutError:
+            stats = None
+        finally:
+            stop.set()
+
+        if not matches:
+            text = f"No matches for {pattern} under {root}" + (" (search timed out)." if stats is None else ".")
+            await self._outbound.send(chat_id, lambda: message.edit_text(text))
+            return
+        text = f"{len(matches)} matches for {pattern} under {root}"
+        if stats is None:
+            text += " (search timed out)"
+        elif stats.truncated:
+            text += f" (stopped at {self._find_max_results}, narrow the pattern or root)"
+        markup = await self._workers.run("fs", self._find_keyboard, chat_id, root, matches)
+        await self._outbound.send(chat_id, lambda: message.edit_text(text + ":", reply_markup=markup))
+
+    def _du_keyboard(self, chat_id: int, usage: "DiskUsage") -> InlineKeyboardMarkup:
+        parent = os.path.dirname(usage.path)
+        parent_handle, *child_handles = self._path_registry.intern_many(
+            chat_id, [parent] + [child.path for child in usage.children])
+        keyboard = list()
+        for child, handle in zip(usage.children, child_handles):
+            share = child.size / usage.size * 100 if usage.size else 0
+            label = f"{format_size(child.size)} ({share:.0f}%) {child.name}" + ("/" if child.is_dir else "")
+            # directories drill down, files open the /browse file actions
+            keyboard.append([InlineKeyboardButton(label, callback_data=f"du {handle}" if child.is_dir
+                                                  else f"file {handle}")])
+        navigation = list()
+        if parent != usage.path:
+            navigation.append(InlineKeyboardButton("⬅️ Up", callback_data=f"du {parent_handle}"))
+        navigation.append(InlineKeyboardButton("❌️ Close", callback_data="action close"))
+        keyboard.append(navigation)
+        return InlineKeyboardMarkup(keyboard)
+
+    async def _render_du(self, chat_id: int, path: str,
+                         reuse_totals: bool) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+        stop = threading.Event()
+        try:
+            usage = await self._workers.run("du", self._du_scanner.usage, path, top=self._du_top_n,
+                                            skip=self._ignore_matcher.is_ignored, stop=stop,
+                                            reuse_totals=reuse_totals)
+        except asyncio.TimeoutError:
+            return (f"Scanning {path} timed out. What was scanned so far is cached, "
+                    f"run it again or pick a subdirectory."), None
+        except (FileNotFoundError, NotADirectoryError):
+            return f"{path} is not a directory.", None
+        finally:
+            stop.set()
+        text = f"{usage.path}: {format_size(usage.size)} in {usage.files} files"
+        if usage.unreadable:
+            text += f", {usage.unreadable} unreadable directories left out"
+        markup = await self._workers.run("fs", self._du_keyboard, chat_id, usage)
+        return text, markup
+
+    @log_action
+    @check_for_permission
+    @require_authentication
+    @require_allowed_user
+    async def disk_usage(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        path = os.path.abspath(os.path.expanduser(" ".join(context.args))) if context.args else str(Path.home())
+        if self.is_path_ignored(path):
+            await update.message.reply_text(f"{path} is excluded by `{SysTamer._BROWSE_IGNORE_PATH}`.")
+            return
+        chat_id = update.effective_chat.id
+        message = await self._outbound.send_text(chat_id, update.message.reply_text, f"Scanning {path}...",
+                                                 mergeable=False)
+        # a new /du re-checks every directory, only unchanged ones are served from the cache
+        text, markup = await self._render_du(chat_id, path, reuse_totals=False)
+        await self._outbound.send(chat_id, lambda: message.edit_text(text, reply_markup=markup))
+
+    @log_action
+    @check_for_permission
+    @require_authentication
+    @require_allowed_user
+    async def handle_du_navigation(self, update: Update, _context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+        chat_id = update.effective_chat.id
+        path = self._path_registry.resolve(chat_id, query.data.split(' ', 1)[1])
+        if path is None:
+            await query.edit_message_text("This button has expired, run /du again.")
+            return
+        if self.is_path_ignored(path):
+            await query.edit_message_text(text="This path is excluded by .browseignore.")
+            return
+        # subtrees of the previous scan still have their totals cached, so this is usually instant
+        text, markup = await self._render_du(chat_id, path, reuse_totals=True)
+        await self._outbound.send(chat_id, lambda: query.edit_message_text(text, reply_markup=markup))
+
+    @log_action
     @check_for_permission
     @require_authentication
     @require_allowed_user
     async def handle_navigation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        from misc.file_transfer import TransferTooLarge
         query = update.callback_query
-        data = query.data.split(' ', 1)
+        data = query.data.split(' ')
         command = data[0]  # The command is the first part (e.g., "cd", "file", "action")
+        chat_id = update.effective_chat.id
+        # callbacks carry a per-chat path handle - "cd <handle> [page]", "file <handle> [page]", "action <act> [handle]"
+        handle = data[2] if command == "action" and len(data) > 2 else data[1] if len(data) > 1 else None
+        handle_path = self._path_registry.resolve(chat_id, handle) if handle else None
         print_cmd(f"user {SysTamer.get_update_username(update)}\t|\t"
                   f"handle_navigation received cmd -> {' '.join(data)}" +
-                  ('\t|\t(' + self._browse_path_dict.get(data[1]) + ')'
-                   if len(data) >= 1 and data[1] in self._browse_path_dict else ''))
+                  (f'\t|\t({handle_path})' if handle_path else ''))
+
+        if handle_path and self.is_path_ignored(handle_path):  # keyboards may predate a `.browseignore` change
+            await query.edit_message_text(text="This path is excluded by .browseignore.")
+            return
 
         if command == "cd":  # Handle directory navigation
-            hashed_path = data[1]
-            path = self._browse_path_dict.get(hashed_path)
+            path = handle_path
+            page = int(data[2]) if len(data) > 2 and data[2].isdigit() else 0
 
             if path and os.path.isdir(path):  # Ensure the path is a valid directory
-                all_buttons = self.list_files_and_directories(path)
+                all_buttons, page, pages = await self._workers.run("fs", self.list_files_and_directories,
+                                                                   chat_id, path, page)
                 keyboard = self.build_navigate_keyboard(all_buttons)
                 reply_markup = InlineKeyboardMarkup(keyboard)
-                await query.edit_message_text(text=f'Navigating to: {path}', reply_markup=reply_markup)
+                await query.edit_message_text(text=f'Navigating to: {path}' +
+                                                   (f' (page {page + 1}/{pages})' if pages > 1 else ''),
+                                              reply_markup=reply_markup)
             else:
                 await query.edit_message_text(text="The directory is invalid or does not exist.")
 
         elif command == "file":  # File clicked, show "Download/Delete/Back" options
-            selected_file = self._browse_path_dict.get(data[1])
-            parent_directory = os.path.dirname(selected_file)
-            parent_hashed = hashlib.md5(parent_directory.encode()).hexdigest()
-
-            # Store the parent directory in browse_path_dict
-            self._browse_path_dict[parent_hashed] = parent_directory
+            selected_file = handle_path
+            page = data[2] if len(data) > 2 and data[2].isdigit() else "0"
 
             if selected_file and os.path.isfile(selected_file):  # Ensure it's a valid file
+                parent_handle = self._path_registry.intern(chat_id, os.path.dirname(selected_file))
                 context.user_data['selected_file'] = selected_file
 
                 # Display action keypad
                 keyboard = [
-                    [InlineKeyboardButton("Download", callback_data="action download")],
-                    [InlineKeyboardButton("Delete", callback_data="action delete")],
-                    [InlineKeyboardButton("⬅️ Back", callback_data=f"cd {parent_hashed}")]
+                    [InlineKeyboardButton("Download", callback_data=f"action download {handle}")],
+                    [InlineKeyboardButton("Delete", callback_data=f"action delete {handle}")],
+                    [InlineKeyboardButton("⬅️ Back", callback_data=f"cd {parent_handle} {page}")]
                 ]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 await query.edit_message_text(text=f"Choose an action for {os.path.basename(selected_file)}:",
@@ -537,21 +1428,24 @@ class SysTamer:
                 await query.edit_message_text(text="The file is invalid or does not exist.")
         elif command == "action":  # Handle file actions (download or delete)
             action_type = data[1]  # This will be either 'download' or 'delete'
-            selected_file = context.user_data.get('selected_file')
+            # keyboards rendered before handles were attached to actions fall back to the last selected file
+            selected_file = handle_path or (context.user_data.get('selected_file')
+                                            if action_type in {"download", "delete"} else None)
+            if selected_file and self.is_path_ignored(selected_file):
+                await query.edit_message_text(text="This path is excluded by .browseignore.")
+                return
 
             if action_type == "download":
                 if selected_file:
                     try:
-                        with open(selected_file, 'rb') as file:
-                            await self.reply_with_timeout(update, query.message.reply_document, document=file)
-
+                        await self.send_file(update, query.message, selected_file)
                     except Exception as e:
                         await query.message.reply_text(f"Error: {str(e)}")
 
             elif action_type == "delete":
                 if selected_file:
                     try:
-                        os.remove(selected_file)
+                        await self._workers.run("fs", os.remove, selected_file)
                         msg = f"File '{selected_file}' has been deleted."
                     except FileNotFoundError:
                         msg = f"File '{selected_file}' not found."
@@ -559,30 +1453,57 @@ class SysTamer:
                         msg = f"Error: {str(e)} when attempting to delete."
                     await query.edit_message_text(text=msg)
 
+            elif action_type == "tar":
+                if handle_path and os.path.isdir(handle_path):
+                    try:
+                        await self.send_directory(update, query.message, handle_path)
+                    except TransferTooLarge as e:
+                        await query.message.reply_text(f"Cannot download: {e}.")
+                    except Exception as e:
+                        await query.message.reply_text(f"Error: {str(e)}")
+                else:
+                    await query.message.reply_text("The directory is invalid or does not exist.")
+
             elif action_type == "close":
                 await self.delete_message(update, context)
             else:
                 await query.edit_message_text(text="Invalid action selected.")
 
+    async def _run_systemctl(self, *args: str, check: bool = False,
+                             host: Optional[str] = None) -> subprocess.CompletedProcess:
+        # the subprocess gets the category timeout too, so a hung systemctl doesn't keep a worker thread busy
+        timeout = self._workers.timeout_for("subprocess")
+        if host is not None:
+            remote = await self._fleet.call(host, "systemctl", args=list(args),
+                                            call_timeout=self._fleet.timeout_for(host) + timeout)
+            result = subprocess.CompletedProcess(["systemctl", *args], remote["returncode"], remote["stdout"],
+                                                 remote["stderr"])
+            if check:
+                result.check_returncode()
+            return result
+        return await self._workers.run("subprocess", subprocess.run, ["systemctl", *args],
+                                       capture_output=True, text=True, check=check, timeout=timeout)
+
     @log_action
     @require_authentication
     @require_allowed_user
     async def systemctl_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if not context.args:
-            await self.safe_reply(update, "Usage: /systemctl <command> [service/filter]\n"
+        host, args = self.split_fleet_host(context.args)
+        if not args:
+            await self.safe_reply(update, "Usage: /systemctl [@host] <command> [service/filter]\n"
                                     "Commands: list, enable, disable, status, start, stop, restart")
             return
+        if not await self.check_fleet_host(update, host):
+            return
 
-        cmd = context.args[0].lower()
-        arg = context.args[1] if len(context.args) > 1 else ""
+        cmd = args[0].lower()
+        arg = args[1] if len(args) > 1 else ""
 
         if cmd == "list":
             filter_str = arg
             try:
-                result = subprocess.run(
-                    ["systemctl", "list-units", "--type=service", "--no-pager", "--no-legend"],
-                    capture_output=True, text=True, check=True
-                )
+                result = await self._run_systemctl("list-units", "--type=service", "--no-pager", "--no-legend",
+                                                   check=True, host=host)
                 lines = result.stdout.strip().split('\n')
                 filtered = [line for line in lines if filter_str.lower() in line.lower()] if filter_str else lines
                 if not filtered:
@@ -593,7 +1514,9 @@ class SysTamer:
                 output = "\n".join(filtered[:max_lines])
                 if len(filtered) > max_lines:
                     output += f"\n...and {len(filtered)-max_lines} more."
-                await self.safe_reply(update, f"```\n{output}\n```", parse_mode="MarkdownV2")
+                await self.send_long_message(update, output, parse_mode="MarkdownV2")
+            except asyncio.TimeoutError:
+                await self.safe_reply(update, "Error: systemctl timed out.")
             except Exception as e:
                 await self.safe_reply(update, f"Error: {e}")
 
@@ -604,14 +1527,16 @@ class SysTamer:
             # Ask for confirmation
             keyboard = [
                 [
-                    InlineKeyboardButton("✅ Yes", callback_data=f"systemctl_confirm {cmd} {arg}"),
+                    InlineKeyboardButton("✅ Yes", callback_data=f"systemctl_confirm {cmd} {arg}" +
+                                                                (f" @{host}" if host else "")),
                     InlineKeyboardButton("❌ No", callback_data="systemctl_cancel")
                 ]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await self.safe_reply(
                 update,
-                f"Are you sure you want to *{cmd}* service `{arg}`?",
+                f"Are you sure you want to *{cmd}* service `{arg}`" +
+                (f" on {escape_markdown(host, version=2)}" if host else "") + "?",
                 reply_markup=reply_markup,
                 parse_mode="MarkdownV2"
             )
@@ -621,14 +1546,13 @@ class SysTamer:
                 await self.safe_reply(update, f"Usage: /systemctl {cmd} <service>")
                 return
             try:
-                result = subprocess.run(
-                    ["systemctl", cmd, arg],
-                    capture_output=True, text=True
-                )
+                result = await self._run_systemctl(cmd, arg, host=host)
                 output = result.stdout.strip() or result.stderr.strip()
                 if not output:
                     output = f"systemctl {cmd} {arg} completed (no output)."
                 await self.send_long_message(update, output, parse_mode="MarkdownV2")
+            except asyncio.TimeoutError:
+                await self.safe_reply(update, "Error: systemctl timed out.")
             except Exception as e:
                 await self.safe_reply(update, f"Error: {e}")
 
@@ -639,18 +1563,18 @@ class SysTamer:
     async def handle_systemctl_confirmation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
-        data = query.data.split(' ', 2)
+        data = query.data.split(' ')
         if data[0] == "systemctl_confirm":
             cmd, arg = data[1], data[2]
+            host = data[3][1:] if len(data) > 3 else None
             try:
-                result = subprocess.run(
-                    ["systemctl", cmd, arg],
-                    capture_output=True, text=True
-                )
+                result = await self._run_systemctl(cmd, arg, host=host)
                 output = result.stdout.strip() or result.stderr.strip()
                 if not output:
                     output = f"systemctl {cmd} {arg} completed (no output)."
                 await self.send_long_message(query, output, parse_mode="MarkdownV2")
+            except asyncio.TimeoutError:
+                await query.edit_message_text("Error: systemctl timed out.")
             except Exception as e:
                 await query.edit_message_text(f"Error: {e}")
         elif data[0] == "systemctl_cancel":
@@ -660,12 +1584,23 @@ class SysTamer:
         application.add_handler(CommandHandler("start", self.start))
         application.add_handler(CommandHandler("help", self.start))
         application.add_handler(CommandHandler("browse", self.browse))
+        application.add_handler(CommandHandler("find", self.find_files))
+        application.add_handler(CommandHandler("du", self.disk_usage))
         application.add_handler(CommandHandler("system", self.system_resource_monitoring))
+        application.add_handler(CommandHandler("net", self.network_monitoring))
+        application.add_handler(CommandHandler("disks", self.disks_report))
         application.add_handler(CommandHandler("processes", self.list_processes))
         application.add_handler(CommandHandler("kill", self.kill_process))
+        application.add_handler(CommandHandler("proc", self.process_details))
+        application.add_handler(CommandHandler("ptree", self.process_tree))
         application.add_handler(CommandHandler("screenshot", self.send_screenshot))
+        application.add_handler(CommandHandler("record", self.record_screen))
+        application.add_handler(CommandHandler("stats", self.show_stats))
+        application.add_handler(CommandHandler("alerts", self.show_alerts))
         application.add_handler(CommandHandler("upload", self.upload_info))
         application.add_handler(CommandHandler("list_uploads", self.list_uploads))
+        application.add_handler(CommandHandler("tail", self.tail_file))
+        application.add_handler(CommandHandler("follow", self.follow_file))
         application.add_handler(CommandHandler("login", self.login))
         application.add_handler(CommandHandler("logout", self.logout))
         application.add_handler(CommandHandler("systemctl", self.systemctl_command))
@@ -680,6 +1615,10 @@ class SysTamer:
 
     def _register_cb_query_handlers(self, application: telegram.ext.Application) -> None:
         application.add_handler(CallbackQueryHandler(self.handle_systemctl_confirmation, pattern="^systemctl_"))
+        application.add_handler(CallbackQueryHandler(self.handle_kill_confirmation, pattern="^kill_"))
+        application.add_handler(CallbackQueryHandler(self.handle_uploads_page, pattern="^uploads "))
+        application.add_handler(CallbackQueryHandler(self.handle_follow_stop, pattern="^follow "))
+        application.add_handler(CallbackQueryHandler(self.handle_du_navigation, pattern="^du "))
         application.add_handler(CallbackQueryHandler(self.handle_navigation))
 
     def _build_app(self) -> telegram.ext.Application:
@@ -696,17 +1635,86 @@ class SysTamer:
         except Exception as exc:
             print_error(f"Exception occurred: {exc}")
 
+    async def _push_alert(self, event: "AlertEvent") -> None:
+        text = f"[{socket.gethostname()}] {event.describe()}"
+        print_info(text)
+        bot = self._application.bot
+        chat_ids = [int(uid) for uid in SysTamer._ALLOWED_USERS if uid.lstrip("-").isdigit()]
+        results = await asyncio.gather(*[self._outbound.enqueue_text(chat_id, functools.partial(bot.send_message,
+                                                                                                chat_id), text)
+                                         for chat_id in chat_ids], return_exceptions=True)
+        for chat_id, result in zip(chat_ids, results):
+            if isinstance(result, Exception):  # e.g. the user never started a chat with the bot
+                print_error(f"Couldn't push alert to {chat_id}: {result}")
+
+    async def _evaluate_alerts(self, sample: MetricsSample) -> None:
+        # only what the samplers already hold, plus one bounded statvfs per extra path the disk rules name
+        disk_percent = {self._metrics_sampler.disk_path: sample.disk.percent}
+        extra_paths = sorted(self._alerts.disk_paths - disk_percent.keys())
+        if extra_paths:
+            disk_percent.update(await self._mount_probe.percent(extra_paths))
+        process_names = None
+        if self._alerts.needs_processes and self._process_tracker.snapshot:
+            process_names = [(info["name"] or "").lower() for info in self._process_tracker.snapshot.values()]
+        for event in self._alerts.evaluate(sample, disk_percent, process_names, time.monotonic()):
+            await self._push_alert(event)
+
+    async def _alert_loop(self) -> None:
+        last_evaluated = None
+        while True:
+            await asyncio.sleep(self._metrics_sampler.interval)
+            sample = self._metrics_sampler.latest()
+            if sample is None or sample.timestamp == last_evaluated:
+                continue  # each sample is evaluated once
+            last_evaluated = sample.timestamp
+            try:
+                await self._evaluate_alerts(sample)
+            except Exception as exc:
+                print_error(f"Alert evaluation failed: {exc}")
+
+    def _start_background_tasks(self) -> None:
+        self._background_tasks.append(asyncio.create_task(self._metrics_sampler.run_forever()))
+        self._background_tasks.append(asyncio.create_task(self._process_tracker.run_forever()))
+        self._background_tasks.append(asyncio.create_task(self._loop_lag_probe.run_forever()))
+        if self._alerts and self._alerts.rules:
+            self._background_tasks.append(asyncio.create_task(self._alert_loop()))
+        if self._metrics_port:
+            self._background_tasks.append(asyncio.create_task(
+                serve_metrics(self._metrics_host, self._metrics_port,
+                              lambda: render_prometheus(self._handler_stats, self._loop_lag_probe))))
+
+    async def _stop_background_tasks(self) -> None:
+        followers = list(self._followers.values())
+        for task in self._background_tasks + followers:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, *followers, return_exceptions=True)
+        self._background_tasks.clear()
+
+    def _mark_startup(self, phase: str) -> None:
+        if self._startup_profile is not None:
+            self._startup_profile.mark(phase)
+
     async def run_forever(self) -> NoReturn:
+        self._mark_startup("build application")
         await self._application.updater.bot.set_my_commands([BotCommand(k, v) for k, v in COMMANDS_DICT.items()])
+        self._mark_startup("set commands")
 
         try:
             print_info("Initializing application...")
             await self._application.initialize()
             await self._application.start()
+            self._mark_startup("initialize")
+            print_info("Starting background samplers...")
+            self._start_background_tasks()
             print_info("Starting updater polling...")
             await self._application.updater.start_polling(error_callback=self._error_handler)
+            self._mark_startup("polling started")
+            if self._startup_profile is not None:
+                print_info("Startup profile:")
+                for line in self._startup_profile.report():
+                    print_info(f"\t{line}")
             await asyncio.Event().wait()
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, asyncio.CancelledError):  # asyncio.run cancels the main task on Ctrl+C
             print_info("Stopping...")
             await self._application.updater.stop()
             await self._application.stop()
@@ -717,25 +1725,55 @@ class SysTamer:
         finally:
             try:
                 print_info("Shutting down...")
+                await self._stop_background_tasks()
+                await self._outbound.close()
+                if self._fleet:
+                    self._fleet.close()
+                self._workers.shutdown()
+                self._close_features()
                 await self._application.shutdown()
-            except RuntimeError as exc:
+            except RuntimeError:
                 pass  # ignore 'RuntimeError: This Application is still running!'
 
 
-async def main() -> NoReturn:
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="SysTamer interactive Telegram bot")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="report how long each startup phase took, from process start to polling")
+    parser.add_argument("--agent", action="store_true",
+                        help="run headless as a fleet agent for a controlling bot instead of running the bot")
+    parser.add_argument("--listen", default=None,
+                        help="agent address, host:port or unix:/path (overrides `agent_listen` in the config)")
+    return parser.parse_args()
+
+
+async def run_agent(conf: dict, listen: Optional[str]) -> NoReturn:
+    from misc.fleet import FLEET_DEFAULT_PORT, FleetAgent
+    secret = conf.get("fleet_secret", None)
+    if not secret:
+        raise Exception("`fleet_secret` is missing, agents only serve authenticated controllers")
+    agent = FleetAgent(secret, conf, SysTamer._BROWSE_IGNORE_PATH)
+    await agent.serve_forever(listen or conf.get("agent_listen", f"127.0.0.1:{FLEET_DEFAULT_PORT}"))
+
+
+async def main(args: argparse.Namespace) -> NoReturn:
     config_path = Path(__file__).resolve().parent / "config.json"
     conf = load_config(config_path)
-    tamer = SysTamer(conf)
+    if args.agent:
+        await run_agent(conf, args.listen)
+        return
+    tamer = SysTamer(conf, startup_profile=_STARTUP_PROFILE if args.profile_startup else None)
     await tamer.run_forever()
 
 
 if __name__ == '__main__':
+    cli_args = parse_args()
     invalidate_print()
     printf(f"\n{BANNER}\n"
            f"Written by {BOLD}@flashnuke{RESET}")
     printf(DELIM)
     try:
-        asyncio.get_event_loop().run_until_complete(main())
+        asyncio.run(main(cli_args))
     except KeyboardInterrupt:
         pass
     finally:
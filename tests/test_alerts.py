@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import pytest
+
+from misc.alerts import AlertEngine, parse_alert_rule
+
+
+def _cpu(value):
+    return SimpleNamespace(cpu_percent=value)
+
+
+def test_parse_rules():
+    rule = parse_alert_rule("cpu > 90% for 2m")
+    assert (rule.metric, rule.above, rule.threshold, rule.duration) == ("cpu", True, 90.0, 120.0)
+    rule = parse_alert_rule("disk /var/ > 95%")
+    assert (rule.metric, rule.target) == ("disk", "/var")
+    rule = parse_alert_rule("process Nginx not running for 30s")
+    assert (rule.metric, rule.target, rule.duration) == ("process", "nginx", 30.0)
+    with pytest.raises(ValueError):
+        parse_alert_rule("cpu is high")
+
+
+def test_fires_after_the_duration_and_clears_with_hysteresis():
+    engine = AlertEngine([parse_alert_rule("cpu > 90% for 10s")], hysteresis=0.05, cooldown=0)
+    assert engine.evaluate(_cpu(95), {}, None, 0) == []
+    assert engine.evaluate(_cpu(95), {}, None, 5) == []
+    fired = engine.evaluate(_cpu(95), {}, None, 10)
+    assert [event.firing for event in fired] == [True]
+    assert engine.evaluate(_cpu(88), {}, None, 15) == []  # below the threshold, not past the hysteresis
+    resolved = engine.evaluate(_cpu(85), {}, None, 20)
+    assert [event.firing for event in resolved] == [False]
+
+
+def test_a_dip_resets_the_pending_duration():
+    engine = AlertEngine([parse_alert_rule("cpu > 90% for 10s")])
+    engine.evaluate(_cpu(95), {}, None, 0)
+    engine.evaluate(_cpu(50), {}, None, 5)
+    assert engine.evaluate(_cpu(95), {}, None, 10) == []
+    assert engine.states()[0][1] == "pending"
+
+
+def test_cooldown_silences_a_refire_and_its_resolution():
+    engine = AlertEngine([parse_alert_rule("cpu > 90%")], cooldown=100)
+    assert len(engine.evaluate(_cpu(95), {}, None, 0)) == 1
+    assert len(engine.evaluate(_cpu(10), {}, None, 10)) == 1  # resolved
+    assert engine.evaluate(_cpu(95), {}, None, 20) == []  # within the cooldown
+    assert engine.states()[0][1] == "firing"
+    assert engine.evaluate(_cpu(10), {}, None, 30) == []  # its firing wasn't pushed, neither is this
+    assert len(engine.evaluate(_cpu(95), {}, None, 200)) == 1
+
+
+def test_process_and_disk_rules_wait_for_data():
+    engine = AlertEngine([parse_alert_rule("process nginx* not running"), parse_alert_rule("disk /data > 90")])
+    assert engine.evaluate(None, {"/data": None}, None, 0) == []
+    assert [state for _, state, _ in engine.states()] == ["unknown", "unknown"]
+    events = engine.evaluate(None, {"/data": 95.0}, ["bash"], 1)
+    assert sorted(event.rule.metric for event in events) == ["disk", "process"]
+    events = engine.evaluate(None, {"/data": 95.0}, ["nginx: worker"], 2)
+    assert [(event.rule.metric, event.firing) for event in events] == [("process", False)]
@@ -0,0 +1,60 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+from misc.file_transfer import PartWriter, TransferTooLarge, directory_size, stream_directory_tar
+
+
+def _tree(root):
+    os.makedirs(os.path.join(root, "sub", "skip"))
+    with open(os.path.join(root, "a.bin"), 'wb') as file:
+        file.write(b"a" * 1000)
+    with open(os.path.join(root, "sub", "b.txt"), 'wb') as file:
+        file.write(b"b" * 500)
+    with open(os.path.join(root, "sub", "skip", "big.bin"), 'wb') as file:
+        file.write(b"c" * 10_000)
+
+
+def _ignore_skip(entry: os.DirEntry) -> bool:
+    return entry.name == "skip"
+
+
+def _collecting_writer(part_size: int = 64 * 1024):
+    parts = list()
+    writer = PartWriter(part_size, lambda part: parts.append(part) if part is not None else None)
+    return writer, parts
+
+
+def test_directory_size_leaves_out_ignored_subtrees(tmp_path):
+    _tree(str(tmp_path))
+    assert directory_size(str(tmp_path), _ignore_skip, 10 ** 6) == 1500
+    assert directory_size(str(tmp_path), lambda entry: False, 10 ** 6) == 11_500
+
+
+def test_directory_size_rejects_oversized_folder(tmp_path):
+    _tree(str(tmp_path))
+    with pytest.raises(TransferTooLarge):
+        directory_size(str(tmp_path), lambda entry: False, 5000)
+
+
+def test_tar_round_trip(tmp_path):
+    _tree(str(tmp_path / "data"))
+    writer, parts = _collecting_writer(part_size=100)
+    skipped = stream_directory_tar(str(tmp_path / "data"), writer, _ignore_skip, 10 ** 6)
+    assert skipped == 0
+    assert len(parts) > 1  # split into parts of 100 bytes
+    archive = b"".join(part.file.read() for part in parts)
+    with tarfile.open(fileobj=io.BytesIO(archive), mode="r:gz") as tar:
+        names = set(tar.getnames())
+    assert {"data", "data/a.bin", "data/sub", "data/sub/b.txt"} <= names
+    assert not any("skip" in name for name in names)
+
+
+def test_tar_stops_at_the_cap_inside_the_walk(tmp_path):
+    # a folder that grew after it was sized is still cut off by the walk itself
+    _tree(str(tmp_path))
+    writer, _ = _collecting_writer()
+    with pytest.raises(TransferTooLarge):
+        stream_directory_tar(str(tmp_path), writer, lambda entry: False, 5000)
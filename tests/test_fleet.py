@@ -0,0 +1,161 @@
+import os
+import struct
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from misc.fleet import (FLEET_NONCE_SIZE, FleetAgent, FleetController, FleetProtocolError, FleetRemoteError,
+                        _Session)
+
+
+def _sessions(secret: bytes = b"secret"):
+    client_nonce, server_nonce = b"c" * FLEET_NONCE_SIZE, b"s" * FLEET_NONCE_SIZE
+    return (_Session(secret, client_nonce, server_nonce, is_server=False),
+            _Session(secret, client_nonce, server_nonce, is_server=True))
+
+
+def test_session_round_trip():
+    client, server = _sessions()
+    assert server.open(client.seal({"method": "ping"})) == {"method": "ping"}
+    assert client.open(server.seal({"result": 1})) == {"result": 1}
+
+
+def test_session_rejects_tampered_replayed_and_reflected_frames():
+    client, server = _sessions()
+    frame = client.seal({"method": "ping"})
+    with pytest.raises(FleetProtocolError):
+        server.open(frame.replace(b"ping", b"kill"))
+    client, server = _sessions()
+    frame = client.seal({"method": "ping"})
+    server.open(frame)
+    with pytest.raises(FleetProtocolError):
+        server.open(frame)  # replayed, the sequence number moved on
+    client, server = _sessions()
+    with pytest.raises(FleetProtocolError):
+        client.open(client.seal({"result": 1}))  # a request sent back as a response
+
+
+def test_session_rejects_another_secret():
+    client, _ = _sessions(b"secret")
+    _, server = _sessions(b"other")
+    with pytest.raises(FleetProtocolError):
+        server.open(client.seal({"method": "ping"}))
+
+
+async def _with_agent(tmp_path, test):
+    address = f"unix:{tmp_path / 'agent.sock'}"
+    agent = FleetAgent("secret", {"sample_interval": 60, "process_refresh_interval": 60},
+                       str(tmp_path / ".browseignore"))
+    server = asyncio.ensure_future(agent.serve_forever(address))
+    for _ in range(100):
+        if (tmp_path / "agent.sock").exists():
+            break
+        await asyncio.sleep(0.01)
+    try:
+        return await test(address)
+    finally:
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+
+
+def test_controller_calls_agent(tmp_path):
+    async def test(address):
+        controller = FleetController({"host": address}, "secret", timeout=5)
+        try:
+            ping = await controller.call("host", "ping")
+            with pytest.raises(FleetRemoteError):
+                await controller.call("host", "shutdown")  # not served by agents
+            return ping
+        finally:
+            controller.close()
+
+    assert "hostname" in asyncio.run(_with_agent(tmp_path, test))
+
+
+def test_wrong_secret_is_dropped(tmp_path):
+    async def test(address):
+        controller = FleetController({"host": address}, "wrong", timeout=5)
+        try:
+            with pytest.raises((asyncio.IncompleteReadError, ConnectionError)):
+                await controller.call("host", "ping")
+        finally:
+            controller.close()
+
+    asyncio.run(_with_agent(tmp_path, test))
+
+
+def test_oversized_handshake_is_refused_before_buffering(tmp_path):
+    async def test(address):
+        reader, writer = await asyncio.open_unix_connection(address[len("unix:"):])
+        writer.write(struct.pack(">I", 16 * 1024 ** 2))  # announces a 16 MB first frame
+        await writer.drain()
+        try:
+            # the agent hangs up right away instead of waiting for the body
+            return await asyncio.wait_for(reader.read(), timeout=5)
+        finally:
+            writer.close()
+
+    assert asyncio.run(_with_agent(tmp_path, test)) == b""
+
+
+def _call_agent(tmp_path, test):
+    async def with_controller(address):
+        controller = FleetController({"host": address}, "secret", timeout=10)
+        try:
+            return await test(controller)
+        finally:
+            controller.close()
+
+    return asyncio.run(_with_agent(tmp_path, with_controller))
+
+
+def test_kill_takes_a_token_from_kill_targets_and_spares_the_agent(tmp_path):
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+
+    async def test(controller):
+        with pytest.raises(FleetRemoteError):
+            await controller.call("host", "kill", token="made-up")  # never resolved, nothing to confirm
+        own = await controller.call("host", "kill_targets", pids=[os.getpid(), os.getppid()])
+        resolved = await controller.call("host", "kill_targets", pids=[child.pid])
+        summary = await controller.call("host", "kill", token=resolved["token"], timeout=5)
+        with pytest.raises(FleetRemoteError):
+            await controller.call("host", "kill", token=resolved["token"])  # used up
+        return own, resolved, summary
+
+    try:
+        own, resolved, summary = _call_agent(tmp_path, test)
+    finally:
+        child.kill()
+    assert own["token"] is None and own["targets"] == []
+    assert [target[0] for target in resolved["targets"]] == [child.pid]
+    assert summary[0] == "1 terminated."
+    assert child.wait(timeout=5) is not None
+
+
+def test_systemctl_accepts_only_whitelisted_commands_on_one_unit(tmp_path):
+    async def test(controller):
+        errors = list()
+        for args in (["daemon-reload"], ["restart", "--all"], ["stop", "a", "b"], ["list-units", "--all"]):
+            with pytest.raises(FleetRemoteError) as error:
+                await controller.call("host", "systemctl", args=args)
+            errors.append(str(error.value))
+        return errors
+
+    assert all("is not allowed" in error for error in _call_agent(tmp_path, test))
+
+
+def test_browse_follows_the_agents_ignore_file(tmp_path):
+    (tmp_path / "data" / "secret").mkdir(parents=True)
+    (tmp_path / "data" / "notes.txt").write_text("")
+    (tmp_path / ".browseignore").write_text("data/secret\n")
+
+    async def test(controller):
+        listing = await controller.call("host", "browse", path=str(tmp_path / "data"))
+        with pytest.raises(FleetRemoteError):
+            await controller.call("host", "browse", path=str(tmp_path / "data" / "secret"))
+        return listing
+
+    listing = _call_agent(tmp_path, test)
+    assert listing["total"] == 1 and listing["entries"] == [["notes.txt", False]]
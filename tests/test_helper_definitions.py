@@ -0,0 +1,32 @@
+from misc.helper_definitions import MAX_TELEGRAM_MSG_LEN, escape_code, iter_message_chunks, utf16_len
+
+
+def test_chunks_stay_under_the_limit_and_repeat_the_header():
+    lines = [f"row {i} " + "😀" * 20 for i in range(500)]
+    chunks = list(iter_message_chunks(lines, header=("Title",)))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert utf16_len(chunk) <= MAX_TELEGRAM_MSG_LEN
+        assert chunk.startswith("```\nTitle\n") and chunk.endswith("```")
+    body = [line for chunk in chunks for line in chunk[len("```\nTitle\n"):-len("```")].splitlines()]
+    assert body == lines
+
+
+def test_length_is_measured_after_escaping():
+    lines = ["`\\" * 40] * 100
+    for chunk in iter_message_chunks(lines, max_len=500):
+        assert utf16_len(chunk) <= 500
+        assert escape_code("`\\" * 40) in chunk
+
+
+def test_overlong_line_is_wrapped_without_splitting_escapes():
+    line = "`" * 1000
+    chunks = list(iter_message_chunks([line], max_len=300))
+    assert all(utf16_len(chunk) <= 300 for chunk in chunks)
+    assert "".join(chunk[len("```\n"):-len("```")].replace("\n", "") for chunk in chunks) == escape_code(line)
+
+
+def test_plain_text_and_empty_input():
+    assert list(iter_message_chunks(["a", "b"], code_block=False)) == ["a\nb\n"]
+    assert list(iter_message_chunks([])) == []
+    assert list(iter_message_chunks([], header=("Empty",))) == ["```\nEmpty\n```"]
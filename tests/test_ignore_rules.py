@@ -0,0 +1,43 @@
+import os
+
+from misc.ignore_rules import IgnoreMatcher
+
+
+def _matcher(*lines, base_dir="/srv"):
+    return IgnoreMatcher(list(lines), base_dir)
+
+
+def test_bare_names_match_at_any_depth():
+    matcher = _matcher("*.log", "node_modules/")
+    assert matcher.is_ignored("/var/log/app.log", is_dir=False)
+    assert matcher.is_ignored("/home/u/project/node_modules", is_dir=True)
+    assert not matcher.is_ignored("/home/u/project/node_modules", is_dir=False)  # dir-only rule
+    assert not matcher.is_ignored("/var/log/app.txt", is_dir=False)
+
+
+def test_an_ignored_directory_takes_its_subtree():
+    matcher = _matcher("/etc/secret")
+    assert matcher.is_ignored("/etc/secret", is_dir=True)
+    assert matcher.is_ignored("/etc/secret/keys/id_rsa", is_dir=False)
+    assert not matcher.is_ignored("/etc/secrets", is_dir=True)
+
+
+def test_relative_paths_are_anchored_at_the_ignore_file():
+    matcher = _matcher("data/cache", base_dir="/srv")
+    base = os.path.realpath("/srv")
+    assert matcher.is_ignored(f"{base}/data/cache", is_dir=True)
+    assert not matcher.is_ignored("/other/data/cache", is_dir=True)
+
+
+def test_the_last_matching_rule_wins():
+    matcher = _matcher("*.log", "!keep.log")
+    assert matcher.is_ignored("/var/app.log", is_dir=False)
+    assert not matcher.is_ignored("/var/keep.log", is_dir=False)
+
+
+def test_double_star_and_comments():
+    matcher = _matcher("# comment", "", "/home/**/tmp")
+    assert matcher.is_ignored("/home/tmp", is_dir=True)
+    assert matcher.is_ignored("/home/u/a/b/tmp", is_dir=True)
+    assert not matcher.is_ignored("/opt/tmp", is_dir=True)
+    assert not _matcher("# only a comment")
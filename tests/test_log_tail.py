@@ -0,0 +1,50 @@
+import os
+
+from misc.log_tail import FileFollower, tail_lines
+
+
+def _write(path, text, mode='a'):
+    with open(path, mode) as file:
+        file.write(text)
+
+
+def test_tail_lines_reads_backwards_across_blocks(tmp_path):
+    path = str(tmp_path / "app.log")
+    _write(path, "".join(f"line {i}\n" for i in range(1000)), 'w')
+    assert tail_lines(path, 3, block_size=16) == ["line 997", "line 998", "line 999"]
+    assert tail_lines(path, 0) == []
+
+
+def test_follower_holds_back_a_partial_line(tmp_path):
+    path = str(tmp_path / "app.log")
+    _write(path, "before\n", 'w')
+    follower = FileFollower(path)
+    _write(path, "one\ntw")
+    assert follower.read_new() == ["one"]
+    _write(path, "o\n")
+    assert follower.read_new() == ["two"]
+    follower.close()
+
+
+def test_follower_keeps_the_unterminated_line_on_rotation(tmp_path):
+    path = str(tmp_path / "app.log")
+    _write(path, "old\n", 'w')
+    follower = FileFollower(path)
+    _write(path, "new1\nnew2")
+    assert follower.read_new() == ["new1"]
+    os.rename(path, path + ".1")
+    _write(path, "fresh\n", 'w')
+    assert follower.read_new() == ["new2", "fresh"]
+    assert follower.read_new() == []
+    follower.close()
+
+
+def test_follower_restarts_after_truncation(tmp_path):
+    path = str(tmp_path / "app.log")
+    _write(path, "a long first line\n", 'w')
+    follower = FileFollower(path)
+    _write(path, "tail", 'a')
+    assert follower.read_new() == []
+    _write(path, "x\n", 'w')  # copytruncate
+    assert follower.read_new() == ["tail", "x"]
+    follower.close()
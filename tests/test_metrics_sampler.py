@@ -0,0 +1,26 @@
+import asyncio
+
+from misc.metrics_sampler import MetricsSampler
+
+
+def test_collect_does_not_touch_the_buffer():
+    sampler = MetricsSampler(interval=1)
+    sample = sampler.collect()
+    assert sampler.latest() is None
+    assert sampler.record(sample) is sampler.latest()
+    assert sampler.window(60) == [sample]
+
+
+def test_background_samples_are_appended_on_the_loop():
+    async def main():
+        sampler = MetricsSampler(interval=0.5)
+        task = asyncio.ensure_future(sampler.run_forever())
+        seen = 0
+        for _ in range(40):
+            seen = max(seen, len(sampler.window(60)))  # iterating while the sampler is running
+            await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return seen
+
+    assert asyncio.run(main()) >= 2
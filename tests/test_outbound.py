@@ -0,0 +1,76 @@
+import asyncio
+
+from misc.helper_definitions import utf16_len
+from misc.outbound import OutboundScheduler
+
+
+class FakeMessage:
+    """Stands in for a telegram Message, records what was sent as a reply to it"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.sent = list()
+
+    async def reply_text(self, text, **kwargs):
+        self.sent.append(text)
+        return f"{self.name}:{len(self.sent)}"
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def _scheduler(max_merge_length: int = 4000) -> OutboundScheduler:
+    return OutboundScheduler(global_rate=1000, chat_rate=1000, chat_burst=1000, max_merge_length=max_merge_length)
+
+
+def test_merges_texts_to_the_same_message():
+    async def main():
+        outbound, message = _scheduler(), FakeMessage("a")
+        results = await asyncio.gather(*[outbound.enqueue_text(1, message.reply_text, text) for text in "xyz"])
+        await outbound.close()
+        return message, results
+
+    message, results = _run(main())
+    assert message.sent == ["x\ny\nz"]
+    assert results == ["a:1"] * 3
+
+
+def test_does_not_merge_replies_to_different_messages():
+    async def main():
+        outbound, first, second = _scheduler(), FakeMessage("a"), FakeMessage("b")
+        results = await asyncio.gather(outbound.enqueue_text(1, first.reply_text, "one"),
+                                       outbound.enqueue_text(1, second.reply_text, "two"))
+        await outbound.close()
+        return first, second, results
+
+    first, second, results = _run(main())
+    assert first.sent == ["one"] and second.sent == ["two"]
+    assert results == ["a:1", "b:1"]
+
+
+def test_unmergeable_send_gets_its_own_message():
+    async def main():
+        outbound, message = _scheduler(), FakeMessage("a")
+        results = await asyncio.gather(outbound.enqueue_text(1, message.reply_text, "status", mergeable=False),
+                                       outbound.enqueue_text(1, message.reply_text, "other"),
+                                       outbound.enqueue_text(1, message.reply_text, "more"))
+        await outbound.close()
+        return message, results
+
+    message, results = _run(main())
+    assert message.sent == ["status", "other\nmore"]
+    assert results == ["a:1", "a:2", "a:2"]
+
+
+def test_merged_length_is_measured_in_utf16_units():
+    async def main():
+        outbound, message = _scheduler(max_merge_length=100), FakeMessage("a")
+        text = "😀" * 30  # 30 characters, 60 UTF-16 units
+        await asyncio.gather(*[outbound.enqueue_text(1, message.reply_text, text) for _ in range(3)])
+        await outbound.close()
+        return message
+
+    message = _run(main())
+    assert len(message.sent) == 3
+    assert all(utf16_len(text) <= 100 for text in message.sent)
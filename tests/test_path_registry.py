@@ -0,0 +1,33 @@
+from misc.path_registry import PathRegistry
+
+
+def test_handles_are_stable_and_per_chat():
+    registry = PathRegistry()
+    handle = registry.intern(1, "/var/log")
+    assert registry.intern(1, "/var/log") == handle
+    assert registry.resolve(1, handle) == "/var/log"
+    assert registry.resolve(2, handle) is None
+    other = registry.intern(2, "/etc")
+    assert registry.resolve(1, handle) == "/var/log"  # another chat's listing doesn't invalidate it
+    assert registry.resolve(2, other) == "/etc"
+
+
+def test_least_recently_used_handles_are_evicted():
+    registry = PathRegistry(capacity=2)
+    first, second = registry.intern_many(1, ["/a", "/b"])
+    registry.resolve(1, first)  # touched, so /b is the oldest now
+    registry.intern(1, "/c")
+    assert registry.resolve(1, first) == "/a"
+    assert registry.resolve(1, second) is None
+
+
+def test_handles_survive_a_restart(tmp_path):
+    db_path = str(tmp_path / "handles.db")
+    registry = PathRegistry(db_path=db_path)
+    handle = registry.intern(1, "/var/log")
+    registry.close()
+
+    restored = PathRegistry(db_path=db_path)
+    assert restored.resolve(1, handle) == "/var/log"
+    assert restored.intern(1, "/etc") != handle  # numbering continues after the restored handles
+    restored.close()
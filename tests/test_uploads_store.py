@@ -0,0 +1,98 @@
+import os
+
+from misc.uploads_store import UploadsStore
+
+
+def _upload(store: UploadsStore, name: str, content: bytes):
+    writer = store.new_writer()
+    writer.write(content)
+    return store.commit(writer, name, "tester")
+
+
+def _names(store: UploadsStore):
+    return sorted(record.name for record in store.query(sort="name")[1])
+
+
+def _blob(store: UploadsStore, sha256: str) -> str:
+    return os.path.join(store.root, ".blobs", sha256[:2], sha256)
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = UploadsStore(str(tmp_path))
+    first, duplicate_first = _upload(store, "a.txt", b"same")
+    second, duplicate_second = _upload(store, "b.txt", b"same")
+    assert (duplicate_first, duplicate_second) == (False, True)
+    assert first.sha256 == second.sha256
+    assert _names(store) == ["a.txt", "b.txt"]
+    store.close()
+
+
+def test_removed_names_are_forgotten_and_orphaned_blobs_collected(tmp_path):
+    store = UploadsStore(str(tmp_path), sync_ttl=3600)
+    record, _ = _upload(store, "a.txt", b"shared")
+    _upload(store, "b.txt", b"shared")
+    assert _names(store) == ["a.txt", "b.txt"]
+
+    os.remove(tmp_path / "a.txt")
+    assert _names(store) == ["b.txt"]
+    assert os.path.exists(_blob(store, record.sha256))  # b.txt still links to it
+
+    os.remove(tmp_path / "b.txt")
+    assert _names(store) == []
+    assert not os.path.exists(_blob(store, record.sha256))
+    store.close()
+
+
+def test_external_renames_and_additions_are_picked_up(tmp_path):
+    store = UploadsStore(str(tmp_path), sync_ttl=3600)
+    record, _ = _upload(store, "a.txt", b"content")
+    assert _names(store) == ["a.txt"]
+
+    os.rename(tmp_path / "a.txt", tmp_path / "renamed.txt")
+    (tmp_path / "added.txt").write_bytes(b"other")
+    assert _names(store) == ["added.txt", "renamed.txt"]
+    assert os.path.exists(_blob(store, record.sha256))  # the renamed name still links to it
+    store.close()
+
+
+def _edit_in_place(path, content: bytes):
+    os.chmod(path, 0o644)  # stored read-only, as a user's editor would have to force it
+    with open(path, 'r+b') as file:
+        file.write(content)
+
+
+def test_blob_edited_through_a_name_is_not_reused(tmp_path):
+    store = UploadsStore(str(tmp_path), sync_ttl=3600)
+    _upload(store, "a.txt", b"original")
+    _edit_in_place(tmp_path / "a.txt", b"modified")
+
+    _, duplicate = _upload(store, "b.txt", b"original")
+    assert not duplicate
+    assert (tmp_path / "b.txt").read_bytes() == b"original"
+    assert (tmp_path / "a.txt").read_bytes() == b"modified"
+    assert not os.path.samefile(tmp_path / "a.txt", tmp_path / "b.txt")
+    store.close()
+
+
+def test_sync_rehashes_names_edited_in_place(tmp_path):
+    store = UploadsStore(str(tmp_path), sync_ttl=0)
+    record, _ = _upload(store, "a.txt", b"original")
+    _upload(store, "b.txt", b"original")
+    _edit_in_place(tmp_path / "a.txt", b"modified!")
+
+    _, records = store.query(sort="name")
+    assert [(r.name, r.size) for r in records] == [("a.txt", 9), ("b.txt", 9)]  # both names share the inode
+    assert all(r.sha256 != record.sha256 for r in records)
+    assert not os.path.exists(_blob(store, record.sha256))  # detached, it no longer holds `original`
+
+    _, duplicate = _upload(store, "c.txt", b"original")
+    assert not duplicate
+    assert (tmp_path / "c.txt").read_bytes() == b"original"
+    store.close()
+
+
+def test_blobs_are_stored_read_only(tmp_path):
+    store = UploadsStore(str(tmp_path))
+    record, _ = _upload(store, "a.txt", b"content")
+    assert os.stat(_blob(store, record.sha256)).st_mode & 0o222 == 0
+    store.close()
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from misc.workers import WorkerPool
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_slow_category_does_not_hold_back_another():
+    async def main():
+        workers, release = WorkerPool(categories={"du": (2, 5), "fs": (1, 5)}), threading.Event()
+        walks = [asyncio.ensure_future(workers.run("du", release.wait)) for _ in range(2)]
+        try:
+            return await workers.run("fs", lambda: "listed", wait_timeout=1)
+        finally:
+            release.set()
+            await asyncio.gather(*walks)
+            workers.shutdown()
+
+    assert _run(main()) == "listed"
+
+
+def test_time_waiting_for_a_slot_does_not_count_against_the_timeout():
+    async def main():
+        workers = WorkerPool(categories={"fs": (1, 0.3)})
+        try:
+            return await asyncio.gather(*[workers.run("fs", time.sleep, 0.2) for _ in range(3)])
+        finally:
+            workers.shutdown()
+
+    assert _run(main()) == [None] * 3
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    async def main():
+        workers, running, overlap = WorkerPool(categories={"fs": (1, 5)}), list(), list()
+
+        def job(seconds):
+            running.append(seconds)
+            overlap.append(len(running))
+            time.sleep(seconds)
+            running.remove(seconds)
+
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await workers.run("fs", job, 0.3, wait_timeout=0.05)
+            await workers.run("fs", job, 0)
+        finally:
+            workers.shutdown()
+        return overlap
+
+    assert _run(main()) == [1, 1]